@@ -0,0 +1,73 @@
+import sqlite3
+
+import cache
+import querylog
+
+# ========== Platform-wide Herd Analytics ==========
+# Every query aggregates inside SQLite over the livestock indexes created in
+# initialize_database and returns at most a few hundred rows, independent of
+# how many animals or farms the platform holds. Herd figures count only animals
+# still on a farm; registrations_by_week counts every animal ever added.
+
+def platform_totals(conn):
+    row = querylog.fetch_one(conn, """
+        SELECT COUNT(*), COUNT(DISTINCT user_id) FROM livestock WHERE retired_on IS NULL
+    """)
+    return {"animals": row[0], "farms": row[1]}
+
+def herd_by_type(conn):
+    return querylog.read_sql(conn, """
+        SELECT animal_type AS "Type",
+               COUNT(*) AS "Animals",
+               SUM(CASE WHEN trim(vaccination) != '' THEN 1 ELSE 0 END) AS "Vaccinated"
+        FROM livestock
+        WHERE retired_on IS NULL
+        GROUP BY animal_type
+        ORDER BY "Animals" DESC
+    """)
+
+def vaccination_coverage(conn):
+    df = herd_by_type(conn)
+    df["Coverage (%)"] = (100 * df["Vaccinated"] / df["Animals"]).round(1)
+    return df
+
+def top_farms(conn, limit=25):
+    """Largest farms by herd size; counting happens before the join to users."""
+    return querylog.read_sql(conn, """
+        SELECT u.farmname AS "Farm", u.farmaddress AS "Address", c.animals AS "Animals"
+        FROM (
+            SELECT user_id, COUNT(*) AS animals
+            FROM livestock
+            WHERE retired_on IS NULL
+            GROUP BY user_id
+            ORDER BY animals DESC
+            LIMIT ?
+        ) c
+        JOIN users u ON u.id = c.user_id
+        ORDER BY c.animals DESC
+    """, params=(limit,))
+
+def registrations_by_week(conn, weeks=26):
+    return querylog.read_sql(conn, """
+        SELECT strftime('%Y-%W', added_on) AS "Week", animal_type AS "Type", COUNT(*) AS "Registered"
+        FROM livestock
+        WHERE added_on >= date('now', ?)
+        GROUP BY "Week", animal_type
+        ORDER BY "Week"
+    """, params=(f"-{weeks * 7} days",))
+
+# ========== Cached Report ==========
+@cache.cached("livestock", "users", ttl=600)
+def platform_report(db_path):
+    """Every Platform Analytics figure in one cached bundle, shared by all app processes."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return {
+            "totals": platform_totals(conn),
+            "by_type": herd_by_type(conn),
+            "coverage": vaccination_coverage(conn),
+            "top_farms": top_farms(conn),
+            "weekly": registrations_by_week(conn),
+        }
+    finally:
+        conn.close()
@@ -0,0 +1,323 @@
+import argparse
+import http.client
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import audit
+import database
+import maintenance
+from diagnosis import SYMPTOMS, diagnose
+
+# ========== Configuration ==========
+MAX_BATCH_ITEMS = 1000
+MAX_BODY_BYTES = 4 * 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+DEFAULT_PORT = 8600
+
+# Created by make_server(); request handlers borrow connections from it
+pool = None
+
+# ========== Handlers ==========
+class Unauthorized(Exception):
+    pass
+
+def parse_list_query(query):
+    """Reads ids=1,2,3 or keyset pagination (after_id, user_id, limit) from the query string."""
+    ids = [int(i) for i in query.get("ids", [""])[0].split(",") if i]
+    user_id = int(query["user_id"][0]) if "user_id" in query else None
+    after_id = int(query.get("after_id", ["0"])[0])
+    limit = min(int(query.get("limit", ["1000"])[0]), 10_000)
+    return {"ids": ids, "user_id": user_id, "after_id": after_id, "limit": limit}
+
+def diagnose_batch(items, user_id=None):
+    """Diagnoses each item; with user_id the results are recorded for that user."""
+    results = []
+    for position, item in enumerate(items):
+        symptoms = item.get("symptoms", [])
+        unknown = [s for s in symptoms if s not in SYMPTOMS]
+        if unknown:
+            raise ValueError(f"Item {position} has unknown symptoms: {', '.join(unknown)}.")
+        diagnosis = diagnose(symptoms, item.get("animal_type"))
+        results.append({"animal_id": item.get("animal_id"), "user_id": user_id or item.get("user_id"),
+                        "symptoms": symptoms,
+                        "disease": diagnosis["disease"], "recommendation": diagnosis["recommendation"],
+                        "ranked": diagnosis["ranked"], "model_version": diagnosis["model_version"]})
+    return results
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive for batch clients
+
+    def log_message(self, format, *args):
+        pass  # access logging would dominate the cost of small requests
+
+    # --- Responses ---
+    def _fail(self, status, message):
+        """Sends an error and closes the connection, since the request body may be unread.
+
+        If a streamed body has already started, the connection is dropped without
+        the final chunk, so the client sees an incomplete response.
+        """
+        if self._streaming:
+            print(f"Error streaming {self.path}: {message}")
+            self.close_connection = True
+            return
+        self._send_json(status, {"error": message}, close=True)
+
+    def _send_json(self, status, payload, close=False):
+        body = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if close:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+    def _stream_json_array(self, rows):
+        """Streams rows as a JSON array with chunked transfer encoding."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._streaming = True
+        buffer, size, separator = [b"["], 1, b""
+        for row in rows:
+            encoded = separator + json.dumps(row, separators=(",", ":"), default=str).encode("utf-8")
+            buffer.append(encoded)
+            size += len(encoded)
+            separator = b","
+            if size >= STREAM_CHUNK_BYTES:
+                self._write_chunk(b"".join(buffer))
+                buffer, size = [], 0
+        buffer.append(b"]")
+        self._write_chunk(b"".join(buffer))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _read_items(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"Request body exceeds {MAX_BODY_BYTES} bytes.")
+        body = json.loads(self.rfile.read(length) or b"{}")
+        items = body.get("items")
+        if not isinstance(items, list) or not items:
+            raise ValueError("Body must be a JSON object with a non-empty 'items' list.")
+        if len(items) > MAX_BATCH_ITEMS:
+            raise ValueError(f"At most {MAX_BATCH_ITEMS} items per batch.")
+        return items
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        return parts, parse_qs(url.query)
+
+    def _authenticate(self, conn):
+        """The caller's (user_id, role) from "Authorization: Bearer <token>"."""
+        scheme, _, token = self.headers.get("Authorization", "").partition(" ")
+        user = database.api_token_user(conn, token.strip()) if scheme.lower() == "bearer" and token else None
+        if user is None:
+            raise Unauthorized("A valid API token is required (Authorization: Bearer <token>).")
+        audit.bind_actor(user[0])
+        return user
+
+    def _handle(self, method):
+        """Routes one request. Admin tokens see every row; any other token only its user's rows."""
+        self._streaming = False
+        parts, query = self._route()
+        try:
+            if method == "GET" and parts == ["health"]:
+                return self._send_json(200, {"status": "ok"})
+
+            with pool.connection() as conn:
+                user_id, role = self._authenticate(conn)
+                owner_id = None if role == "Admin" else user_id
+
+                if method == "GET" and len(parts) == 1 and parts[0] in database.BATCH_TABLES:
+                    filters = parse_list_query(query)
+                    if owner_id is not None:
+                        if filters["user_id"] not in (None, owner_id):
+                            raise PermissionError("Tokens can only list their own user's rows.")
+                        filters["user_id"] = owner_id
+                    return self._stream_json_array(database.iter_batch(conn, parts[0], **filters))
+
+                if len(parts) == 2 and parts[1] == "batch":
+                    items = self._read_items()
+                    if method == "POST" and parts[0] == "diagnoses":
+                        if owner_id is not None:
+                            foreign = database.unowned_ids(
+                                conn, "livestock", [i["animal_id"] for i in items if i.get("animal_id")], owner_id)
+                            if foreign:
+                                raise PermissionError(f"Not your animals: {', '.join(map(str, foreign))}.")
+                        results = diagnose_batch(items, user_id=owner_id)
+                        for result, barcode_id in zip(results, database.record_diagnoses(results)):
+                            result["barcode_id"] = barcode_id
+                        return self._send_json(201, {"results": results})
+                    if parts[0] in database.BATCH_TABLES:
+                        if method == "POST":
+                            ids = database.create_batch(parts[0], items, owner_id=owner_id)
+                            return self._send_json(201, {"ids": ids})
+                        if method == "PATCH":
+                            updated = database.update_batch(parts[0], items, owner_id=owner_id)
+                            return self._send_json(200, {"updated": updated})
+
+            self._send_json(404, {"error": f"No route for {method} {self.path}"})
+        except Unauthorized as e:
+            self._fail(401, str(e))
+        except PermissionError as e:
+            self._fail(403, str(e))
+        except (ValueError, KeyError, TypeError) as e:
+            self._fail(400, str(e))
+        except sqlite3.IntegrityError as e:
+            self._fail(409, str(e))
+        except Exception as e:
+            # SQL and file errors name internals; the details stay in the server log
+            print(f"Error handling {method} {self.path}: {type(e).__name__}: {e}")
+            self._fail(500, "Internal error")
+        finally:
+            audit.bind_actor(None)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, pool_size=8):
+    global pool
+    database.initialize_database()
+    pool = database.ConnectionPool(database.SQLITE_DB, size=pool_size)
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    return server
+
+# ========== Load Test ==========
+def _request(conn, method, path, payload=None, token=None):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else None
+    headers = {"Content-Type": "application/json"} if body else {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    data = response.read()
+    if response.status >= 400:
+        raise RuntimeError(f"{method} {path} -> {response.status}: {data[:200]!r}")
+    return json.loads(data)
+
+def load_test(host, port, tokens, requests_per_worker=200, workers=16, batch_size=50):
+    """Runs a create/read/update mix from concurrent keep-alive clients and prints requests/second.
+
+    Client n uses tokens[n % len(tokens)].
+    """
+    latencies = {"create": [], "read": [], "update": [], "diagnose": []}
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        token = tokens[worker_id % len(tokens)]
+        own = {"create": [], "read": [], "update": [], "diagnose": []}
+        for i in range(requests_per_worker):
+            kind = ("create", "read", "update", "diagnose")[i % 4]
+            start = time.perf_counter()
+            if kind == "create":
+                items = [{"name": f"W{worker_id}-{i}-{n}", "animal_type": "Goat", "age": 1.0,
+                          "weight": 25.0, "vaccination": "CDT"} for n in range(batch_size)]
+                ids = _request(conn, "POST", "/livestock/batch", {"items": items}, token)["ids"]
+            elif kind == "read":
+                _request(conn, "GET", "/livestock?ids=" + ",".join(map(str, ids)), token=token)
+            elif kind == "update":
+                _request(conn, "PATCH", "/livestock/batch", {"items": [{"id": i_, "weight": 26.5} for i_ in ids]},
+                         token)
+            else:
+                _request(conn, "POST", "/diagnoses/batch",
+                         {"items": [{"animal_id": i_, "animal_type": "Goat", "symptoms": ["Fever", "Coughing"]}
+                                    for i_ in ids]}, token)
+            own[kind].append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            for kind, values in own.items():
+                latencies[kind].extend(values)
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(workers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"{total} requests ({batch_size} items each) from {workers} clients in {elapsed:.2f}s: "
+          f"{total / elapsed:,.0f} requests/s, {total * batch_size / elapsed:,.0f} items/s")
+    for kind, values in latencies.items():
+        values.sort()
+        if values:
+            print(f"  {kind:<9} p50 {values[len(values) // 2] * 1000:7.1f} ms   "
+                  f"p95 {values[int(len(values) * 0.95)] * 1000:7.1f} ms")
+
+# ========== Entry Point ==========
+def main():
+    parser = argparse.ArgumentParser(description="VetSmart headless JSON API")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="run the API server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--pool-size", type=int, default=8)
+    token = sub.add_parser("token", help="issue an API token for a user (or revoke theirs)")
+    token.add_argument("email")
+    token.add_argument("--revoke", action="store_true", help="delete every token of the user instead")
+    bench = sub.add_parser("loadtest", help="load test a local instance")
+    bench.add_argument("--url", help="host:port of a running instance; a temporary one is started if omitted")
+    bench.add_argument("--token", help="API token for --url")
+    bench.add_argument("--requests", type=int, default=200, help="requests per client")
+    bench.add_argument("--clients", type=int, default=16)
+    bench.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = make_server(args.host, args.port, args.pool_size)
+        maintenance.start(database.SQLITE_DB)
+        print(f"VetSmart API listening on http://{args.host}:{args.port}")
+        server.serve_forever()
+    elif args.command == "token":
+        database.initialize_database()
+        user = database.find_user(args.email)
+        if user is None:
+            parser.error(f"No user with email {args.email}.")
+        if args.revoke:
+            print(f"Revoked {database.revoke_api_tokens(user[4])} token(s) of {args.email}.")
+        else:
+            print(database.issue_api_token(user[4]))
+    elif args.url:
+        if not args.token:
+            parser.error("--url needs --token.")
+        host, port = args.url.rsplit(":", 1)
+        load_test(host, int(port), [args.token], args.requests, args.clients, args.batch_size)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.SQLITE_DB = os.path.join(tmp, "loadtest.db")
+            server = make_server(port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            tokens = []
+            for n in range(args.clients):
+                user_id = database.save_users("Farmer", "Load", f"Client {n}", f"load{n}@example.com", "-",
+                                              "0700", f"Farm {n}", "-", "owner")
+                tokens.append(database.issue_api_token(user_id))
+            load_test("127.0.0.1", server.server_address[1], tokens, args.requests, args.clients,
+                      args.batch_size)
+            server.shutdown()
+            pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import querylog
+import sync
+import writer
+
+# ========== Configuration ==========
+# Cold rows leave the SQLite file for zstd-compressed Parquet part files, one per
+# table, month and batch (archive/<table>/<YYYY-MM>.<write time ns>.parquet;
+# older archives hold one <YYYY-MM>.parquet per month). Archives are local to
+# the host running the job, like the SQLite file they come from.
+ARCHIVE_DIR = os.environ.get("VETSMART_ARCHIVE_DIR", "archive")
+COMPRESSION = "zstd"
+COMPRESSION_LEVEL = 9
+BATCH_ROWS = 20_000            # rows moved per batch
+
+# Which rows are cold, how long they stay hot first, and the timestamp that
+# picks their monthly file. The condition is re-checked when rows are deleted,
+# so a request reopened or an animal re-registered meanwhile stays hot.
+# "dependents" are tables whose rows (keyed by animal_id) move with their
+# animal; animals that diagnoses or hot vet requests still point at stay hot.
+POLICIES = {
+    "vet_requests": {
+        "where": "status = 'closed' AND closed_on < ?",
+        "month": "closed_on",
+        "days": int(os.environ.get("VETSMART_ARCHIVE_REQUESTS_DAYS", "90")),
+    },
+    "feedback": {
+        # Only feedback the analytics pipeline has already counted
+        "where": "submitted_on < ? AND id <= (SELECT COALESCE(MAX(last_feedback_id), 0) FROM feedback_analytics_state)",
+        "month": "submitted_on",
+        "days": int(os.environ.get("VETSMART_ARCHIVE_FEEDBACK_DAYS", "365")),
+    },
+    "livestock": {
+        "where": "retired_on IS NOT NULL AND retired_on < ? "
+                 "AND NOT EXISTS (SELECT 1 FROM diagnoses d WHERE d.animal_id = livestock.id) "
+                 "AND NOT EXISTS (SELECT 1 FROM vet_requests r WHERE r.animal_id = livestock.id)",
+        "month": "retired_on",
+        "days": int(os.environ.get("VETSMART_ARCHIVE_RETIRED_DAYS", "30")),
+        "dependents": ("measurements", "vaccinations"),
+    },
+}
+
+# Columns identifying a row across copies (an interrupted move leaves one in two files)
+ROW_KEYS = {"measurements": ["animal_id", "ts"]}
+
+# ========== Archive Files ==========
+def _table_dir(table, root=None):
+    return os.path.join(root or ARCHIVE_DIR, table)
+
+def _written(path):
+    """Write time (ns) from a part file's name; 0 for a one-file-per-month archive."""
+    parts = os.path.basename(path).split(".")
+    return int(parts[1]) if len(parts) == 3 else 0
+
+def archived_tables():
+    """Policy tables and the tables whose rows move with them."""
+    tables = list(POLICIES)
+    for policy in POLICIES.values():
+        tables += [t for t in policy.get("dependents", ()) if t not in tables]
+    return tables
+
+def month_files(table, since=None, until=None, root=None):
+    """(month, path) of a table's archive files in the order they were written, limited to 'YYYY-MM' bounds."""
+    folder = _table_dir(table, root)
+    if not os.path.isdir(folder):
+        return []
+    files = []
+    for filename in os.listdir(folder):
+        month = filename[:7]
+        if not filename.endswith(".parquet") or (since and month < since[:7]) or (until and month > until[:7]):
+            continue
+        files.append((month, os.path.join(folder, filename)))
+    return sorted(files, key=lambda item: (_written(item[1]), item[0]))
+
+def _write_part(table, month, rows, root=None):
+    """Writes rows as a new part file of the month, swapped in atomically; returns its path."""
+    folder = _table_dir(table, root)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{month}.{time.time_ns():019d}.parquet")
+    partial = path + ".partial"
+    pq.write_table(pa.Table.from_pandas(rows, preserve_index=False), partial,
+                   compression=COMPRESSION, compression_level=COMPRESSION_LEVEL)
+    os.replace(partial, path)
+    return path
+
+def load_archived(table, since=None, until=None, where=None, columns=None, root=None):
+    """Archived rows of a table, reading only the month files inside [since, until].
+
+    where is a dict of column equalities pushed down to the Parquet reader. A
+    row found in several files keeps its most recently written copy.
+    """
+    filters = [(column, "=", value) for column, value in (where or {}).items()] or None
+    frames = []
+    for _, path in month_files(table, since, until, root):
+        frame = pq.read_table(path, columns=columns, filters=filters).to_pandas()
+        if not frame.empty:
+            frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=columns or [])
+    rows = pd.concat(frames, ignore_index=True)
+    keys = ROW_KEYS.get(table, ["id"])
+    if set(keys) <= set(rows.columns):
+        rows = rows.drop_duplicates(keys, keep="last").reset_index(drop=True)
+    return rows
+
+def with_archived(hot, table, **options):
+    """Hot rows plus the archived ones, by id; a row in both (an interrupted move) is taken from the hot table."""
+    cold = load_archived(table, **options)
+    if cold.empty:
+        return hot
+    if hot.empty:
+        return cold.sort_values("id").reset_index(drop=True)
+    cold = cold[~cold["id"].isin(hot["id"])]
+    return pd.concat([cold, hot], ignore_index=True).sort_values("id").reset_index(drop=True)
+
+def summary(root=None):
+    """One row per table and month with its file count, rows and size; row counts come from the file footers."""
+    rows = []
+    for table in archived_tables():
+        months = {}
+        for month, path in month_files(table, root=root):
+            entry = months.setdefault(month, {"Table": table, "Month": month, "Files": 0, "Rows": 0, "KB": 0.0})
+            entry["Files"] += 1
+            entry["Rows"] += pq.ParquetFile(path).metadata.num_rows
+            entry["KB"] += os.path.getsize(path) / 1024
+        rows += [dict(entry, KB=round(entry["KB"], 1)) for _, entry in sorted(months.items())]
+    return pd.DataFrame(rows, columns=["Table", "Month", "Files", "Rows", "KB"])
+
+# ========== Moving Cold Rows ==========
+def _dependent_counts(conn, dependents, ids):
+    """{table: {animal_id: rows}} for the given animals."""
+    return {dep: dict(conn.execute(f"""
+        SELECT animal_id, COUNT(*) FROM {dep} WHERE animal_id IN (SELECT value FROM json_each(?)) GROUP BY animal_id
+    """, (json.dumps(ids),)).fetchall()) for dep in dependents}
+
+def archive_table(conn, write, table, days=None, now=None, root=None, batch_rows=BATCH_ROWS):
+    """Moves a table's cold rows to its archive files; returns (rows moved, months touched).
+
+    Each batch is read on conn and written as new part files, outside any
+    write transaction; write(work) then deletes the rows in one short
+    committed transaction, e.g. on the database's writer thread, re-checking
+    the policy (and, for animals, that no health records were added since the
+    read). Rows that stay hot are removed from the part files again. If the
+    process dies between the two steps, the rows are in both places; reads
+    prefer the hot copy and the next run archives them again.
+    """
+    policy = POLICIES[table]
+    dependents = policy.get("dependents", ())
+    days = policy["days"] if days is None else days
+    cutoff = ((now or datetime.now()) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    moved, months, last_id = 0, set(), 0
+    while True:
+        batch = querylog.read_sql(conn, f"""
+            SELECT * FROM {table} WHERE id > ? AND {policy['where']} ORDER BY id LIMIT ?
+        """, params=(last_id, cutoff, batch_rows))
+        if batch.empty:
+            break
+        last_id = int(batch["id"].iloc[-1])
+        ids = [int(i) for i in batch["id"]]
+        month_of = dict(zip(ids, batch[policy["month"]].astype(str).str[:7]))
+        counts = _dependent_counts(conn, dependents, ids)
+        related = {dep: querylog.read_sql(conn, f"SELECT * FROM {dep} WHERE animal_id IN (SELECT value FROM json_each(?))",
+                                          params=(json.dumps(ids),)) for dep in dependents}
+
+        parts = []  # (table, path, rows, owner column)
+        for month, rows in batch.groupby(batch[policy["month"]].astype(str).str[:7]):
+            parts.append((table, _write_part(table, month, rows, root), rows, "id"))
+        for dep, rows in related.items():
+            for month, dep_rows in rows.groupby(rows["animal_id"].map(month_of)):
+                parts.append((dep, _write_part(dep, month, dep_rows, root), dep_rows, "animal_id"))
+
+        def delete_batch(write_conn):
+            current = _dependent_counts(write_conn, dependents, ids)
+            deleted = []
+            with sync.untracked_deletes(write_conn):
+                for row_id in ids:
+                    if any(current[dep].get(row_id, 0) != counts[dep].get(row_id, 0) for dep in dependents):
+                        continue
+                    if write_conn.execute(f"DELETE FROM {table} WHERE id = ? AND {policy['where']}",
+                                          (row_id, cutoff)).rowcount:
+                        deleted.append(row_id)
+                        for dep in dependents:
+                            write_conn.execute(f"DELETE FROM {dep} WHERE animal_id = ?", (row_id,))
+            return deleted
+
+        deleted = set(write(delete_batch))
+        for part_table, path, rows, owner in parts:
+            kept = rows[rows[owner].isin(deleted)]
+            if kept.empty:
+                os.remove(path)
+            elif len(kept) < len(rows):
+                month = os.path.basename(path)[:7]
+                _write_part(part_table, month, kept, root)
+                os.remove(path)
+        moved += len(deleted)
+        months |= {month_of[i] for i in deleted}
+        if len(batch) < batch_rows:
+            break
+    return moved, sorted(months)
+
+def run(conn, write, tables=None, now=None, root=None):
+    """Archives every policy table; returns {table: {"rows": n, "months": [...], "seconds": s}}."""
+    report = {}
+    for table in tables or POLICIES:
+        start = time.perf_counter()
+        moved, months = archive_table(conn, write, table, now=now, root=root)
+        report[table] = {"rows": moved, "months": months, "seconds": round(time.perf_counter() - start, 2)}
+    return report
+
+# ========== Benchmark ==========
+def _seed(conn, rows):
+    conn.execute("""
+        CREATE TABLE vet_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, farmer_name TEXT NOT NULL, animal_tag TEXT NOT NULL,
+            vet_id INTEGER NOT NULL, request_reason TEXT NOT NULL, requested_on DATETIME, animal_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'open', closed_on DATETIME)
+    """)
+    conn.execute("CREATE INDEX idx_vet_requests_status ON vet_requests(status, closed_on)")
+    start = datetime(2022, 1, 1)
+    conn.executemany("""
+        INSERT INTO vet_requests (farmer_name, animal_tag, vet_id, request_reason, requested_on, status, closed_on)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (
+        (f"Farmer {i % 300}", f"TAG-{i}", i % 40, "Limping and reduced appetite for two days",
+         (start + timedelta(minutes=5 * i)).strftime("%Y-%m-%d %H:%M:%S"),
+         "closed" if i % 10 else "open",
+         (start + timedelta(minutes=5 * i, days=3)).strftime("%Y-%m-%d %H:%M:%S") if i % 10 else None)
+        for i in range(rows)
+    ))
+    conn.commit()
+
+def benchmark(rows=300_000):
+    """Archives closed requests from a seeded table and compares hot scans and storage before and after."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path, root = os.path.join(tmp, "hot.db"), os.path.join(tmp, "archive")
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        _seed(conn, rows)
+
+        def scan():
+            start = time.perf_counter()
+            count = len(pd.read_sql("SELECT * FROM vet_requests", conn))
+            return count, time.perf_counter() - start
+
+        before, before_seconds = scan()
+        db_bytes = os.path.getsize(db_path)
+        start = time.perf_counter()
+        hot_writer = writer.Writer(db_path)
+        moved, months = archive_table(conn, lambda work: hot_writer.submit(work).result(writer.ACK_TIMEOUT),
+                                      "vet_requests", root=root)
+        hot_writer.stop()
+        archive_seconds = time.perf_counter() - start
+        after, after_seconds = scan()
+        archive_bytes = sum(os.path.getsize(path) for _, path in month_files("vet_requests", root=root))
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # the writer left the file in WAL mode
+        parts = len(month_files("vet_requests", root=root))
+        print(f"moved {moved:,} closed requests into {parts} part files over {len(months)} months in {archive_seconds:.2f}s")
+        print(f"hot scan: {before:,} rows in {before_seconds * 1000:.0f} ms -> {after:,} rows in {after_seconds * 1000:.0f} ms")
+        print(f"storage: SQLite {db_bytes / 2**20:.1f} MB -> {os.path.getsize(db_path) / 2**20:.1f} MB after VACUUM, "
+              f"archives {archive_bytes / 2**20:.1f} MB")
+
+        start = time.perf_counter()
+        one_month = load_archived("vet_requests", since="2022-06", until="2022-06", root=root)
+        everything = with_archived(pd.read_sql("SELECT * FROM vet_requests", conn), "vet_requests", root=root)
+        print(f"one archived month: {len(one_month):,} rows; hot + archived: {len(everything):,} rows "
+              f"({(time.perf_counter() - start) * 1000:.0f} ms)")
+        assert len(everything) == rows
+        conn.close()
+
+if __name__ == "__main__":
+    # Usage: python app/archive.py [rows]
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
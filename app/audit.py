@@ -0,0 +1,320 @@
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import writer
+
+# ========== Configuration ==========
+# Events are appended to an in-memory buffer and committed in groups by a
+# background thread, so a save pays for a list append rather than a second
+# write. Up to FLUSH_SECONDS of events can be lost if the process is killed;
+# a normal exit flushes what is pending.
+FLUSH_SECONDS = float(os.environ.get("VETSMART_AUDIT_FLUSH_SECONDS", "0.5"))
+FLUSH_EVENTS = 500             # a buffer this long is flushed without waiting for the interval
+MAX_BUFFER = 50_000            # events held while the database is unavailable; older ones are dropped
+RETENTION_MONTHS = int(os.environ.get("VETSMART_AUDIT_RETENTION_MONTHS", "24"))
+PRUNE_SECONDS = 6 * 3600       # how often the flusher drops expired partitions
+
+# One table per calendar month (audit_events_YYYYMM): retention drops whole
+# tables instead of deleting rows, and queries only read the months they cover.
+# audit_partitions keeps each month's event count, updated in the flush's transaction.
+PARTITION_PREFIX = "audit_events_"
+
+# Rows store the action as a small integer; the entity is the part before the dot,
+# so an animal's history (saves and diagnoses) is one entity_id lookup.
+ACTIONS = {
+    "user.signup": 1,
+    "user.provision": 2,
+    "livestock.save": 3,
+    "veterinarian.register": 4,
+    "vet_request.create": 5,
+    "livestock.diagnose": 6,
+    "livestock.retire": 7,
+    "vet_request.close": 8,
+    "sync.push": 9,
+    "livestock.update": 10,
+    "vet_request.update": 11,
+}
+ACTION_NAMES = {code: name for name, code in ACTIONS.items()}
+
+# ========== Schema ==========
+def partition_name(ts):
+    return PARTITION_PREFIX + time.strftime("%Y%m", time.localtime(ts))
+
+def create_partition(conn, name):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} (
+            ts INTEGER NOT NULL,
+            actor_id INTEGER,
+            action INTEGER NOT NULL,
+            entity_id INTEGER,
+            detail TEXT
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_entity ON {name}(action, entity_id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS audit_partitions (
+            name TEXT PRIMARY KEY,
+            events INTEGER NOT NULL
+        )
+    """)
+    # Counted once, for partitions written before the counters existed; new ones start at 0
+    conn.execute(f"""
+        INSERT INTO audit_partitions (name, events)
+        SELECT ?, (SELECT COUNT(*) FROM {name})
+        WHERE NOT EXISTS (SELECT 1 FROM audit_partitions WHERE name = ?)
+    """, (name, name))
+
+def partitions(conn):
+    """Existing partition tables, oldest first."""
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+                        (PARTITION_PREFIX + "[0-9][0-9][0-9][0-9][0-9][0-9]",)).fetchall()
+    return sorted(row[0] for row in rows)
+
+def prune(conn, keep_months=RETENTION_MONTHS, now=None):
+    """Drops partitions older than the newest keep_months months; returns the dropped names."""
+    today = datetime.fromtimestamp(now or time.time())
+    months = today.year * 12 + today.month - 1 - (keep_months - 1)
+    cutoff = PARTITION_PREFIX + f"{months // 12:04d}{months % 12 + 1:02d}"
+    dropped = [name for name in partitions(conn) if name < cutoff]
+    for name in dropped:
+        conn.execute(f"DROP TABLE IF EXISTS {name}")
+        conn.execute("DELETE FROM audit_partitions WHERE name = ?", (name,))
+    return dropped
+
+def create_audit_tables(conn):
+    """Creates this month's partition, counts any partition without a counter and drops expired ones."""
+    current = partition_name(time.time())
+    for name in sorted(set(partitions(conn)) | {current}):
+        create_partition(conn, name)
+    prune(conn)
+
+# ========== Recording ==========
+_db_path = "livestock_data.db"
+_buffer = []
+_buffer_lock = threading.Lock()
+_wakeup = threading.Event()
+_flush_lock = threading.Lock()
+_flusher = None
+_ready = set()                 # (db path, partition) pairs known to exist
+_last_prune = 0.0
+_stats = {"recorded": 0, "flushed": 0, "flushes": 0, "dropped": 0, "errors": 0, "last_flush_ms": None}
+
+# Streamlit runs each session's script in its own thread; the app binds the
+# signed-in user at the start of every rerun so save functions need no actor argument.
+_local = threading.local()
+_UNBOUND = object()
+
+def configure(db_path):
+    """Sends events to this database file (the app's SQLITE_DB)."""
+    global _db_path
+    _db_path = db_path
+
+def bind_actor(user_id):
+    """Attributes events recorded by this thread to the given user id (None when signed out)."""
+    _local.actor_id = None if user_id is None else int(user_id)
+
+def record(action, entity_id=None, detail=None, actor_id=_UNBOUND):
+    """Buffers one event; never blocks on the database and never raises into the caller."""
+    try:
+        if actor_id is _UNBOUND:
+            actor_id = getattr(_local, "actor_id", None)
+        row = (int(time.time()), actor_id, ACTIONS[action], None if entity_id is None else int(entity_id),
+               json.dumps(detail, separators=(",", ":"), default=str) if detail else None)
+    except Exception as e:
+        print(f"Error recording audit event {action}: {e}")
+        return
+    with _buffer_lock:
+        if len(_buffer) >= MAX_BUFFER:
+            del _buffer[0]
+            _stats["dropped"] += 1
+        _buffer.append(row)
+        _stats["recorded"] += 1
+        pending = len(_buffer)
+    _start_flusher()
+    if pending >= FLUSH_EVENTS:
+        _wakeup.set()
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _buffer_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run, name="audit-flusher", daemon=True)
+            _flusher.start()
+
+def _run():
+    while True:
+        _wakeup.wait(FLUSH_SECONDS)
+        _wakeup.clear()
+        flush()
+
+def flush():
+    """Commits every buffered event in one write through the database's writer thread.
+
+    Returns how many were committed. On failure the events go back to the
+    front of the buffer to be retried on the next flush.
+    """
+    global _last_prune
+    with _flush_lock:
+        with _buffer_lock:
+            rows = _buffer[:]
+            del _buffer[:]
+        if not rows:
+            return 0
+        path = _db_path
+        by_partition = {}
+        for row in rows:
+            by_partition.setdefault(partition_name(row[0]), []).append(row)
+        prune_due = time.time() - _last_prune > PRUNE_SECONDS
+
+        def work(conn):
+            for name, group in by_partition.items():
+                if (path, name) not in _ready:
+                    create_partition(conn, name)
+                conn.executemany(f"INSERT INTO {name} (ts, actor_id, action, entity_id, detail) VALUES (?, ?, ?, ?, ?)",
+                                 group)
+                conn.execute("UPDATE audit_partitions SET events = events + ? WHERE name = ?", (len(group), name))
+            if prune_due:
+                prune(conn)
+
+        start = time.perf_counter()
+        try:
+            writer.get_writer(path).submit(work).result(writer.ACK_TIMEOUT)
+        except Exception as e:
+            print(f"Error writing audit events: {e}")
+            with _buffer_lock:
+                _stats["errors"] += 1
+                room = MAX_BUFFER - len(_buffer)
+                kept = rows[-room:] if room > 0 else []
+                _stats["dropped"] += len(rows) - len(kept)
+                _buffer[:0] = kept
+            return 0
+        _ready.update((path, name) for name in by_partition)
+        if prune_due:
+            _last_prune = time.time()
+        with _buffer_lock:
+            _stats["flushed"] += len(rows)
+            _stats["flushes"] += 1
+            _stats["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return len(rows)
+
+# Events still buffered when the server stops are written on the way out
+atexit.register(flush)
+
+def stats():
+    with _buffer_lock:
+        return dict(_stats, pending=len(_buffer))
+
+# ========== Querying ==========
+def events(conn, days=30, action=None, entity=None, entity_id=None, actor_id=None, limit=500):
+    """Most recent events first, read from the partitions covering the last `days` days."""
+    since = int(time.time() - days * 86400)
+    first = partition_name(since)
+    names = [name for name in partitions(conn) if name >= first]
+    columns = ["time", "actor_id", "action", "entity_id", "detail"]
+    if not names:
+        return pd.DataFrame(columns=columns)
+
+    where, params = ["ts >= ?"], [since]
+    if action is not None:
+        where.append("action = ?")
+        params.append(ACTIONS[action])
+    elif entity is not None:
+        codes = [code for name, code in ACTIONS.items() if name.split(".")[0] == entity]
+        where.append(f"action IN ({', '.join('?' * len(codes))})")
+        params += codes
+    if entity_id is not None:
+        where.append("entity_id = ?")
+        params.append(int(entity_id))
+    if actor_id is not None:
+        where.append("actor_id = ?")
+        params.append(int(actor_id))
+    clause = " AND ".join(where)
+    sql = " UNION ALL ".join(f"SELECT ts, actor_id, action, entity_id, detail FROM {name} WHERE {clause}"
+                             for name in names)
+    rows = conn.execute(f"{sql} ORDER BY ts DESC LIMIT ?", params * len(names) + [limit]).fetchall()
+
+    df = pd.DataFrame(rows, columns=columns)
+    df["time"] = df["time"].map(lambda ts: datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"))
+    df["action"] = df["action"].map(lambda code: ACTION_NAMES.get(code, str(code)))
+    return df
+
+def partition_sizes(conn):
+    """(partition, events) for every partition, newest first, from the counters kept by flush."""
+    existing = set(partitions(conn))
+    if not existing:
+        return []
+    rows = conn.execute("SELECT name, events FROM audit_partitions ORDER BY name DESC").fetchall()
+    return [(name, events) for name, events in rows if name in existing]
+
+# ========== Benchmark ==========
+def _saves(path, threads, saves, audited):
+    """Runs saves from several threads, each followed by its audit event: inline or buffered."""
+    db_writer = writer.get_writer(path)
+    latencies, lock = [], threading.Lock()
+
+    def worker(n):
+        mine = []
+        for i in range(saves):
+            start = time.perf_counter()
+            animal_id = db_writer.execute("INSERT INTO items (owner, seq) VALUES (?, ?)", (n, i)).result(writer.ACK_TIMEOUT)
+            if audited == "inline":
+                db_writer.execute(f"INSERT INTO {partition_name(time.time())} (ts, actor_id, action, entity_id, detail) "
+                                  "VALUES (?, ?, ?, ?, ?)",
+                                  (int(time.time()), n, ACTIONS["livestock.save"], animal_id, None)).result(writer.ACK_TIMEOUT)
+            elif audited == "buffered":
+                record("livestock.save", animal_id, actor_id=n)
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+def benchmark(threads=20, saves=200):
+    """Compares save latency with no audit, an inline audit write, and the buffered log."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "audit.db")
+        conn = sqlite3.connect(path)
+        writer.configure(conn)
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, owner INTEGER, seq INTEGER)")
+        create_audit_tables(conn)
+        conn.commit()
+        configure(path)
+
+        for audited in ("none", "inline", "buffered"):
+            elapsed, p50, p99 = _saves(path, threads, saves, audited)
+            flushed = ""
+            if audited == "buffered":
+                flush_start = time.perf_counter()
+                flush()
+                flushed = f", final flush {(time.perf_counter() - flush_start) * 1000:.1f} ms"
+            print(f"{audited:<9} {threads} threads x {saves} saves: {threads * saves / elapsed:,.0f} saves/s, "
+                  f"p50 {p50 * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms{flushed}")
+
+        stored = dict(partition_sizes(conn))
+        print(f"audit rows: {sum(stored.values()):,} in {len(stored)} partition(s); "
+              f"{_stats['flushes']} flushes, {_stats['dropped']} dropped, {_stats['errors']} errors")
+        conn.close()
+
+if __name__ == "__main__":
+    # Usage: python app/audit.py [threads] [saves_per_thread]
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
@@ -0,0 +1,400 @@
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# ========== Configuration ==========
+# VETSMART_CACHE_URL: a file path for the SQLite store shared by every process on
+# the host, redis://host:6379/0 for a server shared across hosts, or "off".
+CACHE_URL = os.environ.get("VETSMART_CACHE_URL", "vetsmart_cache.db")
+DEFAULT_TTL = 300              # seconds
+MAX_ENTRIES = 5000
+MAX_BYTES = 256 * 1024 * 1024
+MAX_VALUE_BYTES = 16 * 1024 * 1024
+VERSION_CHECK_SECONDS = 1.0    # how stale another process's invalidation may be seen
+TOUCH_SECONDS = 30             # LRU access times are refreshed at most this often
+EVICT_EVERY = 100              # sets between eviction passes
+
+_MISS = object()
+
+def _now():
+    return time.time()
+
+# ========== Serialization ==========
+# Entries are JSON with DataFrames as Arrow IPC streams, never pickles: anyone who
+# can write to a shared store (the cache file, a Redis server) could otherwise
+# run code in every app process that reads it. Values are DataFrames, dicts with
+# string keys, lists, tuples and scalars; anything else is not cached.
+_MAGIC = b"VSC1"
+
+def _frame_bytes(df):
+    table = pa.Table.from_pandas(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as stream:
+        stream.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def _to_json(value, frames):
+    if isinstance(value, pd.DataFrame):
+        frames.append(_frame_bytes(value))
+        return {"__frame__": len(frames) - 1}
+    if isinstance(value, tuple):
+        return {"__tuple__": [_to_json(item, frames) for item in value]}
+    if isinstance(value, list):
+        return [_to_json(item, frames) for item in value]
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value):
+            raise TypeError("Only dicts with string keys can be cached.")
+        return {"__dict__": {key: _to_json(item, frames) for key, item in value.items()}}
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise TypeError(f"Values of type {type(value).__name__} cannot be cached.")
+
+def _from_json(value, frames):
+    if isinstance(value, list):
+        return [_from_json(item, frames) for item in value]
+    if isinstance(value, dict):
+        if "__frame__" in value:
+            return pa.ipc.open_stream(frames[value["__frame__"]]).read_all().to_pandas()
+        if "__tuple__" in value:
+            return tuple(_from_json(item, frames) for item in value["__tuple__"])
+        return {key: _from_json(item, frames) for key, item in value["__dict__"].items()}
+    return value
+
+def encode(value):
+    """Bytes for a cache entry: a length-prefixed JSON document followed by its DataFrames."""
+    frames = []
+    document = json.dumps(_to_json(value, frames), separators=(",", ":")).encode("utf-8")
+    parts = [_MAGIC, struct.pack(">II", len(document), len(frames)), document]
+    for frame in frames:
+        parts += [struct.pack(">Q", len(frame)), frame]
+    return b"".join(parts)
+
+def decode(data):
+    if data[:4] != _MAGIC:
+        raise ValueError("Not a cache entry.")
+    length, count = struct.unpack_from(">II", data, 4)
+    offset = 12 + length
+    document = json.loads(data[12:offset])
+    frames = []
+    for _ in range(count):
+        (size,) = struct.unpack_from(">Q", data, offset)
+        frames.append(data[offset + 8:offset + 8 + size])
+        offset += 8 + size
+    return _from_json(document, frames)
+
+def _encode_within_limit(value):
+    """The entry's bytes, or None if the value cannot be cached or is too large."""
+    try:
+        data = encode(value)
+    except (TypeError, ValueError, pa.ArrowException) as e:
+        print(f"Error encoding cache entry: {e}")
+        return None
+    return data if len(data) <= MAX_VALUE_BYTES else None
+
+# ========== Local Store (SQLite) ==========
+class SQLiteCache:
+    """Cache shared by all processes on one host through a WAL-mode SQLite file.
+
+    Keys are versioned per namespace: invalidating a namespace bumps its version,
+    so every process stops seeing the old entries at once and they age out
+    through TTL/LRU eviction instead of being deleted on the write path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._versions = {}
+        self._sets = 0
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries(accessed_at)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_namespaces (
+                namespace TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        """)
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def version(self, namespace):
+        cached = self._versions.get(namespace)
+        if cached and _now() - cached[1] < VERSION_CHECK_SECONDS:
+            return cached[0]
+        row = self._conn().execute("SELECT version FROM cache_namespaces WHERE namespace = ?",
+                                   (namespace,)).fetchone()
+        version = row[0] if row else 0
+        self._versions[namespace] = (version, _now())
+        return version
+
+    def bump(self, namespace):
+        conn = self._conn()
+        conn.execute("""
+            INSERT INTO cache_namespaces (namespace, version) VALUES (?, 1)
+            ON CONFLICT(namespace) DO UPDATE SET version = version + 1
+        """, (namespace,))
+        version = conn.execute("SELECT version FROM cache_namespaces WHERE namespace = ?", (namespace,)).fetchone()[0]
+        self._versions[namespace] = (version, _now())
+
+    def get(self, key):
+        now = _now()
+        row = self._conn().execute("SELECT value, expires_at, accessed_at FROM cache_entries WHERE key = ?",
+                                   (key,)).fetchone()
+        if row is None or row[1] < now:
+            return _MISS
+        if now - row[2] > TOUCH_SECONDS:
+            self._conn().execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return decode(row[0])
+
+    def set(self, key, value, ttl):
+        data = _encode_within_limit(value)
+        if data is None:
+            return False
+        now = _now()
+        self._conn().execute("""
+            INSERT OR REPLACE INTO cache_entries (key, value, size, expires_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (key, data, len(data), now + ttl, now))
+        self._sets += 1
+        if self._sets % EVICT_EVERY == 0:
+            self.evict()
+        return True
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones beyond the size limits."""
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (_now(),))
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        if count <= MAX_ENTRIES and total <= MAX_BYTES:
+            return
+        excess, freed = max(count - MAX_ENTRIES, 0), 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM cache_entries ORDER BY accessed_at"):
+            if len(victims) >= excess and total - freed <= MAX_BYTES:
+                break
+            victims.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM cache_entries WHERE key = ?", victims)
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache_entries")
+
+# ========== Shared Server (Redis) ==========
+class RedisCache:
+    """Same interface on a Redis-compatible server; LRU is the server's maxmemory-policy."""
+
+    def __init__(self, url):
+        if redis is None:
+            raise ImportError("The redis package is required for a redis:// cache URL.")
+        self.client = redis.Redis.from_url(url)
+        self._versions = {}
+
+    def version(self, namespace):
+        cached = self._versions.get(namespace)
+        if cached and _now() - cached[1] < VERSION_CHECK_SECONDS:
+            return cached[0]
+        version = int(self.client.get(f"vetsmart:ns:{namespace}") or 0)
+        self._versions[namespace] = (version, _now())
+        return version
+
+    def bump(self, namespace):
+        self._versions[namespace] = (self.client.incr(f"vetsmart:ns:{namespace}"), _now())
+
+    def get(self, key):
+        data = self.client.get(f"vetsmart:{key}")
+        return _MISS if data is None else decode(data)
+
+    def set(self, key, value, ttl):
+        data = _encode_within_limit(value)
+        if data is None:
+            return False
+        self.client.set(f"vetsmart:{key}", data, ex=int(ttl))
+        return True
+
+    def clear(self):
+        for key in self.client.scan_iter("vetsmart:*"):
+            self.client.delete(key)
+
+# ========== Process-wide Cache ==========
+_backend = None
+_backend_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "sets": 0, "skipped": 0, "invalidations": 0, "errors": 0}
+
+def backend():
+    """The configured store, opened on first use; None when caching is off."""
+    global _backend
+    with _backend_lock:
+        if _backend is None and CACHE_URL.lower() != "off":
+            try:
+                _backend = RedisCache(CACHE_URL) if CACHE_URL.startswith("redis://") else SQLiteCache(CACHE_URL)
+            except Exception as e:
+                print(f"Error opening cache: {e}")
+                _stats["errors"] += 1
+        return _backend
+
+def versioned_key(store, namespaces, name, args, kwargs):
+    versions = ",".join(f"{ns}@{store.version(ns)}" for ns in namespaces)
+    digest = hashlib.sha1(repr((args, sorted(kwargs.items()))).encode("utf-8")).hexdigest()[:16]
+    return f"{name}|{versions}|{digest}"
+
+def cached(*namespaces, ttl=DEFAULT_TTL):
+    """Caches a function's result under the current versions of the given namespaces.
+
+    Arguments must have a stable repr (ids, strings, numbers). Any failure in the
+    cache tier falls back to calling the function.
+    """
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            store = backend()
+            if store is None:
+                return fn(*args, **kwargs)
+            try:
+                key = versioned_key(store, namespaces, name, args, kwargs)
+                value = store.get(key)
+            except Exception as e:
+                print(f"Error reading cache: {e}")
+                _stats["errors"] += 1
+                return fn(*args, **kwargs)
+            if value is not _MISS:
+                _stats["hits"] += 1
+                return value
+            _stats["misses"] += 1
+            value = fn(*args, **kwargs)
+            try:
+                _stats["sets" if store.set(key, value, ttl) else "skipped"] += 1
+            except Exception as e:
+                print(f"Error writing cache: {e}")
+                _stats["errors"] += 1
+            return value
+
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+def invalidate(*namespaces):
+    """Makes every process stop using entries built from these namespaces."""
+    store = backend()
+    if store is None:
+        return
+    for namespace in namespaces:
+        try:
+            store.bump(namespace)
+            _stats["invalidations"] += 1
+        except Exception as e:
+            print(f"Error invalidating cache: {e}")
+            _stats["errors"] += 1
+
+def invalidates(*namespaces):
+    """For save functions: invalidates the namespaces once the write has succeeded (a non-None result)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            result = fn(*args, **kwargs)
+            if result is not None:
+                invalidate(*namespaces)
+            return result
+        return wrapper
+    return decorator
+
+def stats():
+    lookups = _stats["hits"] + _stats["misses"]
+    return dict(_stats, hit_rate=round(_stats["hits"] / lookups, 3) if lookups else None,
+                backend=type(_backend).__name__ if _backend else "off")
+
+# ========== Multi-process Benchmark ==========
+def _seed(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE livestock (id INTEGER PRIMARY KEY, animal_type TEXT, weight REAL, user_id INTEGER)")
+    conn.execute("CREATE INDEX idx_livestock_user ON livestock(user_id)")
+    conn.executemany("INSERT INTO livestock (animal_type, weight, user_id) VALUES (?, ?, ?)",
+                     ((("Cattle", "Goat", "Sheep")[i % 3], 20 + i % 500, i % 200) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+def _worker(db_path, cache_url, requests, use_cache, results):
+    global CACHE_URL
+    CACHE_URL = cache_url
+
+    def herd_summary(user_id):
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("""
+            SELECT animal_type, COUNT(*), AVG(weight) FROM livestock
+            WHERE user_id = ? GROUP BY animal_type
+        """, (user_id,)).fetchall()
+        conn.close()
+        return rows
+
+    lookup = cached("livestock")(herd_summary) if use_cache else herd_summary
+    start = time.perf_counter()
+    for i in range(requests):
+        lookup(i % 50)
+        if use_cache and i == requests // 2 and os.getpid() % 2 == 0:
+            invalidate("livestock")  # a save_* in one worker must reach the others
+    results.put((time.perf_counter() - start, _stats["hits"], _stats["misses"]))
+
+def benchmark(workers=4, requests=2000, rows=200_000):
+    """Runs several worker processes over the same queries, with and without the shared cache."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "herd.db")
+        _seed(db_path, rows)
+        cache_url = os.path.join(tmp, "cache.db")
+        for use_cache in (False, True):
+            results = multiprocessing.Queue()
+            procs = [multiprocessing.Process(target=_worker, args=(db_path, cache_url, requests, use_cache, results))
+                     for _ in range(workers)]
+            start = time.perf_counter()
+            for p in procs:
+                p.start()
+            outcomes = [results.get() for _ in procs]
+            for p in procs:
+                p.join()
+            elapsed = time.perf_counter() - start
+            hits = sum(o[1] for o in outcomes)
+            misses = sum(o[2] for o in outcomes)
+            label = "shared cache" if use_cache else "no cache"
+            rate = f", hit rate {hits / (hits + misses):.1%}" if use_cache else ""
+            print(f"{label:<13} {workers} workers x {requests} lookups: {elapsed:.2f}s "
+                  f"({workers * requests / elapsed:,.0f} lookups/s){rate}")
+
+if __name__ == "__main__":
+    # Usage: python app/cache.py [workers] [requests_per_worker]
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
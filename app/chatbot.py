@@ -1,5 +1,9 @@
 import time
 import streamlit as st
+import knowledge
+import ratelimit
+import session_memory
+import symptoms
 
 # Define the chatbot response logic
 def chatbot_response(user_input):
@@ -35,7 +39,17 @@ def chatbot_response(user_input):
         "how do i treat foot rot in sheep": "Trim the hoof, clean the wound, and soak the foot in a zinc sulfate solution. Isolate affected animals.",
         "why is my sheep limping": "Likely causes: foot rot, injuries, or joint infections. Check the hoof for wounds or swelling.",
     }
-    return responses.get(user_input.lower(), "I'm not sure how to help with that. Try asking about animal health, feeding, or vaccinations.")
+    if user_input.lower() in responses:
+        return responses[user_input.lower()]
+    # Symptoms described in free text go to the diagnosis engine
+    found = symptoms.diagnose_text(user_input)
+    if found:
+        return symptoms.diagnosis_reply(found)
+    # Other questions are answered from the indexed vet manuals when a passage matches well
+    cited = knowledge.answer(user_input)
+    if cited:
+        return cited
+    return "I'm not sure how to help with that. Try asking about animal health, feeding, or vaccinations."
 
 # Define the chatbot widget for Streamlit
 def chatbot_widget():
@@ -90,6 +104,12 @@ def chatbot_widget():
         st.markdown('<div id="vetchat-container">', unsafe_allow_html=True)
         st.markdown("**🗨️ Ask me anything about livestock care!**")
 
+        # Turns moved out of memory are read back from the archive on request
+        if st.session_state.get("chat_history_archived"):
+            with st.expander("Earlier messages"):
+                for sender, message in session_memory.earlier_turns(st.session_state, "chat_history"):
+                    st.markdown(f"**You:** {message}" if sender == "You" else f"🤖 **VetChat:** {message}")
+
         # Display the chat history
         for sender, message in st.session_state.chat_history:
             if sender == "You":
@@ -102,9 +122,13 @@ def chatbot_widget():
             user_input = st.text_input("Ask VetChat:", key="chat_input", label_visibility="collapsed")
             submitted = st.form_submit_button("Send")
 
-            if submitted and user_input:
+            decision = ratelimit.check("chat", ip=ratelimit.client_ip(st.context),
+                                       user=st.session_state.get("user_id")) if submitted and user_input else None
+            if decision is not None and not decision.allowed:
+                st.warning(ratelimit.message("chat", decision))
+            elif submitted and user_input:
                 # Store the user's question in chat history
-                st.session_state.chat_history.append(("You", user_input))
+                session_memory.remember(st.session_state, "chat_history", ("You", user_input))
 
                 # Simulate typing delay
                 placeholder = st.empty()
@@ -116,7 +140,7 @@ def chatbot_widget():
 
                 # Show the chatbot's response
                 placeholder.markdown(f"🤖 **VetChat:** {response}")
-                st.session_state.chat_history.append(("VetChat", response))
+                session_memory.remember(st.session_state, "chat_history", ("VetChat", response))
 
         # Close the chatbot container
         st.markdown("</div>", unsafe_allow_html=True)
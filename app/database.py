@@ -0,0 +1,846 @@
+import hashlib
+import json
+import secrets
+import sqlite3
+import queue
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+import querylog
+import herd
+import growth
+import sync
+import vaccines
+import reports
+import outbreak
+import writer
+import cache
+import session_memory
+import feedback_analytics
+import audit
+import archive
+import maintenance
+import symptoms
+import export
+
+# ========== Database Configuration ==========
+SQLITE_DB = 'livestock_data.db'
+
+# ========== Database Connection Functions ==========
+def get_sqlite_connection():
+    return sqlite3.connect(SQLITE_DB, timeout=writer.BUSY_TIMEOUT)
+
+def _write(work):
+    """Runs work(conn) on the database's writer thread and waits until it is committed."""
+    return writer.get_writer(SQLITE_DB).submit(work).result(writer.ACK_TIMEOUT)
+
+# ========== Initialize Database and Tables ==========
+def initialize_database():
+    conn = get_sqlite_connection()
+    cursor = conn.cursor()
+
+    # WAL keeps pages readable while the writer thread commits; the mode is stored in the file
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError as e:
+        print(f"Error enabling WAL: {e}")
+
+    # Create users table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            role TEXT NOT NULL,
+            firstname TEXT NOT NULL,
+            lastname TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL, 
+            telephone TEXT NOT NULL,
+            farmname TEXT NOT NULL,
+            farmaddress TEXT NOT NULL,
+            farmrole TEXT NOT NULL,
+            registered_on DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create livestock table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS livestock (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            animal_type TEXT NOT NULL,
+            age REAL NOT NULL,
+            weight REAL NOT NULL,
+            vaccination TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            added_on DATETIME DEFAULT CURRENT_TIMESTAMP,
+            retired_on DATETIME,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    # Create feedback table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            feedback TEXT NOT NULL,
+            submitted_on DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Create veterinarians table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS veterinarians (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            specialization TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            email TEXT NOT NULL,
+            registered_on DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Create vet_requests table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vet_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            farmer_name TEXT NOT NULL,
+            animal_tag TEXT NOT NULL,
+            vet_id INTEGER NOT NULL,
+            request_reason TEXT NOT NULL,
+            requested_on DATETIME DEFAULT CURRENT_TIMESTAMP,
+            animal_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'open',
+            closed_on DATETIME,
+            FOREIGN KEY(vet_id) REFERENCES veterinarians(id),
+            FOREIGN KEY(animal_id) REFERENCES livestock(id)
+        )
+    """)
+
+    # Bearer tokens for the JSON API; only a SHA-256 of each token is kept
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS api_tokens (
+            token_hash TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            created_on DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    # Indexes backing per-user lookups and the Admin analytics aggregates
+    for index_sql in (
+        "CREATE INDEX IF NOT EXISTS idx_livestock_name ON livestock(name)",
+        "CREATE INDEX IF NOT EXISTS idx_livestock_type_vaccination ON livestock(animal_type, vaccination)",
+        "CREATE INDEX IF NOT EXISTS idx_livestock_added_on ON livestock(added_on, animal_type)",
+    ):
+        try:
+            cursor.execute(index_sql)
+        except sqlite3.OperationalError as e:
+            print(f"Error creating index: {e}")
+
+    # Revision counters and triggers for delta sync with field clients
+    sync.install_change_tracking(conn)
+
+    # Weight and health readings over time
+    growth.create_measurements_table(conn)
+
+    # Normalized vaccination records and materialized next due dates
+    vaccines.create_vaccination_tables(conn)
+
+    # Diagnosis history and stored PDF reports
+    reports.create_report_tables(conn)
+
+    # Outbreak monitor checkpoints and raised alerts
+    outbreak.create_outbreak_tables(conn)
+
+    # Chat turns moved out of session memory
+    session_memory.create_chat_archive_table(conn)
+
+    # Term and sentiment aggregates over feedback, advanced incrementally
+    feedback_analytics.create_feedback_analytics_tables(conn)
+
+    # Monthly partitions of the append-only audit log
+    audit.create_audit_tables(conn)
+    audit.configure(SQLITE_DB)
+
+    # Backup and maintenance history, and the lease that keeps one process on the schedule
+    maintenance.create_maintenance_tables(conn)
+
+    # One-off data migrations, recorded so they don't repeat on every rerun
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name TEXT PRIMARY KEY,
+            applied_on DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+    run_migration(conn, "vaccination_due_backfill", vaccines.refresh_missing)
+    run_migration(conn, "livestock_unique_tags", unique_livestock_tags)
+    run_migration(conn, "vet_requests_animal_id", link_vet_requests)
+    run_migration(conn, "archive_lifecycle_columns", add_lifecycle_columns)
+    run_migration(conn, "livestock_born_on", vaccines.add_birth_dates)
+    run_migration(conn, "outbreak_alerts_unique", outbreak.unique_alerts)
+    conn.close()
+
+def run_migration(conn, name, migrate):
+    """Runs migrate(conn) once per database; failures are printed and retried next start."""
+    if querylog.fetch_one(conn, "SELECT 1 FROM schema_migrations WHERE name = ?", (name,)):
+        return
+    try:
+        migrate(conn)
+        querylog.execute(conn, "INSERT INTO schema_migrations (name) VALUES (?)", (name,))
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Error running migration {name}: {e}")
+
+def unique_livestock_tags(conn):
+    """Renames repeated tags within a farm to '<tag>-<id>' (keeping the first) and makes (user_id, name) unique.
+
+    If the farm already has a '<tag>-<id>', a further '-2', '-3', ... is added until the name is free.
+    """
+    repeated = querylog.fetch_all(conn, """
+        SELECT id, user_id, name FROM livestock
+        WHERE id NOT IN (SELECT MIN(id) FROM livestock GROUP BY user_id, name)
+        ORDER BY id
+    """)
+    for animal_id, user_id, name in repeated:
+        candidate, attempt = f"{name}-{animal_id}", 1
+        while querylog.fetch_one(conn, "SELECT 1 FROM livestock WHERE user_id = ? AND name = ?", (user_id, candidate)):
+            attempt += 1
+            candidate = f"{name}-{animal_id}-{attempt}"
+        querylog.execute(conn, "UPDATE livestock SET name = ? WHERE id = ?", (candidate, animal_id))
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_livestock_user_name ON livestock(user_id, name)")
+    # The unique index leads with user_id, so the single-column index is redundant
+    conn.execute("DROP INDEX IF EXISTS idx_livestock_user")
+
+def link_vet_requests(conn):
+    """Adds vet_requests.animal_id and fills it where the free-text tag names exactly one animal.
+
+    Runs once per database (see run_migration); later requests record animal_id when they are created.
+    """
+    if "animal_id" not in {row[1] for row in conn.execute("PRAGMA table_info(vet_requests)")}:
+        conn.execute("ALTER TABLE vet_requests ADD COLUMN animal_id INTEGER REFERENCES livestock(id)")
+    # One grouped pass over livestock instead of a COUNT and a MIN per request
+    querylog.execute(conn, """
+        UPDATE vet_requests SET animal_id = tags.id
+        FROM (SELECT name, MIN(id) AS id FROM livestock GROUP BY name HAVING COUNT(*) = 1) AS tags
+        WHERE tags.name = vet_requests.animal_tag AND vet_requests.animal_id IS NULL
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vet_requests_animal ON vet_requests(animal_id)")
+
+def add_lifecycle_columns(conn):
+    """Adds vet request status/closed_on and livestock retired_on, with the indexes the archive job selects on."""
+    request_columns = {row[1] for row in conn.execute("PRAGMA table_info(vet_requests)")}
+    if "status" not in request_columns:
+        conn.execute("ALTER TABLE vet_requests ADD COLUMN status TEXT NOT NULL DEFAULT 'open'")
+    if "closed_on" not in request_columns:
+        conn.execute("ALTER TABLE vet_requests ADD COLUMN closed_on DATETIME")
+    if "retired_on" not in {row[1] for row in conn.execute("PRAGMA table_info(livestock)")}:
+        conn.execute("ALTER TABLE livestock ADD COLUMN retired_on DATETIME")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vet_requests_status ON vet_requests(status, closed_on)")
+    # Partial: only the few retired animals are indexed
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_livestock_retired ON livestock(retired_on) WHERE retired_on IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_submitted_on ON feedback(submitted_on)")
+
+# ========== Load & Save Data Functions ==========
+# Users
+# Password hashes stay out of load_users: its result is kept in the shared cache
+@cache.cached("users")
+def load_users():
+    """Every user without the password hash; find_user reads that for logins."""
+    conn = get_sqlite_connection()
+    df = querylog.read_sql(conn, """
+        SELECT id, role, firstname, lastname, email, telephone, farmname, farmaddress, farmrole, registered_on
+        FROM users
+    """)
+    conn.close()
+    return df
+
+@cache.invalidates("users")
+def save_users(role, firstname, lastname, email, password, telephone, farmname, farmaddress, farmrole):
+    """Returns the new user id, or None if the write failed."""
+    try:
+        user_id = _write(lambda conn: querylog.execute(conn, """
+            INSERT INTO users (role, firstname, lastname, email, password, telephone, farmname, farmaddress, farmrole, registered_on)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (role, firstname, lastname, email, password, telephone, farmname, farmaddress, farmrole, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))).lastrowid)
+    except Exception as e:
+        print(f"Error saving users: {e}")
+        return None
+    # A new account has no signed-in actor yet; it is attributed to itself
+    audit.record("user.signup", user_id, {"role": role, "email": email}, actor_id=user_id)
+    return user_id
+
+def existing_emails(emails):
+    """The subset of emails already registered, found with one query on the unique email index."""
+    emails = list(emails)
+    if not emails:
+        return set()
+    conn = get_sqlite_connection()
+    rows = querylog.fetch_all(conn, "SELECT email FROM users WHERE email IN (SELECT value FROM json_each(?))",
+                              (json.dumps(emails),))
+    conn.close()
+    return {row[0] for row in rows}
+
+@cache.invalidates("users")
+def save_users_batch(rows):
+    """Inserts user rows (tuples in save_users argument order) in one transaction.
+
+    Emails registered since they were checked are skipped. Returns the emails
+    actually inserted, or None if the write failed.
+    """
+    def insert(conn):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        inserted = []
+        for row in rows:
+            cursor = conn.execute("""
+                INSERT INTO users (role, firstname, lastname, email, password, telephone, farmname, farmaddress, farmrole, registered_on)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(email) DO NOTHING
+            """, tuple(row) + (now,))
+            if cursor.rowcount == 1:
+                inserted.append(row[3])
+        return inserted
+
+    try:
+        inserted = _write(insert)
+    except Exception as e:
+        print(f"Error saving users: {e}")
+        return None
+    if inserted:
+        audit.record("user.provision", detail={"count": len(inserted), "emails": inserted})
+    return inserted
+
+def find_user(email):
+    """(password, role, firstname, lastname, id) for a login email, or None."""
+    conn = get_sqlite_connection()
+    row = querylog.fetch_one(conn, "SELECT password, role, firstname, lastname, id FROM users WHERE email = ?", (email,))
+    conn.close()
+    return row
+
+# Livestock
+@cache.cached("livestock")
+def load_data(user_id=None, include_archived=False):
+    """The herd; retired animals only with include_archived, which also reads the archive files."""
+    try:
+        conn = get_sqlite_connection()
+        # Typed load: categorical Type/Vaccination, float32 Age/Weight, parsed Date Added
+        df = herd.load_herd(conn, user_id=user_id, include_retired=include_archived)
+        conn.close()
+    except FileNotFoundError:
+        return pd.DataFrame()
+    if include_archived:
+        cold = archive.load_archived("livestock", where=None if user_id is None else {"user_id": int(user_id)},
+                                     columns=herd.HERD_FIELDS)
+        if not cold.empty:
+            cold = herd.shape_herd(cold[~cold["id"].isin(df["id"])].astype(herd.HERD_DTYPES))
+            df = pd.concat([cold, df], ignore_index=True).astype({"Type": "category", "Vaccination": "category"})
+    return df
+        
+def find_animal(animal_id):
+    """One animal by id, as a dict with the herd display columns, or None."""
+    conn = get_sqlite_connection()
+    row = querylog.fetch_one(conn, f"{herd.HERD_QUERY} WHERE id = ?", (int(animal_id),))
+    conn.close()
+    if row is None:
+        return None
+    return herd.animal_record(row)
+
+def find_tag(name, user_id):
+    """(id, retired_on) of the farm's animal with this tag, retired or not, or None."""
+    conn = get_sqlite_connection()
+    row = querylog.fetch_one(conn, "SELECT id, retired_on FROM livestock WHERE user_id = ? AND name = ?",
+                             (user_id, name))
+    conn.close()
+    return row
+
+def search_animals(prefix, user_id=None, limit=20):
+    """Animals whose tag starts with prefix, in tag order, as (id, name, animal_type) rows.
+
+    A range on the tag rather than LIKE, so the lookup is a seek on the (user_id, name)
+    index for one farm, or on the name index across farms.
+    """
+    sql = "SELECT id, name, animal_type FROM livestock WHERE name >= ? AND name < ? AND retired_on IS NULL"
+    params = (prefix, prefix + "\U0010ffff")
+    if user_id is not None:
+        sql += " AND user_id = ?"
+        params += (user_id,)
+    conn = get_sqlite_connection()
+    rows = querylog.fetch_all(conn, sql + " ORDER BY name LIMIT ?", params + (limit,))
+    conn.close()
+    return rows
+
+def export_livestock(fmt, search_tag=None, **filters):
+    """The View Livestock rows as a rewound file in an export.EXPORT_FORMATS format."""
+    conn = get_sqlite_connection()
+    try:
+        return export.export_livestock(conn, fmt, search_tag=search_tag, **filters)
+    finally:
+        conn.close()
+
+@cache.invalidates("livestock")
+def save_livestock_data(name, animal_type, age, weight, vaccination, user_id):
+    """Adds the animal, or updates it if the farm already has this tag.
+
+    Returns the animal id, or None if the write failed.
+    """
+    def upsert(conn):
+        animal_id = querylog.execute(conn, """
+            INSERT INTO livestock (name, animal_type, age, weight, vaccination, user_id, added_on)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, name) DO UPDATE SET
+                animal_type = excluded.animal_type, age = excluded.age,
+                weight = excluded.weight, vaccination = excluded.vaccination, retired_on = NULL
+            RETURNING id
+        """, (name, animal_type, age, weight, vaccination, user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))).fetchone()[0]
+        vaccines.refresh_due(conn, [animal_id], commit=False)
+        return animal_id
+
+    try:
+        animal_id = _write(upsert)
+    except Exception as e:
+        print(f"Error saving livestock data: {e}")
+        return None
+    audit.record("livestock.save", animal_id, {"tag": name, "type": animal_type, "owner": user_id})
+    return animal_id
+
+@cache.invalidates("livestock")
+def retire_animal(animal_id):
+    """Marks a sold or deceased animal as retired; the archive job moves it out later.
+
+    Returns the animal id, or None if the write failed or it was already retired.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def retire(conn):
+        retired = querylog.execute(conn, """
+            UPDATE livestock SET retired_on = ? WHERE id = ? AND retired_on IS NULL
+        """, (now, int(animal_id))).rowcount
+        querylog.execute(conn, "DELETE FROM vaccination_due WHERE animal_id = ?", (int(animal_id),))
+        return retired
+
+    try:
+        retired = _write(retire)
+    except Exception as e:
+        print(f"Error retiring animal: {e}")
+        return None
+    if not retired:
+        return None
+    audit.record("livestock.retire", animal_id)
+    return int(animal_id)
+
+# Feedback
+@cache.cached("feedback")
+def load_feedback(include_archived=False):
+    conn = get_sqlite_connection()
+    df = querylog.read_sql(conn, "SELECT * FROM feedback")
+    conn.close()
+    return archive.with_archived(df, "feedback") if include_archived else df
+
+def refresh_outbreak_monitor():
+    """Brings the shared outbreak checkpoint up to date through the writer; returns this process's monitor."""
+    conn = get_sqlite_connection()
+    try:
+        return outbreak.refresh(conn, _write)
+    finally:
+        conn.close()
+
+def update_feedback_analytics():
+    """Folds new feedback into the analytics aggregates through the writer; returns how many rows were processed."""
+    conn = get_sqlite_connection()
+    try:
+        return feedback_analytics.update(conn, _write)
+    finally:
+        conn.close()
+
+@cache.invalidates("feedback")
+def save_feedback(name, feedback_text):
+    """Returns the new row id, or None if the write failed."""
+    try:
+        return _write(lambda conn: querylog.execute(conn, """
+            INSERT INTO feedback (name, feedback, submitted_on)
+            VALUES (?, ?, ?)
+        """, (name, feedback_text, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))).lastrowid)
+    except Exception as e:
+        print(f"Error saving feedback: {e}")
+        return None
+
+# Veterinarians
+@cache.cached("veterinarians")
+def load_veterinarians():
+    conn = get_sqlite_connection()
+    df = querylog.read_sql(conn, "SELECT * FROM veterinarians")
+    conn.close()
+    return df
+
+@cache.invalidates("veterinarians")
+def save_veterinarian(name, specialization, phone, email):
+    """Returns the new row id, or None if the write failed."""
+    try:
+        vet_id = _write(lambda conn: querylog.execute(conn, """
+            INSERT INTO veterinarians (name, specialization, phone, email, registered_on)
+            VALUES (?, ?, ?, ?, ?)
+        """, (name, specialization, phone, email, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))).lastrowid)
+    except Exception as e:
+        print(f"Error saving veterinarian: {e}")
+        return None
+    audit.record("veterinarian.register", vet_id, {"name": name, "specialization": specialization})
+    return vet_id
+
+# Vet Requests
+@cache.cached("vet_requests")
+def load_vet_requests(include_archived=False):
+    conn = get_sqlite_connection()
+    df = querylog.read_sql(conn, "SELECT * FROM vet_requests")
+    conn.close()
+    return archive.with_archived(df, "vet_requests") if include_archived else df
+
+@cache.cached("vet_requests")
+def open_vet_requests():
+    """Open requests with the symptoms found in each reason."""
+    requests = load_vet_requests()
+    if "status" not in requests.columns:
+        return requests.iloc[0:0].assign(symptoms=[])
+    open_requests = requests[requests["status"] == "open"]
+    return open_requests.assign(
+        symptoms=[", ".join(symptoms.extract(reason)["symptoms"]) for reason in open_requests["request_reason"]])
+
+@cache.invalidates("vet_requests")
+def close_vet_requests(request_ids):
+    """Closes open requests; returns the ids actually closed, or None if the write failed."""
+    ids = [int(i) for i in request_ids]
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def close(conn):
+        return [row[0] for row in querylog.execute(conn, """
+            UPDATE vet_requests SET status = 'closed', closed_on = ?
+            WHERE status = 'open' AND id IN (SELECT value FROM json_each(?))
+            RETURNING id
+        """, (now, json.dumps(ids))).fetchall()]
+
+    try:
+        closed = _write(close)
+    except Exception as e:
+        print(f"Error closing vet requests: {e}")
+        return None
+    for request_id in closed:
+        audit.record("vet_request.close", request_id)
+    return closed
+
+@cache.invalidates("vet_requests")
+def save_vet_request(farmer_name, animal_tag, vet_id, request_reason, animal_id=None):
+    """Returns the new row id, or None if the write failed."""
+    vet_id = int(vet_id)
+    animal_id = None if animal_id is None else int(animal_id)
+    try:
+        request_id = _write(lambda conn: querylog.execute(conn, """
+            INSERT INTO vet_requests (farmer_name, animal_tag, vet_id, request_reason, animal_id, requested_on)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (farmer_name, animal_tag, vet_id, request_reason, animal_id,
+              datetime.now().strftime("%Y-%m-%d %H:%M:%S"))).lastrowid)
+    except Exception as e:
+        print(f"Error saving vet request: {e}")
+        return None
+    audit.record("vet_request.create", request_id, {"vet_id": vet_id, "animal_id": animal_id, "tag": animal_tag})
+    return request_id
+
+# Health Records
+@cache.invalidates("livestock")
+def record_measurement(animal_id, weight=None, temperature=None, body_condition=None):
+    """Returns True, or None if the write failed."""
+    try:
+        _write(lambda conn: growth.record_measurement(conn, int(animal_id), weight, temperature, body_condition))
+    except Exception as e:
+        print(f"Error recording measurement: {e}")
+        return None
+    return True
+
+@cache.invalidates("livestock")
+def record_vaccination(animal_id, vaccine, given_on, notes=""):
+    """Records a dose and moves the animal's due dates; returns True, or None if the write failed."""
+    try:
+        _write(lambda conn: vaccines.record_vaccination(conn, int(animal_id), vaccine, given_on, notes))
+    except Exception as e:
+        print(f"Error recording vaccination: {e}")
+        return None
+    return True
+
+def record_diagnosis(barcode_id, animal_id, user_id, symptoms, disease, recommendation, model_version,
+                     pdf_bytes=None):
+    """Saves a diagnosis and its report together; returns the diagnosis id, or None if the write failed."""
+    try:
+        diagnosis_id = _write(lambda conn: reports.record_diagnosis(
+            conn, barcode_id, animal_id, user_id, symptoms, disease, recommendation, model_version, pdf_bytes))
+    except Exception as e:
+        print(f"Error saving diagnosis: {e}")
+        return None
+    audit.record("livestock.diagnose", animal_id, {"barcode": barcode_id, "disease": disease}, actor_id=user_id)
+    return diagnosis_id
+
+def record_diagnoses(rows, model_version=None):
+    """Saves a batch of report-less diagnoses (see reports.record_diagnoses); returns their barcode ids."""
+    barcodes = _write(lambda conn: reports.record_diagnoses(conn, rows, model_version))
+    for barcode, row in zip(barcodes, rows):
+        audit.record("livestock.diagnose", row.get("animal_id"),
+                     {"barcode": barcode, "disease": row["disease"], "source": "api"}, actor_id=row.get("user_id"))
+    return barcodes
+
+# ========== Delta Sync ==========
+def push_client_changes(edits, user_id=None):
+    """Applies a field client's queued edits through the writer, all or none.
+
+    Returns sync.apply_client_changes' result; conflicting uploads come back
+    with "conflicts" and nothing applied. With user_id, edits to another
+    farm's rows raise PermissionError and nothing is applied.
+    """
+    try:
+        result = _write(lambda conn: sync.apply_client_changes(conn, edits, user_id=user_id))
+    except sync.SyncConflict as e:
+        return sync.conflict_result(e)
+    tables = sorted({edit["table"] for edit in edits})
+    cache.invalidate(*tables)
+    if result["applied"]:
+        audit.record("sync.push", detail={"applied": result["applied"], "tables": tables,
+                                          "inserted": list(result["inserted"].values())})
+    return result
+
+# ========== Cold Data Archive ==========
+def archive_cold_data(tables=None):
+    """Moves cold rows of the local file into the monthly archives; returns archive.run's report or None."""
+    conn = get_sqlite_connection()
+    try:
+        report = archive.run(conn, _write, tables)
+    except Exception as e:
+        print(f"Error archiving cold data: {e}")
+        return None
+    finally:
+        conn.close()
+    moved = [table for table, result in report.items() if result["rows"]]
+    if moved:
+        cache.invalidate(*moved)
+    return report
+
+@cache.cached(*archive.POLICIES, ttl=600)
+def live_row_counts():
+    """Rows each archived table still holds in the local file."""
+    conn = get_sqlite_connection()
+    try:
+        return {table: querylog.fetch_one(conn, f"SELECT COUNT(*) FROM {table}")[0] for table in archive.POLICIES}
+    finally:
+        conn.close()
+
+# ========== Connection Pool ==========
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared by request-handling threads."""
+
+    def __init__(self, path=SQLITE_DB, size=8, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._idle.put(None)  # opened lazily on first use
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get(timeout=self.timeout)
+        try:
+            if conn is None:
+                conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            yield conn
+        except Exception:
+            if conn is not None:
+                conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            if conn is not None:
+                conn.close()
+
+# ========== API Tokens ==========
+def _token_hash(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def issue_api_token(user_id):
+    """Creates a bearer token for the user and returns it; it cannot be shown again."""
+    token = secrets.token_urlsafe(32)
+    _write(lambda conn: querylog.execute(conn, """
+        INSERT INTO api_tokens (token_hash, user_id, created_on) VALUES (?, ?, ?)
+    """, (_token_hash(token), int(user_id), datetime.now().strftime("%Y-%m-%d %H:%M:%S"))))
+    return token
+
+def revoke_api_tokens(user_id):
+    """Deletes every token of the user; returns how many there were."""
+    return _write(lambda conn: querylog.execute(conn, "DELETE FROM api_tokens WHERE user_id = ?",
+                                                (int(user_id),)).rowcount)
+
+def api_token_user(conn, token):
+    """(user_id, role) for a bearer token, or None."""
+    return querylog.fetch_one(conn, """
+        SELECT u.id, u.role FROM api_tokens t JOIN users u ON u.id = t.user_id WHERE t.token_hash = ?
+    """, (_token_hash(token),))
+
+# ========== Batch Operations ==========
+# Writable fields per table for batch create/update; ids and timestamps are server-side.
+# "owner" selects the rows a user owns: their animals, and requests about their animals.
+BATCH_TABLES = {
+    "livestock": {
+        "fields": ("name", "animal_type", "age", "weight", "vaccination", "user_id"),
+        "required": ("name", "animal_type", "user_id"),
+        "timestamp": "added_on",
+        "unique": ("user_id", "name"),  # creating an existing tag updates it
+        "owner": "user_id = ?",
+    },
+    "vet_requests": {
+        "fields": ("farmer_name", "animal_tag", "vet_id", "request_reason", "animal_id"),
+        "required": ("farmer_name", "animal_tag", "vet_id", "request_reason"),
+        "timestamp": "requested_on",
+        "owner": "animal_id IN (SELECT id FROM livestock WHERE user_id = ?)",
+    },
+}
+
+def _batch_spec(table):
+    if table not in BATCH_TABLES:
+        raise ValueError(f"Unknown table '{table}'.")
+    return BATCH_TABLES[table]
+
+def unowned_ids(conn, table, ids, owner_id):
+    """The ids among ids that are not rows of owner_id's (missing rows included), in input order."""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return []
+    owned = {row[0] for row in querylog.fetch_all(conn, f"""
+        SELECT id FROM {table} WHERE id IN (SELECT value FROM json_each(?)) AND {_batch_spec(table)["owner"]}
+    """, (json.dumps(ids), owner_id))}
+    return [i for i in ids if i not in owned]
+
+def _check_owner(conn, table, items, owner_id, existing):
+    """Raises PermissionError unless owner_id may write every item; existing items are checked by id.
+
+    Livestock items are assigned to owner_id; a vet request must name one of the owner's animals.
+    """
+    if table == "livestock":
+        for position, item in enumerate(items):
+            if item.get("user_id") not in (None, owner_id):
+                raise PermissionError(f"Item {position} belongs to another user.")
+            if not existing:
+                item["user_id"] = owner_id
+    if table == "vet_requests":
+        animal_ids = [item.get("animal_id") for item in items if not existing or "animal_id" in item]
+        if None in animal_ids:
+            raise PermissionError("Vet requests must name one of your animals (animal_id).")
+        foreign = unowned_ids(conn, "livestock", animal_ids, owner_id)
+        if foreign:
+            raise PermissionError(f"Not your animals: {', '.join(map(str, foreign))}.")
+    if existing:
+        foreign = unowned_ids(conn, table, [item["id"] for item in items], owner_id)
+        if foreign:
+            raise PermissionError(f"Not your {table} rows: {', '.join(map(str, foreign))}.")
+
+def create_batch(table, items, owner_id=None):
+    """Inserts all items in one transaction on the writer and returns their new ids.
+
+    With owner_id, the rows are created for that user and may only refer to their animals.
+    """
+    spec = _batch_spec(table)
+    columns = spec["fields"] + (spec["timestamp"],)
+    sql = f"""
+        INSERT INTO {table} ({", ".join(columns)})
+        VALUES ({", ".join("?" for _ in columns)})
+    """
+    if "unique" in spec:
+        updates = ", ".join(f"{f} = excluded.{f}" for f in spec["fields"] if f not in spec["unique"])
+        # Registering a retired tag again brings the animal back, as save_livestock_data does
+        sql += f"ON CONFLICT({', '.join(spec['unique'])}) DO UPDATE SET {updates}, retired_on = NULL\n"
+    sql += "RETURNING id"
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def insert(conn):
+        # The ownership check runs in the write transaction, so rows cannot change hands in between
+        if owner_id is not None:
+            _check_owner(conn, table, items, owner_id, existing=False)
+        for position, item in enumerate(items):
+            missing = [f for f in spec["required"] if item.get(f) in (None, "")]
+            if missing:
+                raise ValueError(f"Item {position} is missing {', '.join(missing)}.")
+        ids = []
+        for item in items:
+            values = tuple(item.get(f, "" if f == "vaccination" else None) for f in spec["fields"])
+            ids.append(querylog.execute(conn, sql, values + (now,)).fetchone()[0])
+        if table == "livestock":
+            vaccines.refresh_due(conn, ids, commit=False)
+        return ids
+
+    ids = _write(insert)
+    cache.invalidate(table)
+    action = {"livestock": "livestock.save", "vet_requests": "vet_request.create"}[table]
+    for new_id, item in zip(ids, items):
+        audit.record(action, new_id, {"source": "api", "tag": item.get("name") or item.get("animal_tag")})
+    return ids
+
+def update_batch(table, items, owner_id=None):
+    """Applies partial updates ({"id": ..., field: value}) in one transaction on the writer.
+
+    With owner_id, every id must be one of that user's rows.
+    """
+    spec = _batch_spec(table)
+    for position, item in enumerate(items):
+        if "id" not in item:
+            raise ValueError(f"Item {position} has no id.")
+
+    def update(conn):
+        if owner_id is not None:
+            _check_owner(conn, table, items, owner_id, existing=True)
+        updated = []
+        rescheduled = []
+        for item in items:
+            values = {f: item[f] for f in spec["fields"] if f in item}
+            if not values:
+                continue
+            assignments = ", ".join(f"{f} = ?" for f in values)
+            cursor = querylog.execute(conn, f"UPDATE {table} SET {assignments} WHERE id = ?",
+                                      (*values.values(), item["id"]))
+            if cursor.rowcount:
+                updated.append((item["id"], sorted(values)))
+            if table == "livestock" and {"age", "animal_type", "user_id"} & set(values):
+                rescheduled.append(item["id"])
+        vaccines.refresh_due(conn, rescheduled, commit=False)
+        return updated
+
+    updated = _write(update)
+    cache.invalidate(table)
+    action = {"livestock": "livestock.update", "vet_requests": "vet_request.update"}[table]
+    for row_id, fields in updated:
+        audit.record(action, row_id, {"source": "api", "fields": fields})
+    return len(updated)
+
+def iter_batch(conn, table, ids=None, user_id=None, after_id=0, limit=1000):
+    """Yields rows as dicts in id order, by explicit ids or keyset pagination.
+
+    With user_id, only that user's rows (see BATCH_TABLES "owner") are returned in either mode.
+    """
+    spec = _batch_spec(table)
+    columns = ("id",) + spec["fields"] + (spec["timestamp"],)
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if ids:
+        sql += f" WHERE id IN ({', '.join('?' for _ in ids)})"
+        params = tuple(ids)
+    else:
+        sql += " WHERE id > ?"
+        params = (after_id,)
+    if user_id is not None:
+        sql += f" AND {spec['owner']}"
+        params += (user_id,)
+    sql += " ORDER BY id"
+    if not ids:
+        sql += " LIMIT ?"
+        params += (limit,)
+    for row in querylog.iter_fetch(conn, sql, params):
+        yield dict(zip(columns, row))
@@ -0,0 +1,243 @@
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# ========== Model Artifact ==========
+# A model is a JSON artifact: a version, and per disease its treatment, a weight
+# per symptom and a prior per animal type. Since the symptom list is fixed, every
+# possible input is scored once when a model loads, into a table indexed by
+# (animal type, symptom bitmask); a diagnosis is then a single tuple index.
+SYMPTOMS = ["Fever", "Coughing", "Diarrhea", "Loss of appetite", "Lameness", "Swelling"]
+SYMPTOM_BITS = {symptom: 1 << position for position, symptom in enumerate(SYMPTOMS)}
+ANIMAL_TYPES = ["Cattle", "Goat", "Sheep", "default"]  # other types use the "default" priors
+MASKS = 1 << len(SYMPTOMS)
+
+MODEL_PATH = os.environ.get("VETSMART_MODEL_PATH", "models/diagnosis_model.json")
+RELOAD_CHECK_SECONDS = 5       # how often lookups look at the artifact's modification time
+TOP_K = 3
+NO_DISEASE = ("None", 1.0, "No disease detected.")
+
+# Used until an artifact is published at MODEL_PATH
+BASELINE_MODEL = {
+    "version": "weighted-baseline-2",
+    "diseases": {
+        "Foot-and-Mouth": {
+            "treatment": "Vaccinate and isolate affected livestock.",
+            "weights": {"Fever": 1.5, "Lameness": 2.0, "Loss of appetite": 1.0, "Swelling": 0.5},
+            "priors": {"Cattle": 0.35, "Goat": 0.25, "Sheep": 0.25, "default": 0.25},
+        },
+        "Anthrax": {
+            "treatment": "Antibiotic treatment and quarantine infected animals.",
+            "weights": {"Fever": 2.0, "Swelling": 1.5, "Diarrhea": 1.0, "Loss of appetite": 0.5},
+            "priors": {"Cattle": 0.15, "Goat": 0.1, "Sheep": 0.15, "default": 0.15},
+        },
+        "PPR": {
+            "treatment": "Supportive care and vaccines.",
+            "weights": {"Fever": 1.5, "Diarrhea": 2.0, "Coughing": 1.5, "Loss of appetite": 1.0},
+            "priors": {"Cattle": 0.02, "Goat": 0.4, "Sheep": 0.35, "default": 0.2},
+        },
+        "Mastitis": {
+            "treatment": "Treat with antibiotics and maintain hygiene.",
+            "weights": {"Swelling": 2.0, "Fever": 0.5, "Loss of appetite": 0.5},
+            "priors": {"Cattle": 0.48, "Goat": 0.25, "Sheep": 0.25, "default": 0.4},
+        },
+    },
+}
+
+def validate_model(model):
+    """Raises ValueError unless the artifact has a version and well-formed diseases."""
+    if not isinstance(model.get("version"), str) or not model["version"]:
+        raise ValueError("Model artifact has no version.")
+    diseases = model.get("diseases")
+    if not isinstance(diseases, dict) or not diseases:
+        raise ValueError("Model artifact has no diseases.")
+    for name, spec in diseases.items():
+        unknown = set(spec.get("weights", {})) - set(SYMPTOMS)
+        if unknown:
+            raise ValueError(f"{name}: unknown symptoms {', '.join(sorted(unknown))}.")
+        if not isinstance(spec.get("treatment"), str):
+            raise ValueError(f"{name}: no treatment.")
+        if spec.get("priors", {}).get("default", 0) <= 0:
+            raise ValueError(f"{name}: needs a positive 'default' prior.")
+
+def score(model, mask, animal_type):
+    """Ranked (disease, probability, treatment) for one input: the per-request inference the table replaces."""
+    if mask == 0:
+        return (NO_DISEASE,)
+    logits = {}
+    for name, spec in model["diseases"].items():
+        priors = spec["priors"]
+        prior = priors.get(animal_type, priors["default"])
+        if prior <= 0:
+            continue
+        logits[name] = math.log(prior) + sum(weight for symptom, weight in spec.get("weights", {}).items()
+                                             if mask & SYMPTOM_BITS[symptom])
+    if not logits:
+        return (NO_DISEASE,)
+    peak = max(logits.values())
+    total = sum(math.exp(value - peak) for value in logits.values())
+    ranked = sorted(logits, key=logits.get, reverse=True)[:TOP_K]
+    return tuple((name, round(math.exp(logits[name] - peak) / total, 3), model["diseases"][name]["treatment"])
+                 for name in ranked)
+
+# ========== Lookup Table ==========
+def build_table(model, source="built-in"):
+    """Scores every (animal type, mask) pair; returns the table to swap in."""
+    validate_model(model)
+    start = time.perf_counter()
+    rows = tuple(score(model, mask, animal_type) for animal_type in ANIMAL_TYPES for mask in range(MASKS))
+    return {
+        "version": model["version"],
+        "rows": rows,
+        "source": source,
+        "built_on": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "build_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+def symptom_mask(symptoms):
+    mask = 0
+    for symptom in symptoms:
+        if symptom not in SYMPTOM_BITS:
+            raise ValueError(f"Unknown symptom: {symptom}.")
+        mask |= SYMPTOM_BITS[symptom]
+    return mask
+
+# The active table is replaced by assigning a new object, so a lookup that has
+# read it keeps a complete table even while a reload swaps in the next one.
+_active = build_table(BASELINE_MODEL)
+_artifact_stamp = None
+_last_check = 0.0
+_reload_lock = threading.Lock()
+_stats = {"lookups": 0, "reloads": 0, "reload_errors": 0}
+
+def _stamp(path):
+    try:
+        info = os.stat(path)
+        return info.st_mtime_ns, info.st_size
+    except OSError:
+        return None
+
+def reload(path=None):
+    """Builds a table from the artifact at path and swaps it in; returns the new version.
+
+    The old table keeps serving until the swap, and stays if the artifact is
+    missing or invalid.
+    """
+    global _active, _artifact_stamp
+    path = path or MODEL_PATH
+    with _reload_lock:
+        stamp = _stamp(path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                table = build_table(json.load(f), source=path)
+        except (OSError, ValueError) as e:
+            print(f"Error loading diagnosis model {path}: {e}")
+            _stats["reload_errors"] += 1
+            _artifact_stamp = stamp  # not retried until the file changes again
+            return None
+        _active = table
+        _artifact_stamp = stamp
+        _stats["reloads"] += 1
+        return table["version"]
+
+def _check_for_new_model():
+    """At most every RELOAD_CHECK_SECONDS: starts a background rebuild if the artifact changed."""
+    global _last_check
+    now = time.monotonic()
+    if now - _last_check < RELOAD_CHECK_SECONDS:
+        return
+    _last_check = now
+    stamp = _stamp(MODEL_PATH)
+    if stamp is not None and stamp != _artifact_stamp and not _reload_lock.locked():
+        threading.Thread(target=reload, name="diagnosis-model-reload", daemon=True).start()
+
+def diagnose(symptoms, animal_type=None):
+    """Ranked diagnoses for the symptoms, from the active table.
+
+    Returns {"disease", "recommendation", "ranked": [(disease, probability, treatment), ...], "model_version"}.
+    """
+    _check_for_new_model()
+    table = _active
+    type_index = ANIMAL_TYPES.index(animal_type) if animal_type in ANIMAL_TYPES else len(ANIMAL_TYPES) - 1
+    ranked = table["rows"][type_index * MASKS + symptom_mask(symptoms)]
+    _stats["lookups"] += 1
+    return {"disease": ranked[0][0], "recommendation": ranked[0][2], "ranked": list(ranked),
+            "model_version": table["version"]}
+
+def predict_disease(symptoms, animal_type=None):
+    """(disease, recommendation) of the top-ranked diagnosis."""
+    result = diagnose(symptoms, animal_type)
+    return result["disease"], result["recommendation"]
+
+def model_version():
+    return _active["version"]
+
+def model_status():
+    table = _active
+    return dict(_stats, version=table["version"], source=table["source"], built_on=table["built_on"],
+                build_ms=table["build_ms"], entries=len(table["rows"]), path=MODEL_PATH)
+
+def export_model(path, model=BASELINE_MODEL):
+    """Writes a model artifact atomically, so a watching process never reads half a file."""
+    validate_model(model)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = path + ".partial"
+    with open(partial, "w", encoding="utf-8") as f:
+        json.dump(model, f, indent=2)
+    os.replace(partial, path)
+
+# ========== Benchmark ==========
+def benchmark(requests=200_000, reloads=20):
+    """Compares per-request scoring with table lookups, then hot-reloads under concurrent lookups."""
+    global MODEL_PATH, RELOAD_CHECK_SECONDS
+    inputs = [(ANIMAL_TYPES[i % 3], [s for s in SYMPTOMS if (i * 7919) & SYMPTOM_BITS[s]]) for i in range(1024)]
+
+    start = time.perf_counter()
+    for i in range(requests):
+        animal_type, symptoms = inputs[i % len(inputs)]
+        score(BASELINE_MODEL, symptom_mask(symptoms), animal_type)
+    inference = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(requests):
+        animal_type, symptoms = inputs[i % len(inputs)]
+        diagnose(symptoms, animal_type)
+    lookup = time.perf_counter() - start
+    print(f"{requests:,} diagnoses: scoring {inference / requests * 1e6:.2f} us each, "
+          f"table lookup {lookup / requests * 1e6:.2f} us each ({inference / lookup:.1f}x); "
+          f"table of {len(_active['rows'])} entries built in {_active['build_ms']} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        MODEL_PATH, RELOAD_CHECK_SECONDS = os.path.join(tmp, "model.json"), 0.01
+        stop, latencies, versions = threading.Event(), [], set()
+
+        def serve():
+            while not stop.is_set():
+                t = time.perf_counter()
+                versions.add(diagnose(["Fever", "Swelling"], "Cattle")["model_version"])
+                latencies.append(time.perf_counter() - t)
+
+        client = threading.Thread(target=serve)
+        client.start()
+        for n in range(reloads):
+            export_model(MODEL_PATH, dict(BASELINE_MODEL, version=f"benchmark-{n}"))
+            time.sleep(0.05)
+        stop.set()
+        client.join()
+        latencies.sort()
+        print(f"{reloads} hot reloads during {len(latencies):,} lookups: {len(versions)} versions served, "
+              f"p50 {latencies[len(latencies) // 2] * 1e6:.1f} us, p99.9 {latencies[int(len(latencies) * 0.999)] * 1e6:.1f} us, "
+              f"max {latencies[-1] * 1e3:.2f} ms; {_stats['reloads']} reloads, {_stats['reload_errors']} errors")
+
+if __name__ == "__main__":
+    # Usage: python app/diagnosis.py [requests] [reloads]
+    #        python app/diagnosis.py export PATH   (writes the baseline as an artifact to edit)
+    if sys.argv[1:2] == ["export"]:
+        export_model(sys.argv[2] if len(sys.argv) > 2 else MODEL_PATH)
+    else:
+        args = [int(a) for a in sys.argv[1:]]
+        benchmark(*args)
@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import herd
+import querylog
+
+# ========== Configuration ==========
+CHUNK_SIZE = 5000
+# Exports smaller than this stay in memory; larger ones spill to a temp file.
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+EXCEL_MAX_ROWS = 1_048_575  # sheet limit minus the header row
+
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+EXPORT_COLUMNS = ["id", "Name", "Type", "Age", "Weight", "Vaccination", "Date Added"]
+
+# ========== Query Building ==========
+def livestock_export_query(user_id=None, animal_type=None, sort_column=None, ascending=True,
+                           include_retired=False):
+    """Builds the SQL for the View Livestock tab's type filter and sorting.
+
+    The tag search is applied to the fetched chunks with herd.tag_mask, the same
+    test the tab uses. Archived animals are not in the table, so the export
+    covers the hot herd only.
+    """
+    sql = """
+        SELECT id, name AS "Name", animal_type AS "Type", age AS "Age", weight AS "Weight",
+               vaccination AS "Vaccination", added_on AS "Date Added"
+        FROM livestock
+    """
+    clauses, params = [], []
+    if not include_retired:
+        clauses.append("retired_on IS NULL")
+    if user_id is not None:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    if animal_type:
+        clauses.append("animal_type = ?")
+        params.append(animal_type)
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if sort_column in ("Age", "Weight"):
+        sql += f" ORDER BY {sort_column.lower()} {'ASC' if ascending else 'DESC'}"
+    return sql, tuple(params)
+
+# ========== Chunked Writers ==========
+def _write_csv(chunks, out):
+    first = True
+    for chunk in chunks:
+        out.write(chunk.to_csv(index=False, header=first).encode("utf-8"))
+        first = False
+    if first:
+        out.write((",".join(EXPORT_COLUMNS) + "\n").encode("utf-8"))
+
+def _write_parquet(chunks, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("Name", pa.string()),
+        ("Type", pa.string()),
+        ("Age", pa.float64()),
+        ("Weight", pa.float64()),
+        ("Vaccination", pa.string()),
+        ("Date Added", pa.string()),
+    ])
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+def _write_excel(chunks, out):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Livestock")
+    sheet.append(EXPORT_COLUMNS)
+    written = 0
+    for chunk in chunks:
+        written += len(chunk)
+        if written > EXCEL_MAX_ROWS:
+            raise ValueError(f"Excel export is limited to {EXCEL_MAX_ROWS:,} rows; use CSV or Parquet.")
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(out)
+
+_WRITERS = {"CSV": _write_csv, "Parquet": _write_parquet, "Excel": _write_excel}
+
+def write_export(chunks, fmt, search_tag=None):
+    """Writes EXPORT_COLUMNS chunks, narrowed to the tag search, into a rewound file object."""
+    if search_tag:
+        chunks = (chunk[herd.tag_mask(chunk["Name"], search_tag)] for chunk in chunks)
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    _WRITERS[fmt](chunks, out)
+    out.seek(0)
+    return out
+
+def export_livestock(conn, fmt, chunksize=CHUNK_SIZE, search_tag=None, **filters):
+    """Streams the filtered livestock rows of a SQLite connection into a file in the given format."""
+    sql, params = livestock_export_query(**filters)
+    return write_export(querylog.read_sql_chunks(conn, sql, params=params, chunksize=chunksize), fmt, search_tag)
+
+# ========== Benchmark ==========
+def _seed(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE livestock (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, animal_type TEXT NOT NULL,
+            age REAL NOT NULL, weight REAL NOT NULL, vaccination TEXT NOT NULL,
+            user_id INTEGER NOT NULL, added_on DATETIME DEFAULT CURRENT_TIMESTAMP, retired_on DATETIME)
+    """)
+    types = ("Cattle", "Goat", "Sheep")
+    conn.executemany(
+        "INSERT INTO livestock (name, animal_type, age, weight, vaccination, user_id, added_on) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((f"TAG-{i:07d}", types[i % 3], (i % 120) / 10, 20 + i % 500, "CDT" if i % 4 else "",
+          i % 50, "2025-01-01 08:00:00") for i in range(rows)),
+    )
+    conn.commit()
+    conn.close()
+
+def benchmark(row_counts=(50_000, 200_000), formats=("CSV", "Parquet", "Excel")):
+    """Prints rows/second and peak Python heap use per format and herd size.
+
+    The peak includes the spooled output itself while it is under SPOOL_MAX_BYTES.
+    """
+    print(f"{'format':<8}{'rows':>10}{'seconds':>10}{'rows/s':>12}{'MB out':>9}{'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            path = os.path.join(tmp, f"bench_{rows}.db")
+            _seed(path, rows)
+            for fmt in formats:
+                conn = sqlite3.connect(path)
+                start = time.perf_counter()
+                out = export_livestock(conn, fmt)
+                elapsed = time.perf_counter() - start
+                size = out.seek(0, os.SEEK_END)
+                out.close()
+
+                # Second pass for memory, since tracemalloc distorts timings
+                tracemalloc.start()
+                export_livestock(conn, fmt).close()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                conn.close()
+                print(f"{fmt:<8}{rows:>10}{elapsed:>10.2f}{rows / elapsed:>12,.0f}"
+                      f"{size / 1e6:>9.1f}{peak / 1e6:>9.1f}")
+
+if __name__ == "__main__":
+    # Usage: python app/export.py [rows ...]
+    benchmark(tuple(int(n) for n in sys.argv[1:]) or (50_000, 200_000))
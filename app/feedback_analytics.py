@@ -0,0 +1,326 @@
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pandas as pd
+from nltk.tokenize import RegexpTokenizer
+
+import querylog
+import writer
+
+# ========== Configuration ==========
+BATCH_SIZE = 500               # feedback rows tokenized and committed together
+MIN_TERM_LENGTH = 3
+POSITIVE_THRESHOLD = 0.05      # VADER's usual cut-offs on the compound score
+NEGATIVE_THRESHOLD = -0.05
+EXCERPT_CHARS = 200
+
+_tokenizer = RegexpTokenizer(r"[a-z]+(?:'[a-z]+)?")
+
+# Used when the nltk stopwords corpus has not been downloaded
+FALLBACK_STOPWORDS = set("""
+a about above after again against all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its itself just me more most my no nor not now of off on once only or other our
+out over own same she should so some such than that the their them then there these they this those through to
+too under until up very was we were what when where which while who whom why will with would you your yours
+also app vetsmart really much get got use used using
+""".split())
+
+# Small valence lexicon for when the VADER lexicon is unavailable; scores follow VADER's -4..4 scale
+FALLBACK_LEXICON = {
+    "good": 1.9, "great": 3.1, "excellent": 3.2, "love": 3.2, "helpful": 1.9, "useful": 1.9, "easy": 1.9,
+    "fast": 1.2, "accurate": 1.9, "amazing": 2.8, "nice": 1.8, "best": 3.2, "thanks": 1.9, "thank": 1.5,
+    "happy": 2.7, "recommend": 1.5, "works": 1.0, "clear": 1.6, "reliable": 1.8, "awesome": 3.1,
+    "bad": -2.5, "poor": -2.1, "slow": -1.4, "crash": -2.0, "crashes": -2.0, "bug": -1.5, "bugs": -1.5,
+    "wrong": -2.1, "hard": -0.4, "confusing": -1.6, "difficult": -1.5, "error": -1.7, "errors": -1.7,
+    "terrible": -2.1, "hate": -2.7, "useless": -1.8, "broken": -1.9, "fail": -2.0, "failed": -2.0,
+    "problem": -1.7, "problems": -1.7, "annoying": -1.7, "worst": -3.1, "inaccurate": -1.8, "missing": -1.2,
+}
+NEGATIONS = {"not", "no", "never", "isn't", "don't", "doesn't", "didn't", "can't", "won't", "wasn't", "cannot"}
+
+# ========== Schema ==========
+def create_feedback_analytics_tables(conn):
+    """Running aggregates over the feedback table, advanced by id."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS feedback_terms (
+            day TEXT NOT NULL,
+            term TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, term)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS feedback_sentiment_daily (
+            day TEXT PRIMARY KEY,
+            entries INTEGER NOT NULL,
+            compound_sum REAL NOT NULL,
+            positive INTEGER NOT NULL,
+            neutral INTEGER NOT NULL,
+            negative INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS feedback_scores (
+            feedback_id INTEGER PRIMARY KEY,
+            day TEXT NOT NULL,
+            compound REAL NOT NULL,
+            label TEXT NOT NULL,
+            author TEXT,
+            excerpt TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_scores_day ON feedback_scores(day, compound)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS feedback_analytics_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_feedback_id INTEGER NOT NULL,
+            analyzer TEXT,
+            updated_on DATETIME
+        )
+    """)
+
+# ========== Text Processing ==========
+_stopwords = None
+_analyzer = None
+
+def stopwords():
+    global _stopwords
+    if _stopwords is None:
+        try:
+            from nltk.corpus import stopwords as corpus
+            _stopwords = set(corpus.words("english")) | FALLBACK_STOPWORDS
+        except LookupError:
+            _stopwords = FALLBACK_STOPWORDS
+    return _stopwords
+
+def tokenize(text):
+    return _tokenizer.tokenize((text or "").lower())
+
+def terms(tokens):
+    """Keywords counted in the term index: tokens without stopwords or very short words."""
+    stop = stopwords()
+    return [t for t in tokens if len(t) >= MIN_TERM_LENGTH and t not in stop and "'" not in t]
+
+def _fallback_compound(tokens):
+    total = 0.0
+    for i, token in enumerate(tokens):
+        valence = FALLBACK_LEXICON.get(token)
+        if valence is None:
+            continue
+        if any(t in NEGATIONS for t in tokens[max(0, i - 3):i]):
+            valence *= -0.74  # VADER's negation scalar
+        total += valence
+    return total / math.sqrt(total * total + 15) if total else 0.0
+
+def analyzer():
+    """(name, score) where score(text, tokens) is a compound sentiment in [-1, 1].
+
+    Uses nltk's VADER when its lexicon is installed (nltk.download("vader_lexicon")),
+    otherwise a small built-in lexicon with the same scale and negation rule.
+    """
+    global _analyzer
+    if _analyzer is None:
+        try:
+            from nltk.sentiment import SentimentIntensityAnalyzer
+            vader = SentimentIntensityAnalyzer()
+            _analyzer = ("vader", lambda text, tokens: vader.polarity_scores(text)["compound"])
+        except LookupError:
+            _analyzer = ("lexicon", lambda text, tokens: _fallback_compound(tokens))
+    return _analyzer
+
+def label(compound):
+    if compound >= POSITIVE_THRESHOLD:
+        return "positive"
+    if compound <= NEGATIVE_THRESHOLD:
+        return "negative"
+    return "neutral"
+
+# ========== Incremental Update ==========
+def last_processed_id(conn):
+    row = querylog.fetch_one(conn, "SELECT last_feedback_id FROM feedback_analytics_state WHERE id = 1")
+    return row[0] if row else 0
+
+def _local_feedback(conn, after_id, limit):
+    return querylog.fetch_all(conn, """
+        SELECT id, name, feedback, submitted_on FROM feedback WHERE id > ? ORDER BY id LIMIT ?
+    """, (after_id, limit))
+
+def _aggregate(rows, score):
+    """Tokenizes and scores a batch of feedback rows into (term counts, daily totals, per-row scores)."""
+    term_counts = Counter()
+    daily = {}
+    scores = []
+    for feedback_id, author, text, submitted_on in rows:
+        day = str(submitted_on or datetime.now().strftime("%Y-%m-%d %H:%M:%S"))[:10]
+        tokens = tokenize(text)
+        term_counts.update((day, term) for term in terms(tokens))
+        compound = score(text or "", tokens)
+        mood = label(compound)
+        entries, total, pos, neu, neg = daily.get(day, (0, 0.0, 0, 0, 0))
+        daily[day] = (entries + 1, total + compound, pos + (mood == "positive"), neu + (mood == "neutral"),
+                      neg + (mood == "negative"))
+        scores.append((feedback_id, day, round(compound, 4), mood, author, (text or "")[:EXCERPT_CHARS]))
+    return term_counts, daily, scores
+
+def _store_batch(conn, last_id, name, term_counts, daily, scores):
+    conn.executemany("""
+        INSERT INTO feedback_terms (day, term, count) VALUES (?, ?, ?)
+        ON CONFLICT(day, term) DO UPDATE SET count = count + excluded.count
+    """, [(day, term, count) for (day, term), count in term_counts.items()])
+    conn.executemany("""
+        INSERT INTO feedback_sentiment_daily (day, entries, compound_sum, positive, neutral, negative)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(day) DO UPDATE SET
+            entries = entries + excluded.entries, compound_sum = compound_sum + excluded.compound_sum,
+            positive = positive + excluded.positive, neutral = neutral + excluded.neutral,
+            negative = negative + excluded.negative
+    """, [(day,) + values for day, values in daily.items()])
+    conn.executemany("""
+        INSERT OR REPLACE INTO feedback_scores (feedback_id, day, compound, label, author, excerpt)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, scores)
+    querylog.execute(conn, """
+        INSERT INTO feedback_analytics_state (id, last_feedback_id, analyzer, updated_on) VALUES (1, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET last_feedback_id = excluded.last_feedback_id,
+            analyzer = excluded.analyzer, updated_on = excluded.updated_on
+    """, (last_id, name, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+def update(conn, write, fetch=None, batch_size=BATCH_SIZE):
+    """Folds feedback added since the last run into the aggregates; returns how many rows were processed.
+
+    Batches are read and scored on conn; write(work) then commits each one
+    with the new last id, e.g. on the database's writer thread. A batch is only
+    stored if the last id has not moved since it was read, so concurrent
+    callers never count a row twice. fetch(after_id, limit) supplies
+    (id, name, feedback, submitted_on) rows; by default the local feedback table.
+    """
+    name, score = analyzer()
+    processed = 0
+    while True:
+        after_id = last_processed_id(conn)
+        rows = fetch(after_id, batch_size) if fetch else _local_feedback(conn, after_id, batch_size)
+        if not rows:
+            return processed
+        aggregates = _aggregate(rows, score)
+
+        def store(write_conn):
+            if last_processed_id(write_conn) != after_id:
+                return False  # another caller stored this batch first; read again
+            _store_batch(write_conn, rows[-1][0], name, *aggregates)
+            return True
+
+        if write(store):
+            processed += len(rows)
+            if len(rows) < batch_size:
+                return processed
+
+# ========== Reports ==========
+def _since(days):
+    return (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+def status(conn):
+    row = querylog.fetch_one(conn, """
+        SELECT s.last_feedback_id, s.analyzer, s.updated_on, COALESCE(SUM(d.entries), 0)
+        FROM feedback_analytics_state s LEFT JOIN feedback_sentiment_daily d ON 1 = 1
+        WHERE s.id = 1
+    """)
+    if row is None or row[0] is None:
+        return {"last_feedback_id": 0, "analyzer": None, "updated_on": None, "processed": 0}
+    return dict(zip(["last_feedback_id", "analyzer", "updated_on", "processed"], row))
+
+def sentiment_trend(conn, days=90):
+    """Daily entries, mean compound score and label counts."""
+    return querylog.read_sql(conn, """
+        SELECT day AS "Day", entries AS "Entries", ROUND(compound_sum / entries, 3) AS "Mean Sentiment",
+               positive AS "Positive", neutral AS "Neutral", negative AS "Negative"
+        FROM feedback_sentiment_daily
+        WHERE day >= ?
+        ORDER BY day
+    """, params=(_since(days),))
+
+def top_terms(conn, days=30, limit=20):
+    return querylog.read_sql(conn, """
+        SELECT term AS "Term", SUM(count) AS "Mentions"
+        FROM feedback_terms
+        WHERE day >= ?
+        GROUP BY term
+        ORDER BY "Mentions" DESC, term
+        LIMIT ?
+    """, params=(_since(days), limit))
+
+def term_trend(conn, selected, days=90):
+    """Daily mentions of the selected terms."""
+    if not selected:
+        return pd.DataFrame(columns=["Day", "Term", "Mentions"])
+    placeholders = ", ".join("?" for _ in selected)
+    return querylog.read_sql(conn, f"""
+        SELECT day AS "Day", term AS "Term", count AS "Mentions"
+        FROM feedback_terms
+        WHERE day >= ? AND term IN ({placeholders})
+        ORDER BY day
+    """, params=(_since(days), *selected))
+
+def most_negative(conn, days=30, limit=10):
+    return querylog.read_sql(conn, """
+        SELECT day AS "Day", author AS "From", excerpt AS "Feedback", compound AS "Sentiment"
+        FROM feedback_scores
+        WHERE day >= ? AND label = 'negative'
+        ORDER BY compound
+        LIMIT ?
+    """, params=(_since(days), limit))
+
+# ========== Benchmark ==========
+_PHRASES = ["the diagnosis was accurate and helpful", "app is slow and crashes on the dashboard",
+            "love the vaccination reminders", "not useful for sheep", "great work, easy to use",
+            "report download failed again", "would recommend to other farmers", "vet request form is confusing"]
+
+def benchmark(rows=50_000, new_rows=500):
+    """Times a first full pass over the feedback history and then an incremental visit."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "feedback.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE feedback (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, feedback TEXT, "
+                     "submitted_on DATETIME)")
+        create_feedback_analytics_tables(conn)
+        start_day = datetime.now() - timedelta(days=180)
+
+        def add(count):
+            conn.executemany("INSERT INTO feedback (name, feedback, submitted_on) VALUES (?, ?, ?)", (
+                (f"user{i}", " and ".join(random.sample(_PHRASES, 2)),
+                 (start_day + timedelta(minutes=random.randrange(180 * 1440))).strftime("%Y-%m-%d %H:%M:%S"))
+                for i in range(count)))
+            conn.commit()
+
+        add(rows)
+        feedback_writer = writer.Writer(db_path)
+
+        def write(work):
+            return feedback_writer.submit(work).result(writer.ACK_TIMEOUT)
+
+        for run in ("full history", "incremental"):
+            if run == "incremental":
+                add(new_rows)
+            start = time.perf_counter()
+            processed = update(conn, write)
+            elapsed = time.perf_counter() - start
+            print(f"{run:<13} {processed:,} rows in {elapsed:.2f}s ({processed / elapsed:,.0f} rows/s, "
+                  f"analyzer {analyzer()[0]})")
+        start = time.perf_counter()
+        terms_df = top_terms(conn, days=90, limit=5)
+        sentiment_trend(conn, days=90)
+        print(f"report reads: {(time.perf_counter() - start) * 1000:.1f} ms; "
+              f"top terms: {', '.join(terms_df['Term'])}")
+        feedback_writer.stop()
+        conn.close()
+
+if __name__ == "__main__":
+    # Usage: python app/feedback_analytics.py [rows] [new_rows]
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
@@ -0,0 +1,200 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import querylog
+
+# ========== Configuration ==========
+ROLLING_WINDOW = 10       # previous readings each new reading is compared against
+READING_Z_THRESHOLD = 3.0  # |z| of a reading against the animal's own recent history
+COHORT_Z_THRESHOLD = 3.0   # |z| of an animal's growth rate against its animal type
+SECONDS_PER_DAY = 86400.0
+
+# ========== Schema ==========
+def create_measurements_table(conn):
+    """One row per reading, clustered on (animal_id, ts) without a separate rowid."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS measurements (
+            animal_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            weight REAL,
+            temperature REAL,
+            body_condition REAL,
+            PRIMARY KEY (animal_id, ts),
+            FOREIGN KEY (animal_id) REFERENCES livestock(id)
+        ) WITHOUT ROWID
+    """)
+
+def record_measurement(conn, animal_id, weight=None, temperature=None, body_condition=None, ts=None):
+    """Inserts one reading; the caller commits (database.record_measurement runs it on the writer)."""
+    ts = int(ts if ts is not None else time.time())
+    querylog.execute(conn, """
+        INSERT OR REPLACE INTO measurements (animal_id, ts, weight, temperature, body_condition)
+        VALUES (?, ?, ?, ?, ?)
+    """, (animal_id, ts, weight, temperature, body_condition))
+
+def load_measurements(conn, user_id=None, animal_id=None):
+    """Readings in (animal_id, ts) order, which is the table's primary key order."""
+    sql = "SELECT animal_id, ts, weight, temperature, body_condition FROM measurements"
+    params = ()
+    if animal_id is not None:
+        sql += " WHERE animal_id = ?"
+        params = (animal_id,)
+    elif user_id is not None:
+        sql += " WHERE animal_id IN (SELECT id FROM livestock WHERE user_id = ?)"
+        params = (user_id,)
+    sql += " ORDER BY animal_id, ts"
+    return querylog.read_sql(conn, sql, params=params,
+                             dtype={"weight": "float64", "temperature": "float64", "body_condition": "float64"})
+
+# ========== Vectorized Analytics ==========
+def group_starts(ids):
+    """Start index of every run of equal ids in a sorted array."""
+    if len(ids) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(([0], np.flatnonzero(ids[1:] != ids[:-1]) + 1))
+
+def growth_rates(ids, ts, values):
+    """Least-squares slope of value per day for each animal; NaN readings are ignored.
+
+    Returns (unique_ids, slope_per_day, reading_count).
+    """
+    starts = group_starts(ids)
+    counts_all = np.diff(np.append(starts, len(ids)))
+    # Days since each animal's first reading keeps the sums well conditioned
+    days = (ts - np.repeat(ts[starts], counts_all)) / SECONDS_PER_DAY
+    valid = ~np.isnan(values)
+    t = np.where(valid, days, 0.0)
+    v = np.where(valid, values, 0.0)
+
+    n = np.add.reduceat(valid.astype(np.float64), starts)
+    st = np.add.reduceat(t, starts)
+    sv = np.add.reduceat(v, starts)
+    stv = np.add.reduceat(t * v, starts)
+    stt = np.add.reduceat(t * t, starts)
+
+    denom = n * stt - st * st
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.where((n >= 2) & (denom > 0), (n * stv - st * sv) / denom, np.nan)
+    return ids[starts], slope, n.astype(np.int64)
+
+def rolling_zscores(ids, values, window=ROLLING_WINDOW):
+    """z-score of each reading against the animal's previous `window` readings.
+
+    Uses prefix sums, so the cost is O(n) regardless of window size. Readings
+    with fewer than two predecessors get NaN; any departure from a flat history
+    gets an infinite score.
+    """
+    n = len(values)
+    if n == 0:
+        return np.empty(0)
+    filled = np.nan_to_num(values)
+    present = (~np.isnan(values)).astype(np.float64)
+    cs = np.concatenate(([0.0], np.cumsum(filled)))
+    cs2 = np.concatenate(([0.0], np.cumsum(filled * filled)))
+    cn = np.concatenate(([0.0], np.cumsum(present)))
+
+    starts = group_starts(ids)
+    group_start = np.repeat(starts, np.diff(np.append(starts, n)))
+    idx = np.arange(n)
+    lo = np.maximum(group_start, idx - window)
+
+    count = cn[idx] - cn[lo]
+    total = cs[idx] - cs[lo]
+    total2 = cs2[idx] - cs2[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        var = np.maximum(total2 / count - mean * mean, 0.0) * count / (count - 1)
+        deviation = values - mean
+        z = deviation / np.sqrt(var)
+    # A departure from a perfectly steady history is as anomalous as it gets
+    flat = var <= 1e-12
+    z[flat] = np.where(np.abs(deviation[flat]) > 1e-9, np.copysign(np.inf, deviation[flat]), np.nan)
+    z[count < 2] = np.nan
+    return z
+
+def change_per_day(ids, ts, values):
+    """Change since the animal's previous reading, per day; NaN for first readings."""
+    change = np.full(len(values), np.nan)
+    if len(values) > 1:
+        same = ids[1:] == ids[:-1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = np.diff(values) / (np.diff(ts) / SECONDS_PER_DAY)
+        change[1:] = np.where(same, rate, np.nan)
+    return change
+
+def cohort_zscores(labels, rates):
+    """z-score of each animal's growth rate within its cohort (animal type)."""
+    frame = pd.DataFrame({"cohort": labels, "rate": rates})
+    grouped = frame.groupby("cohort", observed=True)["rate"]
+    mean = grouped.transform("mean").to_numpy()
+    std = grouped.transform("std").to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (rates - mean) / std
+    z[~(std > 0)] = np.nan
+    return z
+
+def analyze(readings, herd_df):
+    """Per-animal growth, latest-reading anomalies and cohort deviation flags.
+
+    readings must be sorted by (animal_id, ts); herd_df holds id, Name and Type.
+    """
+    if readings.empty:
+        return pd.DataFrame()
+    ids = readings["animal_id"].to_numpy()
+    ts = readings["ts"].to_numpy()
+    weights = readings["weight"].to_numpy()
+    temps = readings["temperature"].to_numpy()
+
+    animal_ids, rate, count = growth_rates(ids, ts, weights)
+    # Raw weights trend upward in growing animals, so anomalies are judged on
+    # the daily change between consecutive readings instead
+    weight_z = rolling_zscores(ids, change_per_day(ids, ts, weights))
+    temp_z = rolling_zscores(ids, temps)
+    last = np.append(group_starts(ids)[1:], len(ids)) - 1
+
+    result = pd.DataFrame({
+        "id": animal_ids,
+        "Readings": count,
+        "Growth (kg/day)": rate,
+        "Latest Weight": weights[last],
+        "Weight Change z": weight_z[last],
+        "Latest Temp": temps[last],
+        "Temp z": temp_z[last],
+    }).merge(herd_df[["id", "Name", "Type"]], on="id", how="inner")
+
+    result["Cohort z"] = cohort_zscores(result["Type"].to_numpy(), result["Growth (kg/day)"].to_numpy())
+    result["Flagged"] = (
+        (result["Weight Change z"].abs() >= READING_Z_THRESHOLD)
+        | (result["Temp z"].abs() >= READING_Z_THRESHOLD)
+        | (result["Cohort z"].abs() >= COHORT_Z_THRESHOLD)
+    )
+    columns = ["Name", "Type", "Readings", "Growth (kg/day)", "Cohort z",
+               "Latest Weight", "Weight Change z", "Latest Temp", "Temp z", "Flagged", "id"]
+    return result[columns].round(3)
+
+# ========== Benchmark ==========
+def benchmark(animals=100_000, readings_per_animal=20):
+    rng = np.random.default_rng(11)
+    n = animals * readings_per_animal
+    ids = np.repeat(np.arange(animals), readings_per_animal)
+    ts = np.tile(np.arange(readings_per_animal) * 7 * 86400, animals) + 1_700_000_000
+    slopes = rng.normal(0.15, 0.05, animals)
+    weights = 30 + np.repeat(slopes, readings_per_animal) * (ts - ts[0]) / SECONDS_PER_DAY + rng.normal(0, 0.5, n)
+    temps = rng.normal(39.0, 0.3, n)
+    herd_df = pd.DataFrame({"id": np.arange(animals), "Name": np.arange(animals).astype(str),
+                            "Type": pd.Categorical(np.array(["Cattle", "Goat", "Sheep"])[np.arange(animals) % 3])})
+    readings = pd.DataFrame({"animal_id": ids, "ts": ts, "weight": weights, "temperature": temps})
+
+    start = time.perf_counter()
+    result = analyze(readings, herd_df)
+    elapsed = time.perf_counter() - start
+    print(f"{n:,} readings for {animals:,} animals analyzed in {elapsed:.2f}s "
+          f"({n / elapsed:,.0f} readings/s), {int(result['Flagged'].sum()):,} flagged")
+
+if __name__ == "__main__":
+    # Usage: python app/growth.py [animals] [readings_per_animal]
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
@@ -0,0 +1,121 @@
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import querylog
+
+# ========== Herd Data Model ==========
+# Column renames shared by every view of the livestock table
+HERD_COLUMNS = {
+    "animal_type": "Type",
+    "name": "Name",
+    "age": "Age",
+    "weight": "Weight",
+    "vaccination": "Vaccination",
+    "added_on": "Date Added",
+}
+
+# Low-cardinality text becomes categorical, measurements fit comfortably in float32
+HERD_DTYPES = {
+    "animal_type": "category",
+    "vaccination": "category",
+    "age": "float32",
+    "weight": "float32",
+}
+
+HERD_FIELDS = ["id", "name", "animal_type", "age", "weight", "vaccination", "user_id", "added_on"]
+HERD_QUERY = f"SELECT {', '.join(HERD_FIELDS)} FROM livestock"
+
+def load_herd(conn, user_id=None, include_retired=False):
+    """Loads livestock with compact dtypes and a parsed 'Date Added' column; retired animals are left out."""
+    clauses, params = [], []
+    if not include_retired:
+        clauses.append("retired_on IS NULL")
+    if user_id is not None:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    sql = f"{HERD_QUERY} WHERE {' AND '.join(clauses)}" if clauses else HERD_QUERY
+    return shape_herd(querylog.read_sql(conn, sql, params=params or None, dtype=HERD_DTYPES))
+
+def shape_herd(df):
+    """Parses added_on and applies the display column names to a HERD_QUERY result."""
+    df["added_on"] = pd.to_datetime(df["added_on"], format="ISO8601")
+    return df.rename(columns=HERD_COLUMNS)
+
+def animal_record(row):
+    """One HERD_QUERY row as a dict keyed like a load_herd() row ("id", "Name", "Type", ...)."""
+    return {HERD_COLUMNS.get(field, field): value for field, value in zip(HERD_FIELDS, row)}
+
+def tag_mask(names, search_tag):
+    """Boolean mask of tags containing search_tag, compared casefolded ("STRASSE" finds "Straße").
+
+    The View Livestock filter and the export both use it, so they select the same animals.
+    """
+    return names.str.casefold().str.contains(search_tag.casefold(), regex=False).to_numpy()
+
+def filter_herd(df, animal_type=None, search_tag=None, sort_column=None, ascending=True):
+    """Applies the View Livestock filters without copying the frame up front.
+
+    All conditions are combined into a single mask, so at most one selection is
+    materialized; with no filter or sort the original frame is returned as is.
+    """
+    mask = None
+    if animal_type:
+        mask = (df["Type"] == animal_type).to_numpy()
+    if search_tag:
+        matches = tag_mask(df["Name"], search_tag)
+        mask = matches if mask is None else mask & matches
+
+    result = df if mask is None else df[mask]
+    if sort_column:
+        result = result.sort_values(by=sort_column, ascending=ascending)
+    return result
+
+# ========== Memory Benchmark ==========
+def _seed(conn, rows):
+    conn.execute("""
+        CREATE TABLE livestock (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, animal_type TEXT NOT NULL,
+            age REAL NOT NULL, weight REAL NOT NULL, vaccination TEXT NOT NULL,
+            user_id INTEGER NOT NULL, added_on DATETIME DEFAULT CURRENT_TIMESTAMP, retired_on DATETIME)
+    """)
+    types = ("Cattle", "Goat", "Sheep")
+    vaccines = ("CDT", "FMD", "PPR", "Anthrax", "")
+    rng = np.random.default_rng(7)
+    ages = rng.uniform(0, 15, rows).round(1)
+    weights = rng.uniform(15, 800, rows).round(1)
+    conn.executemany(
+        "INSERT INTO livestock (name, animal_type, age, weight, vaccination, user_id, added_on) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((f"TAG-{i:07d}", types[i % 3], float(ages[i]), float(weights[i]), vaccines[i % 5], i % 2000,
+          f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d} 08:30:00") for i in range(rows)),
+    )
+    conn.commit()
+
+def benchmark(rows=1_000_000):
+    """Prints bytes per animal for the untyped and typed herd representations."""
+    conn = sqlite3.connect(":memory:")
+    _seed(conn, rows)
+
+    start = time.perf_counter()
+    before = pd.read_sql("SELECT * FROM livestock", conn).rename(columns=HERD_COLUMNS)
+    before_s = time.perf_counter() - start
+    start = time.perf_counter()
+    after = load_herd(conn)
+    after_s = time.perf_counter() - start
+    conn.close()
+
+    print(f"{rows:,} animals")
+    print(f"{'column':<12}{'before B/animal':>17}{'after B/animal':>16}")
+    before_usage = before.memory_usage(deep=True, index=False)
+    after_usage = after.memory_usage(deep=True, index=False)
+    for column in after.columns:
+        print(f"{column:<12}{before_usage[column] / rows:>17.1f}{after_usage[column] / rows:>16.1f}")
+    print(f"{'total':<12}{before_usage.sum() / rows:>17.1f}{after_usage.sum() / rows:>16.1f}")
+    print(f"load time: {before_s:.2f}s before, {after_s:.2f}s after")
+
+if __name__ == "__main__":
+    # Usage: python app/herd.py [rows]
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,404 @@
+import hashlib
+import html
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+# ========== Configuration ==========
+# Text and Markdown files under KNOWLEDGE_DIR (vet manuals, disease fact sheets)
+# are split into passages and indexed for BM25 ranking into one binary file.
+# Queries memory-map that file, so every worker process shares the same page
+# cache instead of loading its own copy of the corpus.
+KNOWLEDGE_DIR = os.environ.get("VETSMART_KNOWLEDGE_DIR", "knowledge")
+INDEX_PATH = os.environ.get("VETSMART_KNOWLEDGE_INDEX", "knowledge.idx")
+EXTENSIONS = (".txt", ".md")
+PASSAGE_WORDS = 120            # a passage closes at the first paragraph break past this many words
+MAX_PASSAGE_WORDS = 300        # and is cut mid-paragraph past this many
+K1, B = 1.2, 0.75
+TOP_K = 3
+# Share of the query's idf weight a passage must contain to be used as an answer;
+# weaker matches fall back to the canned replies. Unlike a raw BM25 score this
+# does not depend on the corpus size.
+MIN_COVERAGE = float(os.environ.get("VETSMART_KNOWLEDGE_MIN_COVERAGE", "0.6"))
+ANSWER_CHARS = 400
+TEXT_LEVEL = 6                 # zlib level per passage; only the passages shown are decompressed
+
+MAGIC = b"VSKIDX01"
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "has", "have", "how",
+    "i", "if", "in", "is", "it", "its", "me", "my", "of", "on", "or", "should", "so", "that", "the", "their",
+    "them", "there", "this", "to", "was", "what", "when", "where", "which", "who", "why", "will", "with", "you",
+    "your", "we", "our", "he", "she", "his", "her", "they", "been", "being", "would", "could", "about", "into",
+}
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# ========== Text Processing ==========
+_SUFFIXES = ("ments", "ment", "ness", "ing", "ed")
+
+def _stem(word):
+    """Folds plurals and a few suffixes: "goats" finds "goat", "treatment" and "treated" find "treat"."""
+    if len(word) > 4 and word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+def tokenize(text):
+    return [_stem(word) for word in _TOKEN.findall(text.lower()) if word not in STOPWORDS]
+
+def _passages(path):
+    """(heading, first line, text) per passage of a file, read line by line."""
+    heading, lines, words, start_line = "", [], 0, 1
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for number, line in enumerate(f, 1):
+            stripped = line.strip()
+            if stripped.startswith("#"):
+                if lines:
+                    yield heading, start_line, " ".join(lines)
+                    lines, words = [], 0
+                heading = stripped.lstrip("#").strip()
+                continue
+            if not stripped:
+                if words >= PASSAGE_WORDS:
+                    yield heading, start_line, " ".join(lines)
+                    lines, words = [], 0
+                continue
+            if not lines:
+                start_line = number
+            lines.append(stripped)
+            words += stripped.count(" ") + 1
+            if words >= MAX_PASSAGE_WORDS:
+                yield heading, start_line, " ".join(lines)
+                lines, words = [], 0
+    if lines:
+        yield heading, start_line, " ".join(lines)
+
+def _term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+def corpus_files(corpus_dir=None):
+    root = corpus_dir or KNOWLEDGE_DIR
+    files = []
+    for folder, _, names in os.walk(root):
+        files += [os.path.join(folder, name) for name in names if name.lower().endswith(EXTENSIONS)]
+    return sorted(files)
+
+# ========== Building ==========
+# File layout: MAGIC, u64 metadata length, JSON metadata, then 8-byte aligned
+# sections whose offset, dtype and count the metadata lists:
+#   term_hash   u64[V]  blake2b of each term, sorted (binary-searched at query time)
+#   term_off    u64[V], term_len u32[V]   the term's bytes in term_blob, to rule out collisions
+#   post_start  u64[V], term_df u32[V]    the term's slice of the postings
+#   post_doc    u32[P], post_tf u8[P]     passages containing each term, by passage id; tf capped at 255
+#   doc_len     u32[N], doc_src u32[N], doc_line u32[N]   passage length in terms, source file and line
+#   doc_off     u64[N+1]                  each passage ("heading\ntext", zlib-compressed) in text_blob
+def build(corpus_dir=None, index_path=None):
+    """Indexes every corpus file into index_path, swapped in atomically; returns the metadata."""
+    corpus_dir, index_path = corpus_dir or KNOWLEDGE_DIR, index_path or INDEX_PATH
+    start = time.perf_counter()
+    files = corpus_files(corpus_dir)
+    vocab = {}
+    post_term, post_doc, post_tf = array("I"), array("I"), array("B")
+    doc_len, doc_src, doc_line, doc_off = array("I"), array("I"), array("I"), array("Q", [0])
+    corpus_bytes = 0
+    with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(index_path))) as text_out:
+        for source, path in enumerate(files):
+            corpus_bytes += os.path.getsize(path)
+            for heading, line, passage in _passages(path):
+                counts = Counter(tokenize(heading + " " + passage))
+                if not counts:
+                    continue
+                doc = len(doc_len)
+                for term, tf in counts.items():
+                    post_term.append(vocab.setdefault(term, len(vocab)))
+                    post_doc.append(doc)
+                    post_tf.append(min(tf, 255))
+                doc_len.append(sum(counts.values()))
+                doc_src.append(source)
+                doc_line.append(line)
+                data = zlib.compress(f"{heading}\n{passage}".encode("utf-8"), TEXT_LEVEL)
+                text_out.write(data)
+                doc_off.append(doc_off[-1] + len(data))
+
+        # Group postings by term; the stable sort keeps each term's passages in id order
+        terms = np.frombuffer(post_term, dtype=np.uint32)
+        order = np.argsort(terms, kind="stable")
+        term_df = np.bincount(terms, minlength=len(vocab)).astype(np.uint32)
+        term_start = np.cumsum(term_df, dtype=np.uint64) - term_df
+        words = list(vocab)
+        hashes = np.array([_term_hash(word) for word in words], dtype=np.uint64)
+        by_hash = np.argsort(hashes, kind="stable")
+        encoded = [words[i].encode("utf-8") for i in by_hash]
+        term_len = np.array([len(word) for word in encoded], dtype=np.uint32)
+        term_off = np.cumsum(term_len, dtype=np.uint64) - term_len
+
+        sections = {
+            "term_hash": hashes[by_hash],
+            "term_off": term_off,
+            "term_len": term_len,
+            "post_start": term_start[by_hash],
+            "term_df": term_df[by_hash],
+            "post_doc": np.frombuffer(post_doc, dtype=np.uint32)[order],
+            "post_tf": np.frombuffer(post_tf, dtype=np.uint8)[order],
+            "doc_len": np.frombuffer(doc_len, dtype=np.uint32),
+            "doc_src": np.frombuffer(doc_src, dtype=np.uint32),
+            "doc_line": np.frombuffer(doc_line, dtype=np.uint32),
+            "doc_off": np.frombuffer(doc_off, dtype=np.uint64),
+        }
+        blobs = {"term_blob": b"".join(encoded), "text_blob": text_out}
+        passages = len(doc_len)
+        meta = {
+            "version": 1,
+            "passages": passages,
+            "terms": len(vocab),
+            "postings": len(post_doc),
+            "avg_len": (sum(doc_len) / passages) if passages else 0.0,
+            "sources": [os.path.relpath(path, corpus_dir) for path in files],
+            "corpus_bytes": corpus_bytes,
+            "built_on": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "sections": {},
+        }
+        offset = 0
+        for name, values in sections.items():
+            meta["sections"][name] = [offset, values.dtype.str, int(values.size)]
+            offset = _align(offset + values.nbytes)
+        meta["sections"]["term_blob"] = [offset, "|u1", len(blobs["term_blob"])]
+        offset = _align(offset + len(blobs["term_blob"]))
+        meta["sections"]["text_blob"] = [offset, "|u1", int(doc_off[-1])]
+
+        partial = index_path + ".partial"
+        header = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+        with open(partial, "wb") as out:
+            out.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            _pad(out)
+            base = out.tell()
+            for name, values in sections.items():
+                out.write(values.tobytes())
+                _pad(out, base)
+            out.write(blobs["term_blob"])
+            _pad(out, base)
+            text_out.seek(0)
+            shutil.copyfileobj(text_out, out, 1 << 20)
+        os.replace(partial, index_path)
+    meta["seconds"] = round(time.perf_counter() - start, 2)
+    meta["index_bytes"] = os.path.getsize(index_path)
+    return meta
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+def _pad(out, base=0):
+    out.write(b"\0" * (_align(out.tell() - base) - (out.tell() - base)))
+
+# ========== Searching ==========
+class KnowledgeIndex:
+    """Read-only view of an index file; every array is a zero-copy window on one shared mmap."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_len = struct.unpack_from("<8sQ", self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a knowledge index.")
+        self.meta = json.loads(self._map[16:16 + header_len])
+        base = _align(16 + header_len)
+        for name, (offset, dtype, count) in self.meta["sections"].items():
+            setattr(self, name, np.frombuffer(self._map, dtype=dtype, count=count, offset=base + offset))
+        self._text_base = base + self.meta["sections"]["text_blob"][0]
+        self._term_base = base + self.meta["sections"]["term_blob"][0]
+
+    def lookup(self, term):
+        """(postings start, document frequency) of a term, or None."""
+        key = np.uint64(_term_hash(term))
+        encoded = term.encode("utf-8")
+        position = int(np.searchsorted(self.term_hash, key))
+        while position < len(self.term_hash) and self.term_hash[position] == key:
+            offset = self._term_base + int(self.term_off[position])
+            if self._map[offset:offset + int(self.term_len[position])] == encoded:
+                return int(self.post_start[position]), int(self.term_df[position])
+            position += 1
+        return None
+
+    def passage(self, doc):
+        start, end = int(self.doc_off[doc]), int(self.doc_off[doc + 1])
+        data = zlib.decompress(self._map[self._text_base + start:self._text_base + end])
+        heading, _, text = data.decode("utf-8").partition("\n")
+        return {"source": self.meta["sources"][int(self.doc_src[doc])], "heading": heading,
+                "line": int(self.doc_line[doc]), "text": text}
+
+    def search(self, query, k=TOP_K):
+        """Top passages by BM25, best first, each with its score, coverage and source.
+
+        coverage is the share of the query's idf weight found in the passage; a
+        term missing from the corpus counts with the highest possible idf.
+        """
+        passages, avg_len = self.meta["passages"], self.meta["avg_len"] or 1.0
+        docs, weights, idfs = [], [], []
+        total_idf = 0.0
+        for term in set(tokenize(query)):
+            found = self.lookup(term)
+            if found is None:
+                total_idf += math.log(1 + (passages + 0.5) / 0.5)
+                continue
+            start, df = found
+            idf = math.log(1 + (passages - df + 0.5) / (df + 0.5))
+            total_idf += idf
+            idfs.append(np.full(df, idf))
+            ids = self.post_doc[start:start + df]
+            tf = self.post_tf[start:start + df].astype(np.float32)
+            norm = K1 * (1 - B + B * self.doc_len[ids] / avg_len)
+            docs.append(ids)
+            weights.append(idf * tf * (K1 + 1) / (tf + norm))
+        if not docs:
+            return []
+        ids, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        coverage = np.bincount(inverse, weights=np.concatenate(idfs)) / total_idf
+        best = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return [dict(self.passage(int(ids[i])), score=round(float(scores[i]), 2), coverage=round(float(coverage[i]), 2))
+                for i in best]
+
+# Processes reopen the index when the file is rebuilt; the old mapping stays
+# valid for searches already holding it, since the rebuild replaces the file.
+_index = None
+_index_stamp = None
+_open_lock = threading.Lock()
+
+def _stamp(path):
+    try:
+        info = os.stat(path)
+        return info.st_mtime_ns, info.st_size, info.st_ino
+    except OSError:
+        return None
+
+def get_index(path=None):
+    """The mapped index at path (INDEX_PATH by default), or None when it has not been built."""
+    global _index, _index_stamp
+    path = path or INDEX_PATH
+    stamp = _stamp(path)
+    if stamp is None:
+        return None
+    if _index is None or _index.path != path or stamp != _index_stamp:
+        with _open_lock:
+            if _index is None or _index.path != path or stamp != _index_stamp:
+                try:
+                    _index = KnowledgeIndex(path)
+                    _index_stamp = stamp
+                except (OSError, ValueError) as e:
+                    print(f"Error opening knowledge index {path}: {e}")
+                    return None
+    return _index
+
+def search(query, k=TOP_K):
+    index = get_index()
+    return index.search(query, k) if index is not None else []
+
+def answer(query):
+    """A chat reply quoting the best passages with their sources, or None when nothing matches well."""
+    results = [result for result in search(query) if result["coverage"] >= MIN_COVERAGE]
+    if not results:
+        return None
+    top = results[0]
+    text = top["text"] if len(top["text"]) <= ANSWER_CHARS else top["text"][:ANSWER_CHARS].rsplit(" ", 1)[0] + "…"
+    sources = "; ".join(f"[{n}] {r['source']}" + (f" › {r['heading']}" if r["heading"] else "") + f", line {r['line']}"
+                        for n, r in enumerate(results, 1))
+    return html.escape(f"📚 {text} [1] — Sources: {sources}")
+
+def status():
+    index = get_index()
+    if index is None:
+        return None
+    meta = index.meta
+    return {"passages": meta["passages"], "terms": meta["terms"], "sources": len(meta["sources"]),
+            "corpus_mb": round(meta["corpus_bytes"] / 2**20, 1), "index_mb": round(os.path.getsize(index.path) / 2**20, 1),
+            "built_on": meta["built_on"], "path": index.path}
+
+# ========== Benchmark ==========
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmRSS")) / 1024
+    except (OSError, StopIteration):
+        return float("nan")
+
+def _synthetic_corpus(folder, megabytes):
+    """Zipf-distributed pseudo-vocabulary with a few real terms, split into fact-sheet files."""
+    rng = np.random.default_rng(7)
+    vocabulary = np.array([f"w{i}" for i in range(60_000)] + ["goat", "mastitis", "fever", "lameness", "vaccine",
+                                                              "udder", "hoof", "scours", "anthrax", "deworming"])
+    probabilities = 1.0 / np.arange(1, len(vocabulary) + 1) ** 1.05
+    probabilities /= probabilities.sum()
+    files, written = 0, 0
+    while written < megabytes * 2**20:
+        path = os.path.join(folder, f"sheet_{files:04d}.md")
+        with open(path, "w") as f:
+            for section in range(40):
+                f.write(f"# Section {section}\n\n")
+                for _ in range(3):
+                    words = rng.choice(vocabulary, size=int(rng.integers(40, 160)), p=probabilities)
+                    f.write(" ".join(words) + "\n\n")
+        written += os.path.getsize(path)
+        files += 1
+    return vocabulary, written
+
+def benchmark(megabytes=50, queries=300):
+    """Builds an index over a synthetic corpus and measures opening and query latency."""
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus, index_path = os.path.join(tmp, "corpus"), os.path.join(tmp, "knowledge.idx")
+        os.makedirs(corpus)
+        vocabulary, written = _synthetic_corpus(corpus, megabytes)
+        meta = build(corpus, index_path)
+        print(f"indexed {written / 2**20:.0f} MB in {len(meta['sources'])} files: {meta['passages']:,} passages, "
+              f"{meta['terms']:,} terms, {meta['postings']:,} postings in {meta['seconds']:.1f}s "
+              f"({written / 2**20 / meta['seconds']:.1f} MB/s); index {meta['index_bytes'] / 2**20:.1f} MB")
+
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        index = get_index(index_path)
+        opened = time.perf_counter() - start
+        rng = np.random.default_rng(11)
+        latencies = []
+        for n in range(queries):
+            terms = list(rng.choice(vocabulary[:20_000], size=2)) + [str(vocabulary[-1 - n % 10])]
+            start = time.perf_counter()
+            index.search(" ".join(terms))
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"open (mmap) {opened * 1000:.2f} ms; {queries} three-term queries: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms; resident memory +{_rss_mb() - rss_before:.0f} MB "
+              f"(file-backed pages, shared between workers)")
+        top = index.search("goat mastitis udder", 1)
+        print(f"sample: {top[0]['source']} › {top[0]['heading']}, line {top[0]['line']}, score {top[0]['score']}")
+
+if __name__ == "__main__":
+    # Usage: python app/knowledge.py build [corpus_dir] [index_path]
+    #        python app/knowledge.py search QUERY...
+    #        python app/knowledge.py [megabytes] [queries]   (benchmark on a synthetic corpus)
+    if sys.argv[1:2] == ["build"]:
+        built = build(*sys.argv[2:4])
+        print(f"{built['passages']:,} passages from {len(built['sources'])} files in {built['seconds']}s")
+    elif sys.argv[1:2] == ["search"]:
+        for result in search(" ".join(sys.argv[2:]), k=5):
+            print(f"{result['score']:>7} {result['source']}:{result['line']} {result['heading']}\n        {result['text'][:160]}")
+    else:
+        args = [int(a) for a in sys.argv[1:]]
+        benchmark(*args)
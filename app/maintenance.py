@@ -0,0 +1,387 @@
+import json
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import outbreak
+import writer
+
+# ========== Configuration ==========
+BACKUP_DIR = os.environ.get("VETSMART_BACKUP_DIR", "backups")
+BACKUP_HOURS = float(os.environ.get("VETSMART_BACKUP_HOURS", "24"))  # between scheduled backups
+KEEP_BACKUPS = int(os.environ.get("VETSMART_KEEP_BACKUPS", "7"))
+BACKUP_PAGES = 1024            # pages copied per backup step
+BACKUP_PAUSE = 0.005           # seconds between steps, leaving the writer room
+MAX_RESTARTS = 5               # without WAL, a copy restarted this often by writes is finished in one step
+
+# ANALYZE, optimize and vacuum only run inside this local-time window, and only
+# while fewer than LOW_TRAFFIC_WRITES writes happened over the last check.
+WINDOW = os.environ.get("VETSMART_MAINTENANCE_WINDOW", "02-05")  # start-end hour, end exclusive
+LOW_TRAFFIC_WRITES = 20
+CHECK_SECONDS = 300            # how often the daemon looks for due work and consumes new diagnoses
+OPTIMIZE_HOURS = 24
+ANALYZE_HOURS = 7 * 24
+VACUUM_STEP_PAGES = 1000       # freelist pages released per incremental_vacuum step
+FULL_VACUUM_MAX_BYTES = 512 * 2**20  # largest file converted to incremental auto_vacuum in one window
+LEASE_SECONDS = 2 * CHECK_SECONDS    # one process per database runs the schedule
+
+TASK_HOURS = {"backup": BACKUP_HOURS, "optimize": OPTIMIZE_HOURS, "analyze": ANALYZE_HOURS, "vacuum": OPTIMIZE_HOURS}
+
+# ========== Schema ==========
+def create_maintenance_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task TEXT NOT NULL,
+            started_on DATETIME NOT NULL,
+            seconds REAL NOT NULL,
+            bytes_before INTEGER,
+            bytes_after INTEGER,
+            ok INTEGER NOT NULL,
+            detail TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_runs_task ON maintenance_runs(task, ok, started_on)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS maintenance_lease (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+
+# ========== Measuring ==========
+def _pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+def db_bytes(conn):
+    """Bytes used by the database's pages (the file size once the WAL is checkpointed)."""
+    return _pragma(conn, "page_count") * _pragma(conn, "page_size")
+
+def file_state(conn):
+    return {
+        "bytes": db_bytes(conn),
+        "free_bytes": _pragma(conn, "freelist_count") * _pragma(conn, "page_size"),
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(_pragma(conn, "auto_vacuum")),
+    }
+
+def _record_run(db_path, task, started, seconds, before, after, ok, detail):
+    """Adds a maintenance_runs row through the writer thread."""
+    writer.get_writer(db_path).submit(lambda conn: conn.execute("""
+        INSERT INTO maintenance_runs (task, started_on, seconds, bytes_before, bytes_after, ok, detail)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (task, started.strftime("%Y-%m-%d %H:%M:%S"), round(seconds, 3), before, after, int(ok),
+          json.dumps(detail)))).result(writer.ACK_TIMEOUT)
+
+# ========== Online Backup ==========
+class _TooManyRestarts(Exception):
+    pass
+
+def backup(db_path, backup_dir=None, pages=BACKUP_PAGES, pause=BACKUP_PAUSE):
+    """Copies the live database through SQLite's backup API into a timestamped file.
+
+    The copy proceeds `pages` at a time with a pause between steps. In WAL mode
+    the source connection pins one read snapshot for the whole copy, so writers
+    carry on and their commits neither block nor restart it. Without WAL, other
+    connections' writes restart a step-wise copy; after MAX_RESTARTS it is
+    finished in one step. The result is integrity-checked before it is
+    published. Returns a report dict.
+    """
+    backup_dir = backup_dir or BACKUP_DIR
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    target = os.path.join(backup_dir, f"{base}-{stamp}.db")
+    suffix = 1
+    while os.path.exists(target):
+        suffix += 1
+        target = os.path.join(backup_dir, f"{base}-{stamp}-{suffix}.db")
+    partial = target + ".partial"
+    progress = {"steps": 0, "restarts": 0, "remaining": None}
+
+    def on_step(status, remaining, total):
+        progress["steps"] += 1
+        if progress["remaining"] is not None and remaining > progress["remaining"]:
+            progress["restarts"] += 1
+            if progress["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        progress["remaining"] = remaining
+        time.sleep(pause)
+
+    start = time.perf_counter()
+    source = sqlite3.connect(db_path, timeout=writer.BUSY_TIMEOUT, isolation_level=None)
+    try:
+        mode = "stepped" if pages > 0 else "one step"
+        if _pragma(source, "journal_mode") == "wal":
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # starts the read snapshot
+        dest = sqlite3.connect(partial)
+        try:
+            try:
+                source.backup(dest, pages=pages, progress=on_step)
+            except _TooManyRestarts:
+                mode = "one step"
+                source.backup(dest, pages=-1)
+            check = dest.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            dest.close()
+            if source.in_transaction:
+                source.execute("COMMIT")
+        if check != "ok":
+            os.remove(partial)
+            raise sqlite3.DatabaseError(f"backup failed quick_check: {check}")
+        os.replace(partial, target)
+    finally:
+        source.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+    removed = rotate_backups(backup_dir, base)
+    return {"file": target, "bytes": os.path.getsize(target), "mode": mode, "steps": progress["steps"],
+            "restarts": progress["restarts"], "removed": removed, "seconds": round(time.perf_counter() - start, 3)}
+
+def list_backups(backup_dir=None, base="livestock_data"):
+    """(path, bytes, modified) of a database's backups, newest first."""
+    backup_dir = backup_dir or BACKUP_DIR
+    if not os.path.isdir(backup_dir):
+        return []
+    files = [os.path.join(backup_dir, name) for name in os.listdir(backup_dir)
+             if name.startswith(base + "-") and name.endswith(".db")]
+    return sorted(((path, os.path.getsize(path), os.path.getmtime(path)) for path in files),
+                  key=lambda entry: entry[2], reverse=True)
+
+def rotate_backups(backup_dir, base, keep=KEEP_BACKUPS):
+    """Deletes all but the newest `keep` backups; returns the removed paths."""
+    removed = [path for path, _, _ in list_backups(backup_dir, base)[keep:]]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+# ========== Optimize / Analyze / Vacuum ==========
+def optimize(db_path):
+    """PRAGMA optimize: re-analyzes only the tables whose statistics are stale, with a bounded sample."""
+    def work(conn):
+        conn.execute("PRAGMA analysis_limit=1000")
+        conn.execute("PRAGMA optimize")
+    writer.get_writer(db_path).submit(work).result(writer.ACK_TIMEOUT)
+    return {}
+
+def analyze(db_path):
+    """A full ANALYZE of every table and index."""
+    writer.get_writer(db_path).submit(lambda conn: conn.execute("ANALYZE")).result(writer.ACK_TIMEOUT)
+    return {}
+
+def vacuum(db_path, step_pages=VACUUM_STEP_PAGES, pause=BACKUP_PAUSE):
+    """Returns free pages to the file system in small steps through the writer thread.
+
+    A database created without auto_vacuum=INCREMENTAL is converted once with a
+    full VACUUM on the writer thread (which holds up other writes meanwhile) if
+    it is small enough; larger files are left for an operator.
+    """
+    conn = sqlite3.connect(db_path, timeout=writer.BUSY_TIMEOUT, isolation_level=None)
+    try:
+        state = file_state(conn)
+        if state["auto_vacuum"] != "incremental":
+            if state["bytes"] > FULL_VACUUM_MAX_BYTES:
+                return {"skipped": f"auto_vacuum is {state['auto_vacuum']}; file too large to convert online"}
+            def convert(c):
+                c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                c.execute("VACUUM")
+            writer.get_writer(db_path).submit(convert, transaction=False).result(writer.ACK_TIMEOUT)
+            return {"converted": True}
+        def release(c):
+            # The sqlite3 module steps a row-less PRAGMA once, and each step of
+            # incremental_vacuum frees one page, so the pages are freed one call each.
+            for _ in range(step_pages):
+                c.execute("PRAGMA incremental_vacuum(1)")
+
+        free_pages = _pragma(conn, "freelist_count")
+        steps = 0
+        for _ in range(-(-free_pages // step_pages)):
+            writer.get_writer(db_path).submit(release).result(writer.ACK_TIMEOUT)
+            steps += 1
+            time.sleep(pause)
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        return {"steps": steps}
+    finally:
+        conn.close()
+
+TASKS = {"backup": backup, "optimize": optimize, "analyze": analyze, "vacuum": vacuum}
+
+def run_task(db_path, task, **options):
+    """Runs one task, records it in maintenance_runs and returns its report (with "ok" and "error")."""
+    started = datetime.now()
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path, timeout=writer.BUSY_TIMEOUT)
+    before = db_bytes(conn)
+    try:
+        detail = TASKS[task](db_path, **options)
+        ok, error = True, None
+    except Exception as e:
+        print(f"Error running maintenance task {task}: {e}")
+        detail, ok, error = {}, False, str(e)
+    after = db_bytes(conn)
+    conn.close()
+    seconds = time.perf_counter() - start
+    report = dict(detail, task=task, ok=ok, error=error, seconds=round(seconds, 3), bytes_before=before,
+                  bytes_after=after, reclaimed=before - after)
+    try:
+        _record_run(db_path, task, started, seconds, before, after, ok, dict(detail, error=error))
+    except Exception as e:
+        print(f"Error recording maintenance run: {e}")
+    return report
+
+def recent_runs(conn, limit=20):
+    rows = conn.execute("""
+        SELECT task, started_on, seconds, bytes_before - bytes_after, ok, detail
+        FROM maintenance_runs ORDER BY id DESC LIMIT ?
+    """, (limit,)).fetchall()
+    return [{"task": task, "started_on": started_on, "seconds": seconds, "reclaimed_kb": round((reclaimed or 0) / 1024, 1),
+             "ok": bool(ok), "detail": detail} for task, started_on, seconds, reclaimed, ok, detail in rows]
+
+# ========== Scheduling ==========
+def in_window(now=None, window=WINDOW):
+    start, end = (int(hour) for hour in window.split("-"))
+    hour = (now or datetime.now()).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+def _last_success(conn, task):
+    row = conn.execute("SELECT MAX(started_on) FROM maintenance_runs WHERE task = ? AND ok = 1", (task,)).fetchone()
+    return datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S") if row and row[0] else None
+
+def due_tasks(conn, now=None, quiet=True):
+    """Tasks whose interval has passed; everything but backup waits for the window and a quiet database."""
+    now = now or datetime.now()
+    due = []
+    for task, hours in TASK_HOURS.items():
+        if task != "backup" and not (quiet and in_window(now)):
+            continue
+        last = _last_success(conn, task)
+        if last is None or (now - last).total_seconds() >= hours * 3600:
+            due.append(task)
+    return due
+
+def _take_lease(db_path, owner):
+    """True if this process holds the schedule lease for the next LEASE_SECONDS."""
+    now = time.time()
+    return writer.get_writer(db_path).submit(lambda conn: conn.execute("""
+        INSERT INTO maintenance_lease (id, owner, expires_at) VALUES (1, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+        WHERE maintenance_lease.owner = excluded.owner OR maintenance_lease.expires_at < ?
+    """, (owner, now + LEASE_SECONDS, now)).rowcount == 1).result(writer.ACK_TIMEOUT)
+
+def _write_count(db_path, conn):
+    """Writes seen so far: this process's writer plus the sync revision every process bumps."""
+    count = writer.get_writer(db_path).stats["writes"]
+    try:
+        row = conn.execute("SELECT revision FROM sync_state WHERE id = 1").fetchone()
+        count += row[0] if row else 0
+    except sqlite3.Error:
+        pass
+    return count
+
+def consume_diagnoses(db_path):
+    """Brings the shared outbreak checkpoint up to date, so alerts don't wait for an Admin to open the monitor."""
+    conn = sqlite3.connect(db_path, timeout=writer.BUSY_TIMEOUT)
+    try:
+        outbreak.refresh(conn, lambda work: writer.get_writer(db_path).submit(work).result(writer.ACK_TIMEOUT))
+    except Exception as e:
+        print(f"Error consuming diagnoses for the outbreak monitor: {e}")
+    finally:
+        conn.close()
+
+_daemons = {}
+_daemons_lock = threading.Lock()
+
+def _run_daemon(db_path, owner):
+    last_writes = None
+    while True:
+        consume_diagnoses(db_path)
+        try:
+            conn = sqlite3.connect(db_path, timeout=writer.BUSY_TIMEOUT)
+            try:
+                writes = _write_count(db_path, conn)
+                # The daemon's own maintenance_runs/lease writes count too, hence the allowance
+                quiet = last_writes is not None and writes - last_writes < LOW_TRAFFIC_WRITES
+                due = due_tasks(conn, quiet=quiet)
+            finally:
+                conn.close()
+            if due and _take_lease(db_path, owner):
+                for task in due:
+                    report = run_task(db_path, task)
+                    print(f"Maintenance {task}: {'ok' if report['ok'] else 'failed'} in {report['seconds']}s, "
+                          f"{report['reclaimed']:,} bytes reclaimed")
+            conn = sqlite3.connect(db_path, timeout=writer.BUSY_TIMEOUT)
+            last_writes = _write_count(db_path, conn)
+            conn.close()
+        except Exception as e:
+            print(f"Error in maintenance daemon: {e}")
+        time.sleep(CHECK_SECONDS)
+
+def start(db_path):
+    """Starts the maintenance daemon for a database once per process; set VETSMART_MAINTENANCE=off to disable."""
+    if os.environ.get("VETSMART_MAINTENANCE", "on").lower() == "off":
+        return None
+    key = os.path.abspath(db_path)
+    with _daemons_lock:
+        thread = _daemons.get(key)
+        if thread is None:
+            owner = f"{socket.gethostname()}:{os.getpid()}"
+            thread = _daemons[key] = threading.Thread(target=_run_daemon, args=(db_path, owner),
+                                                      name=f"maintenance:{db_path}", daemon=True)
+            thread.start()
+        return thread
+
+# ========== Benchmark ==========
+def _writer_load(db_path, stop, latencies):
+    db_writer = writer.get_writer(db_path)
+    while not stop.is_set():
+        start = time.perf_counter()
+        db_writer.execute("INSERT INTO items (payload) VALUES (?)", ("x" * 200,)).result(writer.ACK_TIMEOUT)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.002)
+
+def benchmark(rows=200_000):
+    """Backs up a busy database step-wise and as one copy, then deletes the older half of the rows and vacuums."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "live.db")
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        writer.configure(conn)
+        create_maintenance_tables(conn)
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, payload TEXT)")
+        conn.executemany("INSERT INTO items (payload) VALUES (?)", (("y" * 200,) for _ in range(rows)))
+        print(f"database: {db_bytes(conn) / 2**20:.1f} MB")
+
+        for label, pages in (("stepped", BACKUP_PAGES), ("one step", -1)):
+            stop, latencies = threading.Event(), []
+            load = threading.Thread(target=_writer_load, args=(db_path, stop, latencies))
+            load.start()
+            time.sleep(0.2)
+            report = run_task(db_path, "backup", backup_dir=os.path.join(tmp, "backups"), pages=pages)
+            stop.set()
+            load.join()
+            latencies.sort()
+            print(f"backup {label:<9} {report['seconds']:.2f}s ({report.get('mode')}, {report.get('steps', 0)} steps, "
+                  f"{report.get('restarts', 0)} restarts); concurrent writes: {len(latencies)}, "
+                  f"max latency {latencies[-1] * 1000:.1f} ms")
+
+        conn.execute("DELETE FROM items WHERE id <= ?", (rows // 2,))
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        for task in ("optimize", "analyze", "vacuum"):
+            report = run_task(db_path, task)
+            steps = f" in {report['steps']} steps" if "steps" in report else ""
+            print(f"{task:<8} {report['seconds']:.2f}s, reclaimed {report['reclaimed'] / 2**20:.1f} MB{steps}")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"file after checkpoint: {os.path.getsize(db_path) / 2**20:.1f} MB; "
+              f"{len(list_backups(os.path.join(tmp, 'backups'), 'live'))} backup(s) kept")
+        conn.close()
+
+if __name__ == "__main__":
+    # Usage: python app/maintenance.py [rows]
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
@@ -0,0 +1,344 @@
+import calendar
+import json
+import math
+import random
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+
+import querylog
+
+# ========== Configuration ==========
+BUCKET_SECONDS = 86400       # one counter per day
+WINDOW_BUCKETS = 7           # sliding window of the last 7 days
+EWMA_ALPHA = 0.05            # weight of each day leaving the window in the baseline
+Z_THRESHOLD = 4.0            # window count this many deviations above baseline raises an alert
+MIN_CASES = 5                # never alert on fewer cases than this in the window
+MIN_VARIANCE = 0.25          # floor so a quiet baseline doesn't turn one case into an outbreak
+BASELINE_CATCHUP_CAP = 60    # idle days folded into the baseline when a key wakes up
+WARMUP_BUCKETS = 14          # baseline days needed before a key can alert
+BATCH_SIZE = 2000            # diagnoses consumed per checkpointed transaction
+IGNORED_DISEASES = ("None",)
+
+# ========== Schema ==========
+def create_outbreak_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbreak_checkpoint (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_diagnosis_id INTEGER NOT NULL,
+            state BLOB NOT NULL,
+            saved_on DATETIME NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbreak_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            disease TEXT NOT NULL,
+            animal_type TEXT NOT NULL,
+            area TEXT NOT NULL,
+            window_cases INTEGER NOT NULL,
+            expected REAL NOT NULL,
+            z REAL NOT NULL,
+            window_end DATE NOT NULL,
+            raised_on DATETIME NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbreak_alerts_raised ON outbreak_alerts(raised_on)")
+
+def unique_alerts(conn):
+    """Drops repeated alerts (kept: the first) and allows one per key and window from now on."""
+    querylog.execute(conn, """
+        DELETE FROM outbreak_alerts
+        WHERE id NOT IN (SELECT MIN(id) FROM outbreak_alerts GROUP BY disease, animal_type, area, window_end)
+    """)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_outbreak_alerts_key
+        ON outbreak_alerts(disease, animal_type, area, window_end)
+    """)
+
+def area_of(address):
+    """Coarse region from a free-text farm address: its last comma-separated part."""
+    parts = [p.strip() for p in (address or "").split(",") if p.strip()]
+    return parts[-1].title() if parts else "Unknown"
+
+def _epoch(timestamp):
+    """Seconds for a naive 'YYYY-MM-DD HH:MM:SS' string, matching SQLite's strftime('%s')."""
+    return calendar.timegm(timestamp.timetuple())
+
+# ========== Sliding Window per Key ==========
+class WindowCounter:
+    """Ring buffer of daily counts with an EWMA baseline of days that left the window.
+
+    Adding an event touches at most WINDOW_BUCKETS + BASELINE_CATCHUP_CAP slots,
+    however long the key was idle, so the cost per event is constant.
+    """
+    __slots__ = ("counts", "head", "total", "mean", "var", "seen", "last_alert")
+
+    def __init__(self, head):
+        self.counts = [0] * WINDOW_BUCKETS
+        self.head = head
+        self.total = 0
+        self.mean = 0.0
+        self.var = 0.0
+        # Slots behind the first event are not real days and are skipped when they expire
+        self.seen = 1 - WINDOW_BUCKETS
+        self.last_alert = None  # day the current alert started, None while below threshold
+
+    def _fold(self, count):
+        # Plain running mean until 1/n drops below alpha, so the baseline isn't biased toward zero
+        self.seen += 1
+        if self.seen <= 0:
+            return
+        alpha = max(EWMA_ALPHA, 1.0 / self.seen)
+        diff = count - self.mean
+        self.mean += alpha * diff
+        self.var = (1 - alpha) * (self.var + alpha * diff * diff)
+
+    def advance(self, bucket):
+        steps = bucket - self.head
+        if steps <= 0:
+            return
+        for i in range(1, min(steps, WINDOW_BUCKETS) + 1):
+            slot = (self.head + i) % WINDOW_BUCKETS
+            expired = self.counts[slot]
+            self._fold(expired)
+            self.total -= expired
+            self.counts[slot] = 0
+        # Days that entered and left the window while the key was idle had no cases
+        for _ in range(min(steps - WINDOW_BUCKETS, BASELINE_CATCHUP_CAP)):
+            self._fold(0)
+        self.head = bucket
+
+    def add(self, bucket):
+        """Counts one event; returns False if it is older than the window."""
+        self.advance(bucket)
+        if bucket <= self.head - WINDOW_BUCKETS:
+            return False
+        self.counts[bucket % WINDOW_BUCKETS] += 1
+        self.total += 1
+        return True
+
+    def expected(self):
+        return self.mean * WINDOW_BUCKETS
+
+    def zscore(self):
+        spread = math.sqrt(max(self.var, self.mean, MIN_VARIANCE) * WINDOW_BUCKETS)
+        return (self.total - self.expected()) / spread
+
+# ========== Monitor ==========
+class OutbreakMonitor:
+    """Sliding-window case counts per (disease, animal type, area) with alerting."""
+
+    def __init__(self):
+        self.windows = {}
+        self.last_id = 0
+        self.events = 0
+        self.late = 0
+        self.alerts = deque(maxlen=500)
+        self.pending_alerts = []
+
+    def observe(self, ts, disease, animal_type, area):
+        """Processes one diagnosis event; returns an alert dict or None."""
+        if disease in IGNORED_DISEASES:
+            return None
+        bucket = int(ts) // BUCKET_SECONDS
+        key = (disease, animal_type or "Unknown", area)
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = WindowCounter(bucket)
+        self.events += 1
+        if not window.add(bucket):
+            self.late += 1
+            return None
+        if window.total < MIN_CASES or window.seen < WARMUP_BUCKETS:
+            return None
+        z = window.zscore()
+        if z < Z_THRESHOLD:
+            window.last_alert = None
+            return None
+        # Alert when a key crosses the threshold, not again for every case while it stays above
+        if window.last_alert is not None:
+            return None
+        window.last_alert = window.head
+        window_end = datetime.fromtimestamp(window.head * BUCKET_SECONDS, timezone.utc).strftime("%Y-%m-%d")
+        if any((a["disease"], a["animal_type"], a["area"], a["window_end"]) == key + (window_end,)
+               for a in self.alerts):
+            return None  # already raised for this key and window, e.g. before a retried batch
+        alert = {
+            "disease": key[0],
+            "animal_type": key[1],
+            "area": key[2],
+            "window_cases": window.total,
+            "expected": round(window.expected(), 2),
+            "z": round(z, 2),
+            "window_end": window_end,
+            "raised_on": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.alerts.append(alert)
+        self.pending_alerts.append(alert)
+        return alert
+
+    def consume(self, conn, batch_size=BATCH_SIZE):
+        """Processes up to batch_size diagnoses recorded after the last one seen; returns how many.
+
+        The caller saves the checkpoint in the same transaction (see refresh).
+        """
+        rows = querylog.fetch_all(conn, """
+            SELECT d.id, CAST(strftime('%s', d.created_on) AS INTEGER), d.disease,
+                   l.animal_type, u.farmaddress
+            FROM diagnoses d
+            LEFT JOIN livestock l ON l.id = d.animal_id
+            LEFT JOIN users u ON u.id = COALESCE(l.user_id, d.user_id)
+            WHERE d.id > ?
+            ORDER BY d.id
+            LIMIT ?
+        """, (self.last_id, batch_size))
+        for diagnosis_id, ts, disease, animal_type, address in rows:
+            self.observe(ts or 0, disease, animal_type, area_of(address))
+            self.last_id = diagnosis_id
+        return len(rows)
+
+    def snapshot(self, now=None, limit=50):
+        """Current window counts, highest z first, as of now (a datetime)."""
+        bucket = _epoch(now or datetime.now()) // BUCKET_SECONDS
+        rows = []
+        for (disease, animal_type, area), window in self.windows.items():
+            window.advance(bucket)
+            if window.total:
+                rows.append({"Disease": disease, "Type": animal_type, "Area": area,
+                             "Cases (7d)": window.total, "Expected": round(window.expected(), 2),
+                             "z": round(window.zscore(), 2)})
+        rows.sort(key=lambda row: row["z"], reverse=True)
+        return rows[:limit]
+
+    # --- Checkpoint state ---
+    def to_state(self):
+        return {
+            "last_id": self.last_id,
+            "events": self.events,
+            "late": self.late,
+            "windows": [[list(key), w.head, w.counts, w.total, w.mean, w.var, w.seen, w.last_alert]
+                        for key, w in self.windows.items()],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        monitor = cls()
+        monitor.last_id = state["last_id"]
+        monitor.events = state["events"]
+        monitor.late = state["late"]
+        for key, head, counts, total, mean, var, seen, last_alert in state["windows"]:
+            window = WindowCounter(head)
+            window.counts, window.total, window.mean, window.var = counts, total, mean, var
+            window.seen, window.last_alert = seen, last_alert
+            monitor.windows[tuple(key)] = window
+        return monitor
+
+# ========== Checkpoints ==========
+def save_checkpoint(conn, monitor, expected_id):
+    """Writes the monitor state and its new alerts, if the saved checkpoint is still at expected_id.
+
+    Returns False, having written nothing, when another process has moved the
+    checkpoint on. The caller commits, then clears monitor.pending_alerts.
+    """
+    state = zlib.compress(json.dumps(monitor.to_state(), separators=(",", ":")).encode("utf-8"))
+    saved = querylog.execute(conn, """
+        INSERT INTO outbreak_checkpoint (id, last_diagnosis_id, state, saved_on) VALUES (1, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET last_diagnosis_id = excluded.last_diagnosis_id, state = excluded.state,
+                                      saved_on = excluded.saved_on
+        WHERE outbreak_checkpoint.last_diagnosis_id = ?
+    """, (monitor.last_id, state, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), expected_id)).rowcount
+    if not saved:
+        return False
+    conn.executemany("""
+        INSERT OR IGNORE INTO outbreak_alerts (disease, animal_type, area, window_cases, expected, z, window_end, raised_on)
+        VALUES (:disease, :animal_type, :area, :window_cases, :expected, :z, :window_end, :raised_on)
+    """, monitor.pending_alerts)
+    return True
+
+def load_checkpoint(conn):
+    row = querylog.fetch_one(conn, "SELECT state FROM outbreak_checkpoint WHERE id = 1")
+    if row is None:
+        return OutbreakMonitor()
+    return OutbreakMonitor.from_state(json.loads(zlib.decompress(row[0]).decode("utf-8")))
+
+def recent_alerts(conn, limit=100):
+    return querylog.read_sql(conn, """
+        SELECT raised_on AS "Raised", disease AS "Disease", animal_type AS "Type", area AS "Area",
+               window_cases AS "Cases (7d)", expected AS "Expected", z AS "z"
+        FROM outbreak_alerts
+        ORDER BY raised_on DESC
+        LIMIT ?
+    """, params=(limit,))
+
+# ========== Shared Process Monitor ==========
+_shared = None
+_shared_lock = threading.Lock()
+
+def refresh(conn, write, batch_size=BATCH_SIZE):
+    """Consumes new diagnoses into the shared checkpoint and returns this process's up-to-date monitor.
+
+    Every process and the maintenance daemon may call this. Each batch is read
+    and scored on conn, starting from the saved state whenever another process
+    has moved it on; write(work) then commits the checkpoint, e.g. on the
+    database's writer thread, compare-and-swapped on last_diagnosis_id. So each
+    diagnosis is counted, and each alert raised, once.
+    """
+    global _shared
+    with _shared_lock:
+        while True:
+            row = querylog.fetch_one(conn, "SELECT last_diagnosis_id FROM outbreak_checkpoint WHERE id = 1")
+            if _shared is None or _shared.last_id != (row[0] if row else 0):
+                _shared = load_checkpoint(conn)
+            monitor = _shared
+            expected_id = monitor.last_id
+            try:
+                processed = monitor.consume(conn, batch_size)
+                stored = not processed or write(lambda write_conn: save_checkpoint(write_conn, monitor, expected_id))
+            except Exception:
+                _shared = None  # its in-memory state may be ahead of what was saved
+                raise
+            if not stored:
+                _shared = None  # another process checkpointed first; start again from its state
+                continue
+            monitor.pending_alerts = []
+            if processed < batch_size:
+                return monitor
+
+# ========== Benchmark ==========
+def benchmark(events=1_000_000, areas=200, days=365):
+    rng = random.Random(7)
+    diseases = ["Foot-and-Mouth", "Anthrax", "PPR", "Mastitis"]
+    animal_types = ["Cattle", "Goat", "Sheep"]
+    area_names = [f"Area {i}" for i in range(areas)]
+    start_ts = 1_700_000_000
+    stream = sorted(
+        (start_ts + rng.randrange(days * BUCKET_SECONDS), rng.choice(diseases), rng.choice(animal_types),
+         rng.choice(area_names))
+        for _ in range(events)
+    )
+    # A PPR spike among goats in one area during the last week
+    spike_start = start_ts + (days - 7) * BUCKET_SECONDS
+    spike = [(spike_start + rng.randrange(3 * BUCKET_SECONDS), "PPR", "Goat", "Area 13") for _ in range(60)]
+    stream = sorted(stream + spike)
+
+    monitor = OutbreakMonitor()
+    raised = 0
+    started = time.perf_counter()
+    for event in stream:
+        raised += monitor.observe(*event) is not None
+    elapsed = time.perf_counter() - started
+    state = zlib.compress(json.dumps(monitor.to_state(), separators=(",", ":")).encode("utf-8"))
+    spike_alerts = [a for a in monitor.alerts if a["area"] == "Area 13" and a["disease"] == "PPR"]
+    print(f"{len(stream):,} events over {len(monitor.windows):,} keys in {elapsed:.2f}s "
+          f"({len(stream) / elapsed:,.0f} events/s)")
+    print(f"{raised} alert(s) over {len(monitor.windows) * days:,} key-days; injected spike detected: {bool(spike_alerts)}; "
+          f"checkpoint {len(state):,} bytes")
+
+if __name__ == "__main__":
+    # Usage: python app/outbreak.py [events] [areas]
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
@@ -0,0 +1,127 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+from functools import wraps
+
+# ========== Configuration ==========
+# Only the most recent durations are kept per timer, so memory stays bounded
+# while p50/p95/p99 still reflect current behaviour.
+SAMPLE_WINDOW = 2048
+
+# ========== Timer Statistics ==========
+class TimerStats:
+    """Call count, error count, total time and a ring of recent durations."""
+
+    __slots__ = ("count", "errors", "total", "samples", "_next")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.samples = []
+        self._next = 0
+
+    def record(self, elapsed, failed=False):
+        self.count += 1
+        self.total += elapsed
+        if failed:
+            self.errors += 1
+        if len(self.samples) < SAMPLE_WINDOW:
+            self.samples.append(elapsed)
+        else:
+            self.samples[self._next] = elapsed
+            self._next = (self._next + 1) % SAMPLE_WINDOW
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            "calls": self.count,
+            "errors": self.errors,
+            "total_ms": round(self.total * 1000, 2),
+            "mean_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        }
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+# Per-process aggregates are shared by every session served by this worker.
+_process_stats = {}
+_process_lock = threading.Lock()
+
+# Streamlit runs each session's script in its own thread; the app binds the
+# session's stats dict at the start of every rerun.
+_local = threading.local()
+
+def bind_session(stats):
+    """Records subsequent timings of this thread into the given session dict."""
+    _local.session_stats = stats
+
+def _record(name, elapsed, failed):
+    with _process_lock:
+        stats = _process_stats.get(name)
+        if stats is None:
+            stats = _process_stats[name] = TimerStats()
+        stats.record(elapsed, failed)
+
+    session_stats = getattr(_local, "session_stats", None)
+    if session_stats is not None:
+        stats = session_stats.get(name)
+        if stats is None:
+            stats = session_stats[name] = TimerStats()
+        stats.record(elapsed, failed)
+
+# ========== Instrumentation ==========
+def timed(name=None):
+    """Decorator timing every call of a function under the given timer name."""
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                _record(label, time.perf_counter() - start, failed)
+
+        return wrapper
+    return decorator
+
+def summarize(stats):
+    """Returns one summary row per timer, slowest total first."""
+    rows = [dict(timer=name, **s.summary()) for name, s in list(stats.items())]
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+def process_summary():
+    with _process_lock:
+        snapshot = dict(_process_stats)
+    return summarize(snapshot)
+
+def reset_process_stats():
+    with _process_lock:
+        _process_stats.clear()
+
+# ========== cProfile Capture ==========
+def start_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def stop_profile(profiler, limit=40):
+    """Stops the profiler and returns the top entries by cumulative time as text."""
+    profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,208 @@
+import multiprocessing
+import os
+import re
+import secrets
+import string
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import bcrypt
+import pandas as pd
+
+import database
+
+# ========== Configuration ==========
+ROSTER_COLUMNS = ["role", "firstname", "lastname", "email", "password", "telephone", "farmname",
+                  "farmaddress", "farmrole"]
+REQUIRED_COLUMNS = ["firstname", "lastname", "email", "telephone", "farmname", "farmaddress", "farmrole"]
+ROLES = ("Farmer", "Veterinarian", "Admin")
+DEFAULT_ROLE = "Farmer"
+BCRYPT_ROUNDS = 12            # same cost as bcrypt.gensalt() at signup
+HASH_WORKERS = os.cpu_count() or 1
+HASH_CHUNK = 8                # passwords sent to a worker at a time
+INSERT_BATCH = 500            # users committed per transaction
+TEMP_PASSWORD_LENGTH = 12
+
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+# ========== Passwords ==========
+def password_strength(pw):
+    """0-3: one point each for 6+ characters, an uppercase letter and a special character."""
+    score = 0
+    if len(pw) >= 6:
+        score += 1
+    if re.search(r'[A-Z]', pw):
+        score += 1
+    if re.search(r'[\W_]', pw):
+        score += 1
+    return score
+
+def temporary_password():
+    """A random password that passes the signup strength rule."""
+    alphabet = string.ascii_letters + string.digits
+    body = "".join(secrets.choice(alphabet) for _ in range(TEMP_PASSWORD_LENGTH - 2))
+    return body + secrets.choice(string.ascii_uppercase) + secrets.choice("!@#$%&*?")
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+def hash_passwords(passwords, workers=HASH_WORKERS, rounds=BCRYPT_ROUNDS, progress=None):
+    """bcrypt hashes in input order, spread over a pool of worker processes.
+
+    bcrypt is CPU-bound by design, so processes rather than threads. The pool
+    uses spawn, which is safe to start from the server's script threads.
+    """
+    hashes = []
+    total = len(passwords)
+    if workers <= 1 or total < 2:
+        for password in passwords:
+            hashes.append(_hash(password, rounds))
+            if progress:
+                progress(len(hashes), total)
+        return hashes
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, total), mp_context=context) as pool:
+        for hashed in pool.map(_hash, passwords, repeat(rounds), chunksize=HASH_CHUNK):
+            hashes.append(hashed)
+            if progress and (len(hashes) % HASH_CHUNK == 0 or len(hashes) == total):
+                progress(len(hashes), total)
+    return hashes
+
+# ========== Roster ==========
+def _column_key(name):
+    return re.sub(r"[\s_\-]", "", str(name).lower())
+
+def read_roster(file, filename):
+    """Reads a CSV or Excel roster into strings, with headers like 'First Name' mapped to 'firstname'."""
+    if filename.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(file, dtype=str)
+    else:
+        df = pd.read_csv(file, dtype=str, keep_default_na=False)
+    df = df.rename(columns=_column_key).fillna("")
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}.")
+    for column in ROSTER_COLUMNS:
+        if column not in df.columns:
+            df[column] = ""
+    return df[ROSTER_COLUMNS].apply(lambda col: col.str.strip())
+
+def roster_template():
+    """CSV bytes with the roster header and one example row."""
+    example = pd.DataFrame([["Farmer", "Amina", "Okafor", "amina@example.com", "", "+234 800 000 0000",
+                             "Green Pastures Cooperative", "Oyo", "member"]], columns=ROSTER_COLUMNS)
+    return example.to_csv(index=False).encode("utf-8")
+
+def validate(roster):
+    """Splits roster rows into accepted users and rejected rows with a reason.
+
+    Rows without a password get a temporary one, returned with the user so it
+    can be handed out.
+    """
+    accepted, rejected, seen = [], [], set()
+    for position, row in enumerate(roster.to_dict("records"), start=2):  # line 1 is the header
+        role = row["role"] or DEFAULT_ROLE
+        reason = None
+        if any(not row[c] for c in REQUIRED_COLUMNS):
+            reason = "missing " + ", ".join(c for c in REQUIRED_COLUMNS if not row[c])
+        elif not EMAIL_PATTERN.match(row["email"]):
+            reason = "invalid email"
+        elif role not in ROLES:
+            reason = f"unknown role '{role}'"
+        elif row["email"] in seen:
+            reason = "email repeated in roster"
+        elif row["password"] and password_strength(row["password"]) < 3:
+            reason = "password must be at least 6 characters, with uppercase and special character"
+        if reason:
+            rejected.append({"line": position, "email": row["email"], "reason": reason})
+            continue
+        seen.add(row["email"])
+        generated = not row["password"]
+        accepted.append(dict(row, role=role, line=position, generated=generated,
+                             password=temporary_password() if generated else row["password"]))
+    return accepted, rejected
+
+# ========== Provisioning ==========
+def provision(roster, workers=HASH_WORKERS, rounds=BCRYPT_ROUNDS, batch_size=INSERT_BATCH, progress=None):
+    """Validates, de-duplicates, hashes and inserts a roster; returns a report.
+
+    Duplicates against existing accounts are found with one query before any
+    hashing, so no CPU is spent on rows that would be rejected.
+    progress(done, total) is called as passwords are hashed.
+    """
+    start = time.perf_counter()
+    accepted, rejected = validate(roster)
+
+    taken = database.existing_emails(user["email"] for user in accepted)
+    rejected += [{"line": u["line"], "email": u["email"], "reason": "email already registered"}
+                 for u in accepted if u["email"] in taken]
+    accepted = [u for u in accepted if u["email"] not in taken]
+
+    hash_start = time.perf_counter()
+    hashes = hash_passwords([u["password"] for u in accepted], workers, rounds, progress)
+    hash_seconds = time.perf_counter() - hash_start
+
+    insert_start = time.perf_counter()
+    created = set()
+    for offset in range(0, len(accepted), batch_size):
+        batch = accepted[offset:offset + batch_size]
+        inserted = database.save_users_batch([
+            tuple(u[c] for c in ROSTER_COLUMNS[:4]) + (hashed,) + tuple(u[c] for c in ROSTER_COLUMNS[5:])
+            for u, hashed in zip(batch, hashes[offset:offset + batch_size])
+        ])
+        if inserted is None:
+            rejected += [{"line": u["line"], "email": u["email"], "reason": "database write failed"} for u in batch]
+            continue
+        created.update(inserted)
+        rejected += [{"line": u["line"], "email": u["email"], "reason": "email already registered"}
+                     for u in batch if u["email"] not in created]
+    insert_seconds = time.perf_counter() - insert_start
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": len(roster),
+        "created": len(created),
+        "rejected": sorted(rejected, key=lambda r: r["line"]),
+        "credentials": [{"email": u["email"], "temporary_password": u["password"]}
+                        for u in accepted if u["generated"] and u["email"] in created],
+        "hash_seconds": round(hash_seconds, 2),
+        "insert_seconds": round(insert_seconds, 2),
+        "seconds": round(elapsed, 2),
+        "users_per_second": round(len(created) / elapsed, 1) if elapsed else None,
+        "workers": workers,
+    }
+
+def credentials_csv(report):
+    """Temporary passwords of the created users, to hand out to them."""
+    return pd.DataFrame(report["credentials"], columns=["email", "temporary_password"]).to_csv(index=False).encode("utf-8")
+
+# ========== Benchmark ==========
+def _synthetic_roster(users):
+    return pd.DataFrame([
+        ["Farmer", f"First{i}", f"Last{i}", f"farmer{i}@coop.example", "" if i % 2 else f"Secret#{i}X",
+         f"+254700{i:06d}", "Coop Farms", "Nakuru", "member"]
+        for i in range(users)
+    ], columns=ROSTER_COLUMNS)
+
+def benchmark(users=200, workers=HASH_WORKERS):
+    """Provisions a synthetic roster into a temporary database, on one process and on the pool."""
+    roster = _synthetic_roster(users)
+    for pool_size in sorted({1, workers}):
+        with tempfile.TemporaryDirectory() as tmp:
+            database.SQLITE_DB = os.path.join(tmp, "provision.db")
+            database.initialize_database()
+            report = provision(roster, workers=pool_size)
+            print(f"{pool_size} worker(s): {report['created']:,}/{users:,} users in {report['seconds']:.2f}s "
+                  f"({report['users_per_second']:,} users/s; hashing {report['hash_seconds']:.2f}s, "
+                  f"inserts {report['insert_seconds']:.2f}s)")
+            again = provision(roster, workers=pool_size)
+            assert again["created"] == 0 and len(again["rejected"]) == users
+
+if __name__ == "__main__":
+    # Usage: python app/provisioning.py [users] [workers]
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
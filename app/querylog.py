@@ -0,0 +1,268 @@
+import atexit
+import glob
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+import pandas as pd
+
+# ========== Configuration ==========
+# Each process writes and rotates its own file (query_log.<pid>.jsonl), so
+# Streamlit workers and the API never rotate a file another process is writing.
+QUERY_LOG_PATH = os.environ.get("VETSMART_QUERY_LOG", "query_log.jsonl")
+QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+QUERY_LOG_BACKUPS = 3
+QUERY_LOG_KEEP_DAYS = 7        # files of processes that stopped writing longer ago are removed
+QUERY_LOG_QUEUE = 10_000       # entries waiting for the writer thread; more are dropped
+SLOW_QUERY_MS = float(os.environ.get("VETSMART_SLOW_QUERY_MS", "50"))
+
+# Tables that grow with the platform; a full scan of these is always worth flagging.
+WATCHED_TABLES = ("livestock", "vet_requests")
+
+_FULL_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)\b(?! USING)", re.IGNORECASE)
+_EXPLAINABLE = ("select", "with", "insert", "update", "delete", "replace")
+
+# ========== Fingerprinting ==========
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+def normalize_sql(sql):
+    """Collapses literals and whitespace so equivalent statements share a fingerprint."""
+    text = _STRING_RE.sub("?", sql)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("(?+)", text)
+    return _SPACE_RE.sub(" ", text).strip().lower()
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize_sql(sql).encode("utf-8")).hexdigest()[:12]
+
+def params_shape(params):
+    """Describes parameter types without recording their values."""
+    if not params:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}:{type(v).__name__}" for k, v in params.items()) + "}"
+    return "(" + ", ".join(type(v).__name__ for v in params) + ")"
+
+# ========== Log Output ==========
+_logger = logging.getLogger("vetsmart.querylog")
+_logger.propagate = False
+_stats = {}
+_stats_lock = threading.Lock()
+
+_handler_lock = threading.Lock()
+_listener = None
+_dropped = 0
+
+def process_log_path(path=QUERY_LOG_PATH, pid=None):
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.{pid or os.getpid()}{extension}"
+
+def log_files(path=QUERY_LOG_PATH):
+    """Every process's log file and its rotations, plus a legacy shared file if one exists."""
+    stem, extension = os.path.splitext(path)
+    return sorted(glob.glob(f"{glob.escape(stem)}.*{extension}*")) + sorted(glob.glob(glob.escape(path) + "*"))
+
+def _remove_stale_logs(path=QUERY_LOG_PATH):
+    cutoff = time.time() - QUERY_LOG_KEEP_DAYS * 86400
+    for log_path in log_files(path):
+        try:
+            if os.path.getmtime(log_path) < cutoff:
+                os.remove(log_path)
+        except OSError:
+            pass
+
+class _DroppingQueueHandler(QueueHandler):
+    """Hands entries to the writer thread; never blocks the query that produced them."""
+
+    def enqueue(self, record):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped += 1
+
+def _ensure_handler():
+    """Entries go through a queue to a listener thread that owns this process's rotating file."""
+    global _listener
+    if _logger.handlers:
+        return
+    with _handler_lock:
+        if _logger.handlers:
+            return
+        _remove_stale_logs()
+        handler = RotatingFileHandler(process_log_path(), maxBytes=QUERY_LOG_MAX_BYTES,
+                                      backupCount=QUERY_LOG_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        entries = queue.Queue(QUERY_LOG_QUEUE)
+        _listener = QueueListener(entries, handler)
+        _listener.start()
+        atexit.register(_listener.stop)
+        _logger.addHandler(_DroppingQueueHandler(entries))
+        _logger.setLevel(logging.INFO)
+
+def explain(conn, sql, params=()):
+    """Returns the EXPLAIN QUERY PLAN detail lines for a statement."""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+    return [row[-1] for row in rows]
+
+def full_scans(plan):
+    """Watched tables the plan reads without an index."""
+    scanned = []
+    for detail in plan:
+        match = _FULL_SCAN_RE.match(detail)
+        if match and match.group(1).lower() in WATCHED_TABLES:
+            scanned.append(match.group(1).lower())
+    return scanned
+
+def _record(conn, sql, params, elapsed, rows):
+    duration_ms = elapsed * 1000
+    entry = {
+        "ts": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "fingerprint": fingerprint(sql),
+        "statement": normalize_sql(sql),
+        "params": params_shape(params),
+        "duration_ms": round(duration_ms, 3),
+        "rows": rows,
+    }
+
+    if duration_ms >= SLOW_QUERY_MS and entry["statement"].startswith(_EXPLAINABLE):
+        try:
+            plan = explain(conn, sql, params)
+            entry["plan"] = plan
+            entry["full_scan"] = full_scans(plan)
+        except Exception as e:
+            entry["plan_error"] = str(e)
+
+    with _stats_lock:
+        stats = _stats.get(entry["fingerprint"])
+        if stats is None:
+            stats = _stats[entry["fingerprint"]] = {
+                "fingerprint": entry["fingerprint"],
+                "statement": entry["statement"],
+                "calls": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "rows": 0,
+                "slow_calls": 0,
+                "full_scan": "",
+            }
+        stats["calls"] += 1
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        stats["rows"] += max(rows, 0)
+        if "plan" in entry:
+            stats["slow_calls"] += 1
+            stats["full_scan"] = ", ".join(entry["full_scan"])
+
+    try:
+        _ensure_handler()
+        _logger.info(json.dumps(entry))
+    except Exception as e:
+        print(f"Error writing query log: {e}")
+
+# ========== Query Execution Wrappers ==========
+def execute(conn, sql, params=()):
+    """Executes a write statement and logs it; returns the cursor."""
+    start = time.perf_counter()
+    cursor = conn.execute(sql, params)
+    _record(conn, sql, params, time.perf_counter() - start, cursor.rowcount)
+    return cursor
+
+def fetch_all(conn, sql, params=()):
+    start = time.perf_counter()
+    rows = conn.execute(sql, params).fetchall()
+    _record(conn, sql, params, time.perf_counter() - start, len(rows))
+    return rows
+
+def fetch_one(conn, sql, params=()):
+    rows = fetch_all(conn, sql, params)
+    return rows[0] if rows else None
+
+def read_sql(conn, sql, params=None, **kwargs):
+    """pd.read_sql with the statement recorded in the query log."""
+    start = time.perf_counter()
+    df = pd.read_sql(sql, conn, params=params, **kwargs)
+    _record(conn, sql, params, time.perf_counter() - start, len(df))
+    return df
+
+def read_sql_chunks(conn, sql, params=None, chunksize=5000, **kwargs):
+    """Yields DataFrame chunks; the statement is logged once the result is exhausted."""
+    start = time.perf_counter()
+    rows = 0
+    for chunk in pd.read_sql(sql, conn, params=params, chunksize=chunksize, **kwargs):
+        rows += len(chunk)
+        yield chunk
+    _record(conn, sql, params, time.perf_counter() - start, rows)
+
+def iter_fetch(conn, sql, params=(), size=500):
+    """Yields rows in fetchmany batches; the statement is logged once exhausted."""
+    start = time.perf_counter()
+    cursor = conn.execute(sql, params)
+    rows = 0
+    while True:
+        batch = cursor.fetchmany(size)
+        if not batch:
+            break
+        rows += len(batch)
+        yield from batch
+    _record(conn, sql, params, time.perf_counter() - start, rows)
+
+# ========== Reports ==========
+def dropped_entries():
+    """Log entries this process discarded because the writer thread fell behind."""
+    return _dropped
+
+def summary_report():
+    """Per-fingerprint aggregates for this process, most expensive first."""
+    with _stats_lock:
+        rows = [dict(s) for s in _stats.values()]
+    for row in rows:
+        row["mean_ms"] = round(row["total_ms"] / row["calls"], 3)
+        row["total_ms"] = round(row["total_ms"], 3)
+        row["max_ms"] = round(row["max_ms"], 3)
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+def summarize_log_files(path=QUERY_LOG_PATH):
+    """Aggregates every process's log files and their rotations."""
+    totals = {}
+    for log_path in log_files(path):
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                row = totals.setdefault(entry["fingerprint"], {
+                    "fingerprint": entry["fingerprint"],
+                    "statement": entry["statement"],
+                    "calls": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "slow_calls": 0,
+                    "full_scan": "",
+                })
+                row["calls"] += 1
+                row["total_ms"] += entry["duration_ms"]
+                row["max_ms"] = max(row["max_ms"], entry["duration_ms"])
+                if "plan" in entry:
+                    row["slow_calls"] += 1
+                    row["full_scan"] = ", ".join(entry.get("full_scan", []))
+    return sorted(totals.values(), key=lambda row: row["total_ms"], reverse=True)
+
+if __name__ == "__main__":
+    # Usage: python app/querylog.py [query_log.jsonl]
+    report = summarize_log_files(sys.argv[1] if len(sys.argv) > 1 else QUERY_LOG_PATH)
+    print(f"{'fingerprint':<13}{'calls':>8}{'total ms':>12}{'max ms':>10}{'slow':>6}  scans  statement")
+    for row in report:
+        print(f"{row['fingerprint']:<13}{row['calls']:>8}{row['total_ms']:>12.1f}{row['max_ms']:>10.1f}"
+              f"{row['slow_calls']:>6}  {row['full_scan'] or '-':<5}  {row['statement'][:80]}")
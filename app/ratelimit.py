@@ -0,0 +1,242 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# ========== Configuration ==========
+# VETSMART_RATELIMIT_STORE: "memory" keeps buckets in this process, a file path
+# shares them between every process on the host through SQLite, "off" disables
+# limiting.
+STORE_URL = os.environ.get("VETSMART_RATELIMIT_STORE", "memory")
+MAX_KEYS = 100_000             # buckets kept in memory; the least recently used are dropped (and start full again)
+PRUNE_EVERY = 1000             # checks between removals of idle rows from the shared store
+
+# VETSMART_TRUST_PROXY: how many reverse proxies sit in front of the app ("1",
+# or "true", for one). Each appends the address it saw to X-Forwarded-For, so
+# the client is that many hops from the right; hops further left are whatever
+# the client sent. Unset, the header is ignored.
+_trust = os.environ.get("VETSMART_TRUST_PROXY", "").strip().lower()
+TRUSTED_PROXIES = int(_trust) if _trust.isdigit() else int(_trust in ("true", "yes", "on"))
+
+# Token buckets per action and key kind: (capacity, seconds to refill it).
+# "ip" is the client address; "user" is the signed-in user, or the email tried
+# at login so one account cannot be guessed at from many addresses.
+# Override one as VETSMART_RATELIMIT_LOGIN_USER="5/300".
+LIMITS = {
+    "login": {"ip": (20, 60), "user": (5, 300)},
+    "signup": {"ip": (5, 3600)},
+    "chat": {"ip": (60, 60), "user": (20, 60)},
+    "feedback": {"ip": (10, 600), "user": (3, 600)},
+}
+for _action, _kinds in LIMITS.items():
+    for _kind in _kinds:
+        _override = os.environ.get(f"VETSMART_RATELIMIT_{_action.upper()}_{_kind.upper()}")
+        if _override:
+            _capacity, _seconds = _override.split("/")
+            _kinds[_kind] = (int(_capacity), float(_seconds))
+
+ACTION_LABELS = {
+    "login": "login attempts",
+    "signup": "sign-up attempts",
+    "chat": "chat messages",
+    "feedback": "feedback submissions",
+}
+
+Decision = namedtuple("Decision", ["allowed", "retry_after", "limited_by"])
+ALLOWED = Decision(True, 0.0, None)
+
+# ========== Stores ==========
+def _refill(tokens, updated, now, capacity, seconds):
+    return min(capacity, tokens + (now - updated) * capacity / seconds)
+
+class MemoryStore:
+    """Buckets in this process: a dict lookup and a little arithmetic under a lock."""
+
+    def __init__(self, max_keys=MAX_KEYS):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def take(self, keys, cost):
+        """keys: [(key, capacity, seconds)]. Takes cost tokens from every bucket, or from none.
+
+        Returns (allowed, seconds until the emptiest bucket has enough, its key).
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, capacity, seconds in keys:
+                bucket = self._buckets.get(key)
+                tokens = capacity if bucket is None else _refill(bucket[0], bucket[1], now, capacity, seconds)
+                if tokens < cost:
+                    return False, (cost - tokens) * seconds / capacity, key
+                levels.append((key, tokens))
+            for key, tokens in levels:
+                self._buckets[key] = [tokens - cost, now]
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return True, 0.0, None
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+class SQLiteStore:
+    """Buckets shared by the processes on one host through a WAL-mode SQLite file.
+
+    A check is one short IMMEDIATE transaction, so concurrent workers see each
+    other's spending; the file holds only rate state, so it is not synced to disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._checks = 0
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, keys, cost):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            for key, capacity, seconds in keys:
+                row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+                tokens = capacity if row is None else _refill(row[0], row[1], now, capacity, seconds)
+                if tokens < cost:
+                    conn.execute("ROLLBACK")
+                    return False, (cost - tokens) * seconds / capacity, key
+                levels.append((key, tokens - cost, now))
+            conn.executemany("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)", levels)
+            self._checks += 1
+            if self._checks % PRUNE_EVERY == 0:
+                # Buckets idle longer than the slowest refill are full again and need no row
+                slowest = max(seconds for kinds in LIMITS.values() for _, seconds in kinds.values())
+                conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - slowest,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True, 0.0, None
+
+    def clear(self):
+        self._conn().execute("DELETE FROM rate_buckets")
+
+_store = None
+_store_lock = threading.Lock()
+_stats = {}
+
+def store():
+    """The configured store, or None when limiting is off."""
+    global _store
+    if _store is None and STORE_URL != "off":
+        with _store_lock:
+            if _store is None:
+                _store = MemoryStore() if STORE_URL == "memory" else SQLiteStore(STORE_URL)
+    return _store
+
+# ========== Checking ==========
+def check(action, ip=None, user=None, cost=1):
+    """Spends cost tokens of the action's buckets for this ip and user, all or nothing.
+
+    Returns a Decision; a blocked request spends nothing, and retry_after says
+    when it would be allowed. If the shared store fails, the request is allowed.
+    """
+    backend = store()
+    if backend is None:
+        return ALLOWED
+    limits = LIMITS[action]
+    keys = [(f"{action}:{kind}:{value}", *limits[kind])
+            for kind, value in (("ip", ip), ("user", user)) if kind in limits and value is not None]
+    if not keys:
+        return ALLOWED
+    try:
+        allowed, retry_after, key = backend.take(keys, cost)
+    except sqlite3.Error as e:
+        print(f"Error checking rate limit for {action}: {e}")
+        return ALLOWED
+    counts = _stats.setdefault(action, [0, 0])
+    counts[0 if allowed else 1] += 1
+    if allowed:
+        return ALLOWED
+    return Decision(False, retry_after, key.split(":")[1])
+
+def message(action, decision):
+    """A backoff message for a blocked decision."""
+    wait = decision.retry_after
+    if wait < 60:
+        when = f"{max(1, round(wait))} second(s)"
+    elif wait < 3600:
+        when = f"{round(wait / 60)} minute(s)"
+    else:
+        when = f"{wait / 3600:.1f} hour(s)"
+    scope = "for this account" if decision.limited_by == "user" else "from your network"
+    return f"Too many {ACTION_LABELS.get(action, action)} {scope}. Please wait {when} and try again."
+
+def client_ip(context):
+    """The client address from st.context: the X-Forwarded-For hop added by the outermost trusted proxy, else the socket peer."""
+    forwarded = (context.headers or {}).get("X-Forwarded-For") if TRUSTED_PROXIES else None
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()] if forwarded else []
+    if hops:
+        return hops[max(len(hops) - TRUSTED_PROXIES, 0)]
+    return context.ip_address or "local"
+
+def stats():
+    """{action: {"allowed": n, "blocked": n}} for this process."""
+    return {action: {"allowed": counts[0], "blocked": counts[1]} for action, counts in _stats.items()}
+
+# ========== Benchmark ==========
+def _time_checks(checks, clients):
+    start = time.perf_counter()
+    for i in range(checks):
+        check("chat", ip=f"10.0.{i % clients // 250}.{i % 250}", user=i % clients)
+    return (time.perf_counter() - start) / checks
+
+def benchmark(checks=100_000, clients=5000):
+    """Measures the allowed-path overhead per store and a scripted client's burst being cut off."""
+    global _store
+    original = _store
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, backend in (("memory", MemoryStore()), ("sqlite", SQLiteStore(os.path.join(tmp, "rate.db")))):
+            _store = backend
+            per_check = _time_checks(checks if name == "memory" else checks // 10, clients)
+            print(f"{name:<7} allowed-path check: {per_check * 1e6:.1f} us")
+
+            backend.clear()
+            allowed = blocked = 0
+            start = time.perf_counter()
+            decision = ALLOWED
+            while time.perf_counter() - start < 2.0:
+                decision = check("login", ip="203.0.113.9", user="victim@example.com")
+                if decision.allowed:
+                    allowed += 1
+                else:
+                    blocked += 1
+            print(f"        scripted login burst for 2 s: {allowed} allowed, {blocked:,} blocked before bcrypt; "
+                  f"\"{message('login', decision)}\"")
+    _store = original
+
+if __name__ == "__main__":
+    # Usage: python app/ratelimit.py [checks] [clients]
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import secrets
+from datetime import datetime
+
+import querylog
+
+# ========== Schema ==========
+def create_report_tables(conn):
+    """Diagnosis history plus the issued PDF reports."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS diagnoses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            barcode_id TEXT NOT NULL UNIQUE,
+            animal_id INTEGER,
+            user_id INTEGER,
+            symptoms TEXT NOT NULL,
+            disease TEXT NOT NULL,
+            recommendation TEXT,
+            model_version TEXT NOT NULL,
+            report_sha256 TEXT,
+            created_on DATETIME NOT NULL,
+            FOREIGN KEY (animal_id) REFERENCES livestock(id),
+            FOREIGN KEY (report_sha256) REFERENCES report_blobs(sha256)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_diagnoses_animal ON diagnoses(animal_id, created_on)")
+    # Keyed by the SHA-256 of the bytes, which the diagnosis row keeps so a stored report can be
+    # checked against it. Every report prints its own barcode and generation time, so no two
+    # reports share bytes and each one is stored.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_blobs (
+            sha256 TEXT PRIMARY KEY,
+            pdf BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            stored_on DATETIME NOT NULL
+        )
+    """)
+
+# ========== Recording ==========
+def new_barcode_id(animal_name):
+    """Printed on the report; the random suffix keeps same-second reports distinct."""
+    return f"VS-DR-{animal_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(3).upper()}"
+
+def store_blob(conn, pdf_bytes):
+    """Stores the PDF under its SHA-256; returns the hash."""
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    querylog.execute(conn, """
+        INSERT INTO report_blobs (sha256, pdf, size, stored_on) VALUES (?, ?, ?, ?)
+    """, (digest, pdf_bytes, len(pdf_bytes), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    return digest
+
+def record_diagnosis(conn, barcode_id, animal_id, user_id, symptoms, disease, recommendation,
+                     model_version, pdf_bytes=None):
+    """Inserts a diagnosis and its report; returns the diagnosis id. The caller commits and audits."""
+    digest = store_blob(conn, pdf_bytes) if pdf_bytes is not None else None
+    return querylog.execute(conn, """
+        INSERT INTO diagnoses (barcode_id, animal_id, user_id, symptoms, disease, recommendation,
+                               model_version, report_sha256, created_on)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (barcode_id, animal_id, user_id, json.dumps(list(symptoms)), disease, recommendation,
+          model_version, digest, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))).lastrowid
+
+def record_diagnoses(conn, rows, model_version=None):
+    """Bulk insert for diagnoses without a rendered report, e.g. from the API.
+
+    rows are dicts with animal_id, user_id, symptoms, disease and recommendation,
+    and the model_version that produced them unless one is given for the batch;
+    returns the generated barcode ids in input order. The caller commits and audits.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    barcodes = [new_barcode_id(row.get("animal_id") or "API") for row in rows]
+    conn.executemany("""
+        INSERT INTO diagnoses (barcode_id, animal_id, user_id, symptoms, disease, recommendation,
+                               model_version, created_on)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(barcode, row.get("animal_id"), row.get("user_id"), json.dumps(list(row["symptoms"])),
+           row["disease"], row["recommendation"], model_version or row.get("model_version"), now)
+          for barcode, row in zip(barcodes, rows)])
+    return barcodes
+
+# ========== Lookup ==========
+def lookup(conn, barcode_id):
+    """Verifies a printed barcode through the unique index; returns the record or None."""
+    row = querylog.fetch_one(conn, """
+        SELECT d.id, d.barcode_id, d.animal_id, l.name, d.symptoms, d.disease, d.recommendation,
+               d.model_version, d.report_sha256, d.created_on
+        FROM diagnoses d
+        LEFT JOIN livestock l ON l.id = d.animal_id
+        WHERE d.barcode_id = ?
+    """, (barcode_id.strip(),))
+    if row is None:
+        return None
+    keys = ["id", "barcode_id", "animal_id", "animal", "symptoms", "disease", "recommendation",
+            "model_version", "report_sha256", "created_on"]
+    record = dict(zip(keys, row))
+    record["symptoms"] = json.loads(record["symptoms"])
+    return record
+
+def report_pdf(conn, barcode_id):
+    """Stored PDF bytes for a barcode, or None if the diagnosis has no report."""
+    row = querylog.fetch_one(conn, """
+        SELECT b.pdf FROM diagnoses d JOIN report_blobs b ON b.sha256 = d.report_sha256
+        WHERE d.barcode_id = ?
+    """, (barcode_id.strip(),))
+    return row[0] if row else None
+
+def history(conn, animal_id, limit=50):
+    """Most recent diagnoses for one animal."""
+    return querylog.read_sql(conn, """
+        SELECT created_on AS "Date", disease AS "Disease", symptoms AS "Symptoms",
+               model_version AS "Model", barcode_id AS "Barcode"
+        FROM diagnoses
+        WHERE animal_id = ?
+        ORDER BY created_on DESC
+        LIMIT ?
+    """, params=(int(animal_id), limit))
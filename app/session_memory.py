@@ -0,0 +1,313 @@
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+import writer
+
+# ========== Configuration ==========
+# Chat lists keep only their most recent entries in memory; older turns are
+# written to the chat_archive table and can be read back with earlier_turns.
+# Every other key is only measured: the app keeps no DataFrames in session state
+# (pages load them through the shared cache on each rerun), so there is nothing
+# to evict, and sessions over SESSION_BUDGET are flagged in the Diagnostics tab.
+# A session is measured at most every MEASURE_SECONDS, not on every rerun.
+MAX_HISTORY = int(os.environ.get("VETSMART_MAX_CHAT_TURNS", "40"))
+SPILL_BATCH = 20           # a list may run this far over MAX_HISTORY so turns are archived in groups
+SESSION_BUDGET = int(float(os.environ.get("VETSMART_SESSION_BUDGET_MB", "32")) * 1024 * 1024)
+ARCHIVE_DB = os.environ.get("VETSMART_CHAT_ARCHIVE_DB", "livestock_data.db")
+IDLE_SECONDS = 3600        # sessions not seen for this long leave the registry
+MAX_DEPTH = 6              # nesting followed when sizing a value
+MEASURE_SECONDS = 30       # how often a session's footprint is measured and its caps applied
+
+# Session state keys holding chat turns, and the channel they are archived under
+HISTORY_KEYS = {"chat_history": "vetchat", "messages": "assistant"}
+SESSION_ID_KEY = "memory_session_id"
+
+# ========== Schema ==========
+def create_chat_archive_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chat_archive (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            user_id INTEGER,
+            channel TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            archived_on DATETIME NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_archive_session ON chat_archive(session_id, channel, id)")
+
+# ========== Measuring ==========
+def footprint(value, _seen=None, _depth=0):
+    """Approximate bytes held by a value, following containers and object attributes once each."""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True).sum()) if not isinstance(value, pd.Index) \
+            else int(value.memory_usage(deep=True))
+    size = sys.getsizeof(value)
+    if _depth >= MAX_DEPTH or isinstance(value, (str, bytes, bytearray, int, float, bool)):
+        return size
+    if isinstance(value, dict):
+        items = list(value.items())
+        size += sum(footprint(k, _seen, _depth + 1) + footprint(v, _seen, _depth + 1) for k, v in items)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(footprint(v, _seen, _depth + 1) for v in list(value))
+    else:
+        if hasattr(value, "__dict__"):
+            size += footprint(vars(value), _seen, _depth + 1)
+        for slot in getattr(type(value), "__slots__", ()):
+            if hasattr(value, slot):
+                size += footprint(getattr(value, slot), _seen, _depth + 1)
+    return size
+
+def measure(state):
+    """Bytes per session state key, largest first."""
+    seen = set()
+    sizes = {}
+    for key in list(state.keys()):
+        try:
+            sizes[key] = footprint(state[key], seen)
+        except Exception as e:
+            print(f"Error measuring session key {key}: {e}")
+    return dict(sorted(sizes.items(), key=lambda item: item[1], reverse=True))
+
+def process_rss():
+    """Resident memory of this server process in bytes, or None if it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+# ========== Chat History ==========
+_stats = {"turns_spilled": 0, "spill_errors": 0}
+_stats_lock = threading.Lock()
+_archive_ready = set()
+
+def session_id(state):
+    """A stable id for this browser session, kept in its own state."""
+    if SESSION_ID_KEY not in state:
+        state[SESSION_ID_KEY] = uuid.uuid4().hex
+    return state[SESSION_ID_KEY]
+
+def _as_turn(entry):
+    if isinstance(entry, dict):
+        return str(entry.get("role", "")), str(entry.get("content", ""))
+    return str(entry[0]), str(entry[1])
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+def _spill(db_path, rows):
+    """Appends archived turns through the database's writer thread without waiting for the commit."""
+    def work(conn):
+        if db_path not in _archive_ready:
+            create_chat_archive_table(conn)
+            _archive_ready.add(db_path)
+        conn.executemany("""
+            INSERT INTO chat_archive (session_id, user_id, channel, role, content, archived_on)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+
+    def done(future):
+        if future.exception() is not None:
+            print(f"Error archiving chat history: {future.exception()}")
+            _count("spill_errors", len(rows))
+
+    future = writer.get_writer(db_path).submit(work)
+    future.add_done_callback(done)
+    return future
+
+def trim_history(state, key, limit=None, slack=0, db_path=None):
+    """Moves all but the newest `limit` entries of state[key] to the archive once it holds more
+    than limit + slack; returns how many moved."""
+    history = state.get(key)
+    limit = MAX_HISTORY if limit is None else limit
+    if not isinstance(history, list) or len(history) <= limit + slack:
+        return 0
+    overflow = len(history) - limit
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    sid, user_id = session_id(state), state.get("user_id")
+    channel = HISTORY_KEYS.get(key, key)
+    rows = [(sid, user_id, channel) + _as_turn(entry) + (now,) for entry in history[:overflow]]
+    try:
+        _spill(db_path or ARCHIVE_DB, rows)
+    except Exception as e:
+        print(f"Error archiving chat history: {e}")
+        _count("spill_errors", len(rows))
+    del history[:overflow]
+    _count("turns_spilled", overflow)
+    state[f"{key}_archived"] = state.get(f"{key}_archived", 0) + overflow
+    return overflow
+
+def remember(state, key, entry, db_path=None):
+    """Appends a chat entry to state[key], keeping the in-memory list within MAX_HISTORY + SPILL_BATCH."""
+    if key not in state:
+        state[key] = []
+    state[key].append(entry)
+    trim_history(state, key, slack=SPILL_BATCH, db_path=db_path)
+
+def archived_history(conn, sid, channel, limit=MAX_HISTORY):
+    """The most recent archived turns of a session's chat, oldest first."""
+    rows = conn.execute("""
+        SELECT role, content FROM chat_archive
+        WHERE session_id = ? AND channel = ?
+        ORDER BY id DESC
+        LIMIT ?
+    """, (sid, channel, limit)).fetchall()
+    return rows[::-1]
+
+def earlier_turns(state, key, db_path=None, limit=MAX_HISTORY):
+    """The most recent turns of state[key] that were moved to the archive, oldest first, as (role, content)."""
+    if not state.get(f"{key}_archived"):
+        return []
+    conn = sqlite3.connect(db_path or ARCHIVE_DB, timeout=writer.BUSY_TIMEOUT)
+    try:
+        return archived_history(conn, session_id(state), HISTORY_KEYS.get(key, key), limit)
+    except sqlite3.Error as e:
+        print(f"Error reading archived chat history: {e}")
+        return []
+    finally:
+        conn.close()
+
+# ========== Enforcing Caps ==========
+# Latest measurement of every session served by this process, keyed by session id
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def enforce(state, user=None, db_path=None):
+    """Applies the history cap to one session and records its footprint.
+
+    Called at the end of every rerun; history is trimmed each time, but the
+    session is only re-measured every MEASURE_SECONDS. Returns this session's
+    registry entry.
+    """
+    sid = session_id(state)
+    for key in HISTORY_KEYS:
+        trim_history(state, key, db_path=db_path)
+
+    now = time.time()
+    with _sessions_lock:
+        previous = _sessions.get(sid)
+        if previous is not None and now - previous["measured"] < MEASURE_SECONDS:
+            previous.update(user=user or "-", seen=now,
+                            chat_turns=sum(len(state.get(k) or []) for k in HISTORY_KEYS),
+                            turns_archived=sum(state.get(f"{k}_archived", 0) for k in HISTORY_KEYS))
+            return previous
+
+    sizes = measure(state)
+    total = sum(sizes.values())
+
+    entry = {
+        "session": sid[:8],
+        "user": user or "-",
+        "bytes": total,
+        "largest_key": next(iter(sizes), "-"),
+        "chat_turns": sum(len(state.get(k) or []) for k in HISTORY_KEYS),
+        "turns_archived": sum(state.get(f"{k}_archived", 0) for k in HISTORY_KEYS),
+        "over_budget": total > SESSION_BUDGET,
+        "keys": sizes,
+        "measured": now,
+        "seen": now,
+    }
+    with _sessions_lock:
+        _sessions[sid] = entry
+        for other, info in list(_sessions.items()):
+            if now - info["seen"] > IDLE_SECONDS:
+                del _sessions[other]
+    return entry
+
+def session_sizes(state):
+    """Bytes per key of this session as of its last measurement; measured now if it has none."""
+    with _sessions_lock:
+        entry = _sessions.get(session_id(state))
+    return dict(entry["keys"]) if entry else measure(state)
+
+def session_report():
+    """One row per session seen by this process within IDLE_SECONDS, largest first."""
+    with _sessions_lock:
+        entries = list(_sessions.values())
+    return [
+        {
+            "session": e["session"],
+            "user": e["user"],
+            "memory_kb": round(e["bytes"] / 1024, 1),
+            "largest_key": e["largest_key"],
+            "chat_turns": e["chat_turns"],
+            "turns_archived": e["turns_archived"],
+            "over_budget": e["over_budget"],
+            "last_seen": datetime.fromtimestamp(e["seen"]).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        for e in sorted(entries, key=lambda e: e["bytes"], reverse=True)
+    ]
+
+def totals():
+    with _sessions_lock:
+        total = sum(e["bytes"] for e in _sessions.values())
+        count = len(_sessions)
+    with _stats_lock:
+        stats = dict(_stats)
+    return dict(stats, sessions=count, session_bytes=total, rss_bytes=process_rss())
+
+# ========== Load Simulation ==========
+def simulate(sessions=500, turns=400, message_chars=300):
+    """Grows many sessions' chat history, uncapped and capped, and compares the memory held."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "archive.db")
+        conn = sqlite3.connect(db_path)
+        writer.configure(conn)
+        create_chat_archive_table(conn)
+        conn.commit()
+
+        for capped in (False, True):
+            tracemalloc.start()
+            states = [{"user_id": n} for n in range(sessions)]
+            start = time.perf_counter()
+            for turn in range(turns):
+                for state in states:
+                    text = "".join(random.choices("abcdefghij ", k=message_chars))
+                    if capped:
+                        remember(state, "chat_history", ("You", text), db_path=db_path)
+                        remember(state, "messages", {"role": "assistant", "content": text}, db_path=db_path)
+                    else:
+                        state.setdefault("chat_history", []).append(("You", text))
+                        state.setdefault("messages", []).append({"role": "assistant", "content": text})
+            elapsed = time.perf_counter() - start
+            held = sum(sum(measure(state).values()) for state in states)
+            spilled = sum(state.get(f"{k}_archived", 0) for state in states for k in HISTORY_KEYS)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            label = f"capped at {MAX_HISTORY}" if capped else "uncapped"
+            print(f"{label:<14} {sessions} sessions x {2 * turns} turns: {held / 2**20:,.1f} MB in session state, "
+                  f"traced {current / 2**20:,.1f} MB (peak {peak / 2**20:,.1f} MB), {elapsed:.2f}s")
+
+        writer.get_writer(db_path).submit(lambda c: None).result(writer.ACK_TIMEOUT)
+        archived = conn.execute("SELECT COUNT(*) FROM chat_archive").fetchone()[0]
+        conn.close()
+        print(f"archived {archived:,} of {spilled:,} spilled turns ({_stats['spill_errors']} errors)")
+
+if __name__ == "__main__":
+    # Usage: python app/session_memory.py [sessions] [turns]
+    args = [int(a) for a in sys.argv[1:]]
+    simulate(*args)
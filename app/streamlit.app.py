@@ -3,6 +3,7 @@ import streamlit as st
 # ========== Page Setup ==========
 st.set_page_config(page_title="VetSmart", layout="wide")
 
+import os
 import pandas as pd
 from datetime import datetime
 import random
@@ -19,216 +20,67 @@ import nltk
 from PIL import Image
 import plotly.express as px
 import bcrypt
-import re
-
-
-# ========== Database Configuration ==========
-SQLITE_DB = 'livestock_data.db'
-
-# ========== Database Connection Functions ==========
-def get_sqlite_connection():
-    return sqlite3.connect(SQLITE_DB)
-
-# ========== Initialize Database and Tables ==========
-def initialize_database():
-    conn = get_sqlite_connection()
-    cursor = conn.cursor()
-
-    # Create users table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            role TEXT NOT NULL,
-            firstname TEXT NOT NULL,
-            lastname TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL, 
-            telephone TEXT NOT NULL,
-            farmname TEXT NOT NULL,
-            farmaddress TEXT NOT NULL,
-            farmrole TEXT NOT NULL,
-            registered_on DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-
-    # Create livestock table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS livestock (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            animal_type TEXT NOT NULL,
-            age REAL NOT NULL,
-            weight REAL NOT NULL,
-            vaccination TEXT NOT NULL,
-            user_id INTEGER NOT NULL,
-            added_on DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-    """)
-
-    # Create feedback table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS feedback (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            feedback TEXT NOT NULL,
-            submitted_on DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    # Create veterinarians table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS veterinarians (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            specialization TEXT NOT NULL,
-            phone TEXT NOT NULL,
-            email TEXT NOT NULL,
-            registered_on DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    # Create vet_requests table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS vet_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            farmer_name TEXT NOT NULL,
-            animal_tag TEXT NOT NULL,
-            vet_id INTEGER NOT NULL,
-            request_reason TEXT NOT NULL,
-            requested_on DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(vet_id) REFERENCES veterinarians(id)
-        )
-    """)
-
-    conn.commit()
-    conn.close()
+import profiling
+import querylog
+import export
+import herd
+import analytics
+import growth
+import vaccines
+import reports
+import outbreak
+import cache
+import session_memory
+import provisioning
+import feedback_analytics
+import audit
+import archive
+import maintenance
+import diagnosis
+import symptoms
+import knowledge
+import ratelimit
+from diagnosis import SYMPTOMS
+from database import (
+    SQLITE_DB, get_sqlite_connection, initialize_database,
+    load_users, save_users, find_user, load_data, find_animal, find_tag, search_animals, save_livestock_data,
+    load_feedback, save_feedback, load_veterinarians, save_veterinarian, load_vet_requests, save_vet_request,
+    open_vet_requests, retire_animal, close_vet_requests, archive_cold_data, live_row_counts, export_livestock,
+    record_measurement, record_vaccination, record_diagnosis, update_feedback_analytics, refresh_outbreak_monitor
+)
 
 # Call the function to initialize the database
 initialize_database()
 
-# ========== Load & Save Data Functions ==========
-# Users
-def load_users():
-    conn = get_sqlite_connection()
-    df = pd.read_sql("SELECT * FROM users", conn)
-    conn.close()
-    return df
-
-def save_users(role, firstname, lastname, email, password, telephone, farmname, farmaddress, farmrole):
-    try:
-        conn = get_sqlite_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO users (role, firstname, lastname, email, password, telephone, farmname, farmaddress, farmrole, registered_on)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (role, firstname, lastname, email, password, telephone, farmname, farmaddress, farmrole, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-    except Exception as e:
-        print(f"Error saving users: {e}")
-    finally:
-        conn.close()
-
-# Livestock
-def load_data(user_id=None):
-    try:
-        conn = get_sqlite_connection()
-        if user_id is not None:
-            df = pd.read_sql(f"SELECT * FROM livestock WHERE user_id = ?", conn, params=(user_id,))
-        else:
-            df = pd.read_sql("SELECT * FROM livestock", conn)
-        conn.close()
-
-        # Rename columns for consistency
-        df.rename(columns={
-            "animal_type": "Type",
-            "name": "Name",
-            "age": "Age",
-            "weight": "Weight",
-            "vaccination": "Vaccination",
-            "added_on": "Date Added"
-        }, inplace=True)
-
-        return df
-    except FileNotFoundError:
-        return pd.DataFrame()
-        
-def save_livestock_data(name, animal_type, age, weight, vaccination, user_id):
-    try:
-        conn = get_sqlite_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO livestock (name, animal_type, age, weight, vaccination, user_id, added_on)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (name, animal_type, age, weight, vaccination, user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-    except Exception as e:
-        print(f"Error saving livestock data: {e}")
-    finally:
-        conn.close()
-
-# Feedback
-def load_feedback():
-    conn = get_sqlite_connection()
-    df = pd.read_sql("SELECT * FROM feedback", conn)
-    conn.close()
-    return df
-
-def save_feedback(name, feedback_text):
-    try:
-        conn = get_sqlite_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO feedback (name, feedback, submitted_on)
-            VALUES (?, ?, ?)
-        """, (name, feedback_text, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-    except Exception as e:
-        print(f"Error saving feedback: {e}")
-    finally:
-        conn.close()
-
-# Veterinarians
-def load_veterinarians():
-    conn = get_sqlite_connection()
-    df = pd.read_sql("SELECT * FROM veterinarians", conn)
-    conn.close()
-    return df
-
-def save_veterinarian(name, specialization, phone, email):
-    try:
-        conn = get_sqlite_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO veterinarians (name, specialization, phone, email, registered_on)
-            VALUES (?, ?, ?, ?, ?)
-        """, (name, specialization, phone, email, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-    except Exception as e:
-        print(f"Error saving veterinarian: {e}")
-    finally:
-        conn.close()
-
-# Vet Requests
-def load_vet_requests():
-    conn = get_sqlite_connection()
-    df = pd.read_sql("SELECT * FROM vet_requests", conn)
-    conn.close()
-    return df
-
-def save_vet_request(farmer_name, animal_tag, vet_id, request_reason):
-    try:
-        conn = get_sqlite_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO vet_requests (farmer_name, animal_tag, vet_id, request_reason, requested_on)
-            VALUES (?, ?, ?, ?, ?)
-        """, (farmer_name, animal_tag, vet_id, request_reason, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-    except Exception as e:
-        print(f"Error saving vet request: {e}")
-    finally:
-        conn.close()
+# Scheduled backups and ANALYZE/optimize/vacuum, one daemon thread per server process
+maintenance.start(SQLITE_DB)
+
+# ========== Instrumentation ==========
+# Timers for every data access function; results show up in the Diagnostics tab.
+load_users = profiling.timed()(load_users)
+save_users = profiling.timed()(save_users)
+find_user = profiling.timed()(find_user)
+load_data = profiling.timed()(load_data)
+find_animal = profiling.timed()(find_animal)
+find_tag = profiling.timed()(find_tag)
+search_animals = profiling.timed()(search_animals)
+save_livestock_data = profiling.timed()(save_livestock_data)
+load_feedback = profiling.timed()(load_feedback)
+update_feedback_analytics = profiling.timed()(update_feedback_analytics)
+refresh_outbreak_monitor = profiling.timed()(refresh_outbreak_monitor)
+save_feedback = profiling.timed()(save_feedback)
+load_veterinarians = profiling.timed()(load_veterinarians)
+save_veterinarian = profiling.timed()(save_veterinarian)
+load_vet_requests = profiling.timed()(load_vet_requests)
+save_vet_request = profiling.timed()(save_vet_request)
+open_vet_requests = profiling.timed()(open_vet_requests)
+retire_animal = profiling.timed()(retire_animal)
+close_vet_requests = profiling.timed()(close_vet_requests)
+archive_cold_data = profiling.timed()(archive_cold_data)
+live_row_counts = profiling.timed()(live_row_counts)
+record_measurement = profiling.timed()(record_measurement)
+record_vaccination = profiling.timed()(record_vaccination)
+record_diagnosis = profiling.timed()(record_diagnosis)
 
 # ================================== Landing / Login Page ======================================================
 # Background image
@@ -258,24 +110,20 @@ if "show_login" not in st.session_state:
     st.session_state.show_login = False
 if "show_signup" not in st.session_state:
     st.session_state.show_signup = False
+if "perf_stats" not in st.session_state:
+    st.session_state.perf_stats = {}
 
-# -- Database connection helper --
-def get_sqlite_connection():
-    return sqlite3.connect("livestock_data.db")
-
-# -- Password strength checker --
-def password_strength(pw):
-    length = len(pw)
-    has_upper = bool(re.search(r'[A-Z]', pw))
-    has_special = bool(re.search(r'[\W_]', pw))
-    score = 0
-    if length >= 6:
-        score += 1
-    if has_upper:
-        score += 1
-    if has_special:
-        score += 1
-    return score
+# Per-session timings are collected for the rest of this rerun
+profiling.bind_session(st.session_state.perf_stats)
+
+# Audit events recorded during this rerun are attributed to the signed-in user
+audit.bind_actor(st.session_state.get("user_id") if st.session_state.logged_in else None)
+
+# Login, signup, chat and feedback are rate limited per client address and user
+client_address = ratelimit.client_ip(st.context)
+
+# -- Password strength checker (shared with bulk provisioning) --
+password_strength = provisioning.password_strength
 
 def password_strength_message(score):
     if score == 0:
@@ -307,14 +155,15 @@ if not st.session_state.logged_in:
             login_pwd = st.text_input("Password", type="password", key="login_pwd")
 
             if st.button("Login", key="login_btn"):
-                if not login_user or not login_pwd:
+                # Checked before the password hash so scripted guessing cannot tie up the CPU
+                decision = ratelimit.check("login", ip=client_address, user=login_user.strip().lower() or None)
+                if not decision.allowed:
+                    st.error(ratelimit.message("login", decision))
+                elif not login_user or not login_pwd:
                     st.warning("Please enter both email and password.")
                 else:
                     try:
-                        conn = get_sqlite_connection()
-                        c = conn.cursor()
-                        c.execute("SELECT Password, Role, Firstname, Lastname, id FROM users WHERE Email = ?", (login_user,))
-                        row = c.fetchone()
+                        row = find_user(login_user)
 
                         if row and bcrypt.checkpw(login_pwd.encode('utf-8'), row[0].encode('utf-8')):
                             st.session_state['logged_in'] = True
@@ -327,8 +176,6 @@ if not st.session_state.logged_in:
                             st.error("Login failed: Invalid email or password.")
                     except Exception as e:
                         st.error(f"Database error: {e}")
-                    finally:
-                        conn.close()
                         
     user_id = st.session_state.get("user_id")
 
@@ -356,7 +203,10 @@ if not st.session_state.logged_in:
                 farm_role    = st.text_input("Farm Role (e.g., owner, worker)")
                 submitted    = st.form_submit_button("Register")
 
-                if submitted:
+                decision = ratelimit.check("signup", ip=client_address) if submitted else ratelimit.ALLOWED
+                if not decision.allowed:
+                    st.error(ratelimit.message("signup", decision))
+                elif submitted:
                     try:
                         if not all([firstname, lastname, email, password, confirm, telephone, farm_name, farm_address, farm_role]):
                             st.error("All fields are required.")
@@ -365,24 +215,16 @@ if not st.session_state.logged_in:
                         elif password_strength(password) < 3:
                             st.error("Password must be at least 6 characters, with uppercase and special character.")
                         else:
-                            conn = get_sqlite_connection()
-                            c = conn.cursor()
-                            c.execute("SELECT * FROM users WHERE email = ?", (email,))
-                            if c.fetchone():
+                            if find_user(email):
                                 st.error("Email already used.")
                             else:
                                 hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-                                c.execute('''
-                                    INSERT INTO users 
-                                    (role, firstname, lastname, email, password, telephone, farmname, farmaddress, farmrole, registered_on)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                                ''', (role, firstname, lastname, email, hashed.decode('utf-8'),
-                                      telephone, farm_name, farm_address, farm_role,
-                                      datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-                                conn.commit()
-                                conn.close()
-                                st.success(f"User '{email}' registered successfully! You can now log in.")
-                                st.session_state['show_signup'] = False
+                                if save_users(role, firstname, lastname, email, hashed.decode('utf-8'),
+                                              telephone, farm_name, farm_address, farm_role) is None:
+                                    st.error("Registration failed. Please try again.")
+                                else:
+                                    st.success(f"User '{email}' registered successfully! You can now log in.")
+                                    st.session_state['show_signup'] = False
                     except Exception as e:
                         st.error(f"Registration failed: {e}")
                     
@@ -489,22 +331,9 @@ if st.session_state.get('logged_in'):
         unsafe_allow_html=True
     )
 
-# ========== Disease Prediction Function ==========
-def predict_disease(symptoms):
-    diseases = ['Foot-and-Mouth', 'Anthrax', 'PPR', 'Mastitis', 'None']
-    prediction = random.choice(diseases[:-1]) if symptoms else 'None'
-    treatments = {
-        "Foot-and-Mouth": "Vaccinate and isolate affected livestock.",
-        "Anthrax": "Antibiotic treatment and quarantine infected animals.",
-        "PPR": "Supportive care and vaccines.",
-        "Mastitis": "Treat with antibiotics and maintain hygiene.",
-        "None": "No disease detected."
-    }
-    return prediction, treatments[prediction]
-
 # ========================PDF Report ===========================
 
-def generate_diagnosis_report(animal_data, disease, recommendation):
+def generate_diagnosis_report(animal_data, disease, recommendation, barcode_value=None):
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=letter)
     width, height = letter
@@ -593,7 +422,8 @@ def generate_diagnosis_report(animal_data, disease, recommendation):
         c.drawString(width - inch - 100, height - 50, "Logo could not be loaded")
 
     # --- Barcode Section ---
-    barcode_value = f"VS-DR-{animal_data['Name']}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    if barcode_value is None:
+        barcode_value = reports.new_barcode_id(animal_data["Name"])
     barcode = code128.Code128(barcode_value, barHeight=0.75 * inch)
     barcode_width = barcode.wrap(0, 0)[0]
     x_position = width - barcode_width - inch
@@ -617,6 +447,31 @@ def generate_diagnosis_report(animal_data, disease, recommendation):
     buffer.seek(0)
     return buffer
 
+generate_diagnosis_report = profiling.timed()(generate_diagnosis_report)
+
+# ========== Animal Selection ==========
+def herd_scope():
+    """Farmers pick from their own animals; vets and admins search every farm."""
+    return st.session_state.get("user_id") if st.session_state.get("user_role") == "Farmer" else None
+
+def select_animal(key, label="Select Registered Animal"):
+    """Typeahead: the typed tag prefix runs an indexed search and only the matches are offered.
+
+    Returns the chosen animal as a dict ("id", "Name", "Type", ...) or None.
+    """
+    prefix = st.text_input("Search by animal tag", key=f"{key}_prefix",
+                           placeholder="Type the first characters of the tag").strip()
+    matches = search_animals(prefix, user_id=herd_scope())
+    if not matches:
+        if prefix:
+            st.info(f"No animal tag starts with '{prefix}'.")
+        else:
+            st.warning("No livestock registered yet. Please add animals to the dashboard first.")
+        return None
+    options = {animal_id: f"{name} ({animal_type})" for animal_id, name, animal_type in matches}
+    animal_id = st.selectbox(label, list(options), format_func=options.get, key=f"{key}_id")
+    return find_animal(animal_id)
+
 # ========== Page Functions ==========
 def display_add_livestock():
     """Displays the livestock dashboard and add animal form."""
@@ -638,14 +493,24 @@ def display_add_livestock():
             if animal_type == "-- Select Type --" or not name:
                 st.warning("Please fill in all required fields.")
             else:
-                save_livestock_data(name, animal_type, age, weight, vaccination, user_id)
-                st.success(f"{animal_type} '{name}' saved successfully!")
+                # Tags are unique per farm: saving an existing tag updates that animal, retired or not
+                existing = find_tag(name, user_id)
+                if save_livestock_data(name, animal_type, age, weight, vaccination, user_id) is None:
+                    st.error(f"{animal_type} '{name}' could not be saved. Please try again.")
+                elif existing and existing[1]:
+                    st.success(f"{animal_type} '{name}' had been retired on {existing[1][:10]}; it is back in "
+                               f"your herd with these details.")
+                elif existing:
+                    st.success(f"{animal_type} '{name}' was already registered; its record has been updated.")
+                else:
+                    st.success(f"{animal_type} '{name}' saved successfully!")
 
 def display_view_livestock():
     """Displays all registered livestock with filters, sorting, and export."""
     st.subheader("🐐🐑🐄 View Your Livestock")
     user_id = st.session_state.get("user_id")
-    df = load_data(user_id=user_id)
+    include_archived = st.checkbox("Include retired and archived animals", key="view_include_archived")
+    df = load_data(user_id=user_id, include_archived=include_archived)
 
     if df.empty:
         st.info("No livestock records found.")
@@ -653,7 +518,7 @@ def display_view_livestock():
 
     # --- Filter section ---
     with st.expander("🔍 Filter Records"):
-        animal_types = ["All"] + sorted(df["Type"].dropna().unique())
+        animal_types = ["All"] + sorted(df["Type"].cat.categories)
         selected_type = st.selectbox("Filter by Animal Type", animal_types)
 
         search_tag = st.text_input("Search by Animal Tag")
@@ -662,19 +527,14 @@ def display_view_livestock():
         sort_column = st.selectbox("Sort By", ["None", "Age", "Weight"])
         sort_order = st.radio("Sort Order", ["Ascending", "Descending"], horizontal=True)
 
-    # --- Apply filters ---
-    filtered_df = df.copy()
-
-    if selected_type != "All":
-        filtered_df = filtered_df[filtered_df["Type"] == selected_type]
-
-    if search_tag:
-        filtered_df = filtered_df[filtered_df["Name"].str.contains(search_tag, case=False)]
-
-    # --- Apply sorting ---
-    if sort_column != "None":
-        ascending = sort_order == "Ascending"
-        filtered_df = filtered_df.sort_values(by=sort_column, ascending=ascending)
+    # --- Apply filters and sorting ---
+    filtered_df = herd.filter_herd(
+        df,
+        animal_type=None if selected_type == "All" else selected_type,
+        search_tag=search_tag,
+        sort_column=None if sort_column == "None" else sort_column,
+        ascending=sort_order == "Ascending"
+    )
 
     # --- Display results ---
     if filtered_df.empty:
@@ -683,13 +543,36 @@ def display_view_livestock():
         st.dataframe(filtered_df)
 
         # --- Export button ---
-        csv = filtered_df.to_csv(index=False).encode('utf-8')
+        # The file is streamed from the database in chunks only when the button is clicked
+        export_format = st.radio("Export Format", list(export.EXPORT_FORMATS), horizontal=True)
+        extension, mime = export.EXPORT_FORMATS[export_format]
+        filters = {
+            "user_id": user_id,
+            "animal_type": None if selected_type == "All" else selected_type,
+            "search_tag": search_tag,
+            "sort_column": None if sort_column == "None" else sort_column,
+            "ascending": sort_order == "Ascending",
+            "include_retired": include_archived,
+        }
+
         st.download_button(
-            label="📥 Download Filtered Data as CSV",
-            data=csv,
-            file_name="filtered_livestock_records.csv",
-            mime="text/csv"
+            label=f"📥 Download Filtered Data as {export_format}",
+            data=lambda: export_livestock(export_format, **filters),
+            file_name=f"filtered_livestock_records.{extension}",
+            mime=mime
         )
+        if include_archived:
+            st.caption("Exports cover animals still in the live herd; archived animals are not included.")
+
+    # --- Retire section ---
+    with st.expander("🏷️ Retire an Animal"):
+        st.caption("Sold or deceased animals leave the herd views and are moved to the archive later.")
+        animal = select_animal("retire_animal", label="Animal to Retire")
+        if animal is not None and st.button("Retire Animal", key="retire_animal_btn"):
+            if retire_animal(animal["id"]) is None:
+                st.error(f"{animal['Name']} could not be retired.")
+            else:
+                st.success(f"{animal['Name']} has been retired.")
 
 def display_dashboard():
     st.subheader("📊 Livestock Dashboard")
@@ -700,9 +583,6 @@ def display_dashboard():
         st.info("No livestock records found. Please add livestock data.")
         return
 
-    # Rename columns if needed
-    df.rename(columns={"animal_type": "Type", "age": "Age", "weight": "Weight", "vaccination": "Vaccination", "name": "Name", "added_on": "Date Added"}, inplace=True)
-
     # Show raw data
     with st.expander("View Raw Data"):
         st.dataframe(df)
@@ -739,35 +619,175 @@ def display_dashboard():
     st.plotly_chart(fig2, use_container_width=True)
 
     # Line chart for livestock added over time
-    df["Added_On"] = pd.to_datetime(df["Added_On"])
-    added_over_time = df.groupby(df["Added_On"].dt.date).size().reset_index(name='Count')
-    fig3 = px.line(added_over_time, x="Added_On", y="Count", title="Livestock Added Over Time")
+    added_over_time = df.groupby(df["Date Added"].dt.date).size().reset_index(name='Count')
+    fig3 = px.line(added_over_time, x="Date Added", y="Count", title="Livestock Added Over Time")
     st.plotly_chart(fig3, use_container_width=True)
 
+    display_growth_trends(df, user_id)
+
+def display_growth_trends(df, user_id):
+    """Measurement entry, growth rates and anomaly flags for the user's herd."""
+    st.markdown("### Growth & Health Trends")
+    animal_names = dict(zip(df["id"], df["Name"]))
+
+    with st.form("measurement_form", clear_on_submit=True):
+        animal_id = st.selectbox("Animal", list(animal_names), format_func=animal_names.get)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            weight = st.number_input("Weight (kg)", 0.0, 1500.0, key="measurement_weight")
+        with col2:
+            temperature = st.number_input("Temperature (°C)", 30.0, 45.0, 38.5, key="measurement_temperature")
+        with col3:
+            body_condition = st.slider("Body Condition Score", 1.0, 5.0, 3.0, 0.5)
+        if st.form_submit_button("Record Measurement"):
+            if record_measurement(int(animal_id), weight or None, temperature, body_condition):
+                st.success(f"Measurement recorded for '{animal_names[animal_id]}'.")
+            else:
+                st.error("The measurement could not be saved.")
+
+    conn = get_sqlite_connection()
+    readings = growth.load_measurements(conn, user_id=user_id)
+    conn.close()
+    if readings.empty:
+        st.info("No measurements recorded yet.")
+        return
+
+    trends = growth.analyze(readings, df)
+    flagged = trends[trends["Flagged"]]
+    if not flagged.empty:
+        st.warning(f"{len(flagged)} animal(s) deviate from their own history or their cohort.")
+        st.dataframe(flagged.drop(columns=["id", "Flagged"]), use_container_width=True)
+    with st.expander("Growth Rates for All Animals"):
+        st.dataframe(trends.drop(columns=["id"]), use_container_width=True)
+
+    readings["Date"] = pd.to_datetime(readings["ts"], unit="s")
+    readings["Name"] = readings["animal_id"].map(animal_names)
+    fig = px.line(readings.dropna(subset=["weight"]), x="Date", y="weight", color="Name",
+                  markers=True, title="Weight Over Time")
+    st.plotly_chart(fig, use_container_width=True)
+
+def display_vaccinations():
+    """Displays vaccination records and upcoming due dates for the user's herd."""
+    st.subheader("💉 Vaccination Schedule")
+    user_id = st.session_state.get("user_id")
+    df = load_data(user_id=user_id)
+
+    if df.empty:
+        st.info("No livestock records found. Please add livestock data.")
+        return
+
+    animal_names = dict(zip(df["id"], df["Name"]))
+    animal_types = dict(zip(df["id"], df["Type"]))
+
+    st.markdown("### Record a Vaccination")
+    animal_id = st.selectbox("Animal", list(animal_names), format_func=animal_names.get, key="vaccination_animal")
+    rules = vaccines.SCHEDULE_RULES.get(animal_types[animal_id], [])
+    if not rules:
+        st.info(f"No vaccination schedule is defined for {animal_types[animal_id]}.")
+    else:
+        with st.form("vaccination_form", clear_on_submit=True):
+            vaccine = st.selectbox("Vaccine", [rule.vaccine for rule in rules])
+            given_on = st.date_input("Date Given", datetime.now().date())
+            notes = st.text_input("Notes (batch number, dose, vet)")
+            if st.form_submit_button("Record Vaccination"):
+                if record_vaccination(int(animal_id), vaccine, given_on, notes):
+                    st.success(f"{vaccine} recorded for '{animal_names[animal_id]}'.")
+                else:
+                    st.error("The vaccination could not be saved.")
+
+        conn = get_sqlite_connection()
+        schedule = vaccines.schedule_for(conn, int(animal_id))
+        conn.close()
+        with st.expander(f"Upcoming Doses for {animal_names[animal_id]}"):
+            st.dataframe(pd.DataFrame(schedule, columns=["Due", "Vaccine"]), use_container_width=True)
+
+    st.markdown("### Due Soon")
+    days = st.slider("Due within (days)", 7, 180, 30, 7)
+    # Admins see every farm's animals; everyone else sees their own
+    scope = None if st.session_state.get("user_role") == "Admin" else user_id
+    conn = get_sqlite_connection()
+    due = vaccines.due_within(conn, days, user_id=scope)
+    conn.close()
+    if due.empty:
+        st.success(f"No vaccinations due in the next {days} days.")
+    else:
+        overdue = due[due["Due"] < datetime.now().strftime("%Y-%m-%d")]
+        if not overdue.empty:
+            st.warning(f"{len(overdue)} vaccination(s) are overdue.")
+        st.dataframe(due, use_container_width=True)
+
 def display_diagnosis():
     """Displays the symptom-based disease diagnosis section."""
     st.subheader("🩺 Symptom-based Disease Diagnosis")
-    df = load_data()
-    if df.empty:
-        st.warning("No livestock registered yet. Please add animals to the dashboard first.")
-    else:
-        animal_name = st.selectbox("Select Registered Animal", df["Name"])
-        animal_data = df[df["Name"] == animal_name].iloc[0]
-        symptoms = st.multiselect("Select observed symptoms:", ["Fever", "Coughing", "Diarrhea", "Loss of appetite", "Lameness", "Swelling"])
+    animal_data = select_animal("diagnosis_animal")
+    if animal_data is not None:
+        animal_name = animal_data["Name"]
+        symptoms = st.multiselect("Select observed symptoms:", SYMPTOMS)
 
         if st.button("🧠 Predict Disease"):
-            disease, recommendation = predict_disease(symptoms)
-            st.write(f"**Predicted Disease:** 🐾 {disease}")
-            st.write(f"**Recommendation:** 💊 {recommendation}")
-
-            pdf_buffer = generate_diagnosis_report(animal_data, disease, recommendation)
+            result = diagnosis.diagnose(symptoms, animal_data["Type"])
+            disease, recommendation = result["disease"], result["recommendation"]
+            barcode_id = reports.new_barcode_id(animal_name)
+            pdf_buffer = generate_diagnosis_report(animal_data, disease, recommendation, barcode_id)
+
+            if record_diagnosis(barcode_id, int(animal_data["id"]), st.session_state.get("user_id"), symptoms,
+                                disease, recommendation, result["model_version"], pdf_buffer.getvalue()):
+                st.session_state.last_diagnosis = barcode_id
+                st.session_state.last_ranking = result["ranked"]
+            else:
+                st.error("The diagnosis could not be saved.")
+
+        # The latest diagnosis stays available across reruns, served from storage
+        if st.session_state.get("last_diagnosis"):
+            conn = get_sqlite_connection()
+            record = reports.lookup(conn, st.session_state.last_diagnosis)
+            pdf = reports.report_pdf(conn, st.session_state.last_diagnosis)
+            conn.close()
+            if record:
+                st.write(f"**Predicted Disease:** 🐾 {record['disease']}")
+                st.write(f"**Recommendation:** 💊 {record['recommendation']}")
+                ranked = st.session_state.get("last_ranking") or []
+                if len(ranked) > 1:
+                    st.dataframe(pd.DataFrame(ranked, columns=["Disease", "Probability", "Treatment"]),
+                                 use_container_width=True, hide_index=True)
+                st.caption(f"Report ID: {record['barcode_id']} · Model: {record['model_version']}")
+                st.download_button(
+                    label="Download Diagnosis Report",
+                    data=pdf,
+                    file_name=f"{record['animal']}_diagnosis_report.pdf",
+                    mime="application/pdf"
+                )
+
+        with st.expander(f"Diagnosis History for {animal_name}"):
+            conn = get_sqlite_connection()
+            past = reports.history(conn, animal_data["id"])
+            conn.close()
+            if past.empty:
+                st.info("No diagnoses recorded for this animal yet.")
+            else:
+                st.dataframe(past, use_container_width=True)
 
-            st.download_button(
-                label="Download Diagnosis Report",
-                data=pdf_buffer,
-                file_name=f"{animal_name}_diagnosis_report.pdf",
-                mime="application/pdf"
-            )
+    st.markdown("### 🔎 Verify a Report")
+    barcode_id = st.text_input("Report ID (printed under the barcode)", key="verify_barcode")
+    if barcode_id:
+        conn = get_sqlite_connection()
+        record = reports.lookup(conn, barcode_id)
+        pdf = reports.report_pdf(conn, barcode_id) if record else None
+        conn.close()
+        if record is None:
+            st.error("No VetSmart diagnosis matches this report ID.")
+        else:
+            st.success(f"Authentic report for '{record['animal']}' issued on {record['created_on']}.")
+            st.write(f"**Symptoms:** {', '.join(record['symptoms']) or 'None'}")
+            st.write(f"**Diagnosis:** {record['disease']} ({record['model_version']})")
+            if pdf is not None:
+                st.download_button(
+                    label="Download Original Report",
+                    data=pdf,
+                    file_name=f"{record['barcode_id']}.pdf",
+                    mime="application/pdf",
+                    key="verified_report_download"
+                )
 
 def display_register_vet():
     st.subheader("👨‍⚕️ Register as a Veterinary Doctor")
@@ -789,14 +809,10 @@ def display_register_vet():
             elif not email.strip():
                 st.warning("Email cannot be empty.")
             else:
-                conn = get_sqlite_connection()
-                conn.execute("""
-                    INSERT INTO veterinarians (name, specialization, phone, email, registered_on)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (name, specialization, phone, email, datetime.now()))
-                conn.commit()
-                conn.close()
-                st.success("Veterinarian registered successfully!")
+                if save_veterinarian(name, specialization, phone, email) is None:
+                    st.error("Registration failed. Please try again.")
+                else:
+                    st.success("Veterinarian registered successfully!")
 
 def display_daily_health_tips():
     """Displays general health tips for selected livestock."""
@@ -831,8 +847,7 @@ def display_daily_health_tips():
 
 def request_vet_service():
     st.subheader("📞 Request Veterinary Services")
-    conn = get_sqlite_connection()
-    vets = pd.read_sql("SELECT * FROM veterinarians", conn)
+    vets = load_veterinarians()
 
     if vets.empty:
         st.info("No registered veterinarians available at the moment.")
@@ -840,9 +855,11 @@ def request_vet_service():
 
     vet_names = ["-- Select a Vet --"] + vets['name'].tolist()
 
+    # Outside the form so the search runs as the tag is typed
+    animal = select_animal("vet_request_animal", label="Animal")
+
     with st.form("vet_service_form", clear_on_submit=True):
         farmer_name = st.text_input("Your Name")
-        animal_tag = st.text_input("Animal Tag (e.g., from your livestock record)")
         selected_vet = st.selectbox("Select a Vet", vet_names)
         request_reason = st.text_area("Reason for Request")
         submitted = st.form_submit_button("Submit Request")
@@ -850,16 +867,20 @@ def request_vet_service():
         if submitted:
             if selected_vet == "-- Select a Vet --":
                 st.warning("Please select a valid vet before submitting.")
+            elif animal is None:
+                st.warning("Please select the animal this request is for.")
             else:
-                vet_id = vets[vets['name'] == selected_vet]['id'].values[0]
-                conn.execute("""
-                    INSERT INTO vet_requests (farmer_name, animal_tag, vet_id, request_reason, requested_on)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (farmer_name, animal_tag, vet_id, request_reason, datetime.now()))
-                conn.commit()
-                st.success("Vet service requested successfully!")
-
-    conn.close()
+                vet_id = int(vets.loc[vets['name'] == selected_vet, 'id'].iloc[0])
+                if save_vet_request(farmer_name, animal["Name"], vet_id, request_reason,
+                                    animal_id=animal["id"]) is None:
+                    st.error("Your request could not be submitted. Please try again.")
+                else:
+                    st.success("Vet service requested successfully!")
+                    found = symptoms.diagnose_text(request_reason, animal["Type"])
+                    if found:
+                        top = found["diagnosis"]["ranked"][0]
+                        st.info(f"Symptoms noted for the vet: {', '.join(found['symptoms'])}. "
+                                f"Preliminary assessment: {top[0]} ({top[1]:.0%}) - {top[2]}")
 
 def handle_feedback_submission():
     """Handles the feedback submission process."""
@@ -873,17 +894,466 @@ def handle_feedback_submission():
             if name.strip() == "" or feedback_text.strip() == "":
                 st.warning("Name and Feedback cannot be empty.")
             else:
-                conn = get_sqlite_connection()
-                cursor = conn.cursor()
-                query = """
-                INSERT INTO feedback (name, feedback, submitted_on)
-                VALUES (?, ?, ?)
-                """
-                now = datetime.now()
-                cursor.execute(query, (name, feedback_text, now))
-                conn.commit()
-                conn.close()
-                st.success("Thank you for your feedback!")
+                decision = ratelimit.check("feedback", ip=client_address, user=st.session_state.get("user_id"))
+                if not decision.allowed:
+                    st.warning(ratelimit.message("feedback", decision))
+                elif save_feedback(name, feedback_text) is None:
+                    st.error("Your feedback could not be saved. Please try again.")
+                else:
+                    st.success("Thank you for your feedback!")
+
+def display_platform_analytics():
+    """Displays platform-wide herd analytics computed with grouped SQL (Admin only)."""
+    st.subheader("📈 Platform Analytics")
+    # Shared with every app process through the cache until livestock or users change
+    report = analytics.platform_report(SQLITE_DB)
+    totals = report["totals"]
+    if totals["animals"] == 0:
+        st.info("No livestock registered on the platform yet.")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Total Animals", f"{totals['animals']:,}")
+    with col2:
+        st.metric("Farms with Livestock", f"{totals['farms']:,}")
+
+    st.markdown("### Herd by Animal Type")
+    fig1 = px.bar(report["by_type"], x="Type", y="Animals", color="Type", title="Animals by Type")
+    st.plotly_chart(fig1, use_container_width=True)
+
+    st.markdown("### Vaccination Coverage")
+    st.dataframe(report["coverage"], use_container_width=True)
+
+    st.markdown("### Largest Farms")
+    st.dataframe(report["top_farms"], use_container_width=True)
+
+    st.markdown("### Registrations per Week")
+    weekly = report["weekly"]
+    if weekly.empty:
+        st.info("No registrations in the last 26 weeks.")
+    else:
+        fig2 = px.bar(weekly, x="Week", y="Registered", color="Type", title="Animals Registered per Week")
+        st.plotly_chart(fig2, use_container_width=True)
+
+def display_feedback_insights():
+    """Displays keyword and sentiment trends from the incremental feedback aggregates (Admin only)."""
+    st.subheader("💬 Feedback Insights")
+    days = st.selectbox("Period", [7, 30, 90, 365], index=2, format_func=lambda d: f"Last {d} days",
+                        key="feedback_insights_days")
+    conn = get_sqlite_connection()
+    try:
+        # Only feedback newer than the last processed id is tokenized and scored here
+        new_rows = update_feedback_analytics()
+        progress = feedback_analytics.status(conn)
+        trend = feedback_analytics.sentiment_trend(conn, days)
+        terms = feedback_analytics.top_terms(conn, days)
+        negative = feedback_analytics.most_negative(conn, days)
+        selected = st.multiselect("Compare Terms Over Time", terms["Term"].tolist(),
+                                  default=terms["Term"].tolist()[:3], key="feedback_trend_terms")
+        term_trend = feedback_analytics.term_trend(conn, selected, days)
+    except sqlite3.Error as e:
+        print(f"Error updating feedback analytics: {e}")
+        st.error("Feedback analytics are unavailable right now.")
+        return
+    finally:
+        conn.close()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Feedback Analysed", f"{progress['processed']:,}", f"+{new_rows:,} new" if new_rows else None)
+    with col2:
+        entries = int(trend["Entries"].sum()) if not trend.empty else 0
+        mean = (trend["Mean Sentiment"] * trend["Entries"]).sum() / entries if entries else None
+        st.metric("Mean Sentiment", "-" if mean is None else f"{mean:+.2f}")
+    with col3:
+        share = trend["Negative"].sum() / entries if entries else None
+        st.metric("Negative Share", "-" if share is None else f"{share:.0%}")
+    st.caption(f"Sentiment by {progress['analyzer'] or '-'} analyser; aggregates are current to feedback "
+               f"#{progress['last_feedback_id']}.")
+
+    if trend.empty:
+        st.info("No feedback in this period.")
+        return
+    st.plotly_chart(px.line(trend, x="Day", y="Mean Sentiment", title="Daily Mean Sentiment", markers=True),
+                    use_container_width=True)
+    st.plotly_chart(px.bar(terms, x="Term", y="Mentions", title="Most Mentioned Terms"), use_container_width=True)
+    if not term_trend.empty:
+        st.plotly_chart(px.line(term_trend, x="Day", y="Mentions", color="Term", title="Term Mentions by Day"),
+                        use_container_width=True)
+    with st.expander("Most Negative Feedback"):
+        if negative.empty:
+            st.info("No negative feedback in this period.")
+        else:
+            st.dataframe(negative, use_container_width=True)
+
+def display_outbreak_monitor():
+    """Displays sliding-window disease counts by area and outbreak alerts (Admin only)."""
+    st.subheader("🦠 Outbreak Monitor")
+    monitor = refresh_outbreak_monitor()
+    conn = get_sqlite_connection()
+    try:
+        alerts = outbreak.recent_alerts(conn)
+    finally:
+        conn.close()
+
+    st.caption(f"{outbreak.WINDOW_BUCKETS}-day windows per disease, animal type and area; an alert is raised "
+               f"when cases exceed the baseline by {outbreak.Z_THRESHOLD:g} standard deviations.")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Diagnoses Processed", f"{monitor.events:,}")
+    with col2:
+        st.metric("Tracked Areas", f"{len(monitor.windows):,}")
+
+    recent = list(monitor.alerts)
+    if recent:
+        st.error(f"{len(recent)} outbreak alert(s) raised since this server started.")
+        st.dataframe(pd.DataFrame(recent[::-1]), use_container_width=True)
+
+    st.markdown("### Current Window")
+    current = monitor.snapshot()
+    if current:
+        st.dataframe(pd.DataFrame(current), use_container_width=True)
+    else:
+        st.info("No diagnoses in the current window.")
+
+    with st.expander("Alert History"):
+        if alerts.empty:
+            st.info("No alerts recorded yet.")
+        else:
+            st.dataframe(alerts, use_container_width=True)
+
+def display_diagnostics():
+    """Displays timing aggregates and an optional cProfile capture (Admin only)."""
+    st.subheader("🛠️ Performance Diagnostics")
+
+    st.markdown("### This Session")
+    session_rows = profiling.summarize(st.session_state.get("perf_stats", {}))
+    if session_rows:
+        st.dataframe(pd.DataFrame(session_rows), use_container_width=True)
+    else:
+        st.info("No timings recorded for this session yet.")
+
+    st.markdown("### This Server Process")
+    process_rows = profiling.process_summary()
+    if process_rows:
+        st.dataframe(pd.DataFrame(process_rows), use_container_width=True)
+    else:
+        st.info("No timings recorded for this process yet.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Reset Timings", key="reset_timings_btn"):
+            st.session_state.perf_stats.clear()
+            profiling.reset_process_stats()
+            st.rerun()
+    with col2:
+        if st.button("🔬 Profile Next Rerun", key="profile_rerun_btn"):
+            st.session_state.profile_next_rerun = True
+            st.rerun()
+
+    if st.session_state.get("last_profile"):
+        st.markdown("### Last Rerun Profile")
+        st.code(st.session_state.last_profile)
+
+    st.markdown("### Shared Cache")
+    cache_stats = cache.stats()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Hit Rate", "-" if cache_stats["hit_rate"] is None else f"{cache_stats['hit_rate']:.0%}")
+    with col2:
+        st.metric("Hits / Misses", f"{cache_stats['hits']:,} / {cache_stats['misses']:,}")
+    with col3:
+        st.metric("Invalidations", f"{cache_stats['invalidations']:,}")
+    st.caption(f"Backend: {cache_stats['backend']}; counts cover this server process.")
+
+    st.markdown("### Session Memory")
+    memory = session_memory.totals()
+    this_session = session_memory.session_sizes(st.session_state)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("This Session", f"{sum(this_session.values()) / 1024:,.1f} KB")
+    with col2:
+        st.metric("All Sessions", f"{memory['session_bytes'] / 2**20:,.2f} MB", f"{memory['sessions']} session(s)",
+                  delta_color="off")
+    with col3:
+        st.metric("Process RSS", "-" if memory["rss_bytes"] is None else f"{memory['rss_bytes'] / 2**20:,.0f} MB")
+    with col4:
+        st.metric("Turns Archived", f"{memory['turns_spilled']:,}")
+    st.caption(f"Chat lists keep {session_memory.MAX_HISTORY} turns in memory and move older turns to the "
+               f"archive ({memory['spill_errors']} archive error(s)). Other session state is only measured; "
+               f"sessions over {session_memory.SESSION_BUDGET / 2**20:g} MB are flagged over_budget. Sessions are "
+               f"measured at most every {session_memory.MEASURE_SECONDS} s.")
+    session_rows = session_memory.session_report()
+    if session_rows:
+        st.dataframe(pd.DataFrame(session_rows), use_container_width=True)
+    with st.expander("This Session by Key"):
+        key_rows = [{"key": key, "kb": round(size / 1024, 1)} for key, size in this_session.items()]
+        st.dataframe(pd.DataFrame(key_rows), use_container_width=True)
+
+    st.markdown("### Database Maintenance")
+    conn = get_sqlite_connection()
+    try:
+        file_state = maintenance.file_state(conn)
+        runs = maintenance.recent_runs(conn)
+    finally:
+        conn.close()
+    backups = maintenance.list_backups(base=os.path.splitext(os.path.basename(SQLITE_DB))[0])
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Database Size", f"{file_state['bytes'] / 2**20:,.1f} MB")
+    with col2:
+        st.metric("Free Pages", f"{file_state['free_bytes'] / 2**20:,.1f} MB")
+    with col3:
+        st.metric("Backups Kept", f"{len(backups)}")
+    with col4:
+        st.metric("Last Backup", datetime.fromtimestamp(backups[0][2]).strftime("%Y-%m-%d %H:%M") if backups else "-")
+    st.caption(f"Backups every {maintenance.BACKUP_HOURS:g} h into {maintenance.BACKUP_DIR}/ (newest "
+               f"{maintenance.KEEP_BACKUPS} kept); optimize, ANALYZE and incremental vacuum run between "
+               f"{maintenance.WINDOW.replace('-', ':00 and ')}:00 when writes are quiet. "
+               f"auto_vacuum: {file_state['auto_vacuum']}.")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("💾 Back Up Now", key="backup_now_btn"):
+            with st.spinner("Copying database..."):
+                report = maintenance.run_task(SQLITE_DB, "backup")
+            if report["ok"]:
+                st.success(f"Backed up {report['bytes'] / 2**20:,.1f} MB in {report['seconds']:.2f}s "
+                           f"({report['steps']} steps).")
+            else:
+                st.error(f"Backup failed: {report['error']}")
+    with col2:
+        if st.button("🧹 Run Maintenance Now", key="maintenance_now_btn"):
+            with st.spinner("Optimizing and vacuuming..."):
+                reports_run = [maintenance.run_task(SQLITE_DB, task) for task in ("optimize", "analyze", "vacuum")]
+            seconds = sum(report["seconds"] for report in reports_run)
+            if all(report["ok"] for report in reports_run):
+                st.success(f"Done in {seconds:.2f}s; vacuum reclaimed {max(reports_run[-1]['reclaimed'], 0) / 2**20:,.2f} MB.")
+            else:
+                st.error("Some maintenance tasks failed; see the run history.")
+    if runs:
+        st.dataframe(pd.DataFrame(runs), use_container_width=True)
+
+    st.markdown("### Diagnosis Model")
+    model = diagnosis.model_status()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Model Version", model["version"])
+    with col2:
+        st.metric("Lookups Served", f"{model['lookups']:,}")
+    with col3:
+        st.metric("Reloads", f"{model['reloads']}", delta=f"{model['reload_errors']} failed" if model["reload_errors"] else None,
+                  delta_color="inverse")
+    st.caption(f"{model['entries']} precomputed results built {model['built_on']} in {model['build_ms']} ms from "
+               f"{model['source']}. A new artifact at {model['path']} is picked up within "
+               f"{diagnosis.RELOAD_CHECK_SECONDS} s of being written.")
+    if st.button("🔄 Reload Model Now", key="reload_model_btn"):
+        version = diagnosis.reload()
+        if version:
+            st.success(f"Serving model {version}.")
+        else:
+            st.error(f"Could not load {model['path']}; still serving {diagnosis.model_version()}.")
+
+    st.markdown("### Knowledge Base")
+    index = knowledge.status()
+    if index is None:
+        st.info(f"No knowledge index yet. Put vet manuals and fact sheets (.txt, .md) under "
+                f"{knowledge.KNOWLEDGE_DIR}/ and build it; VetChat uses canned answers until then.")
+    else:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Passages", f"{index['passages']:,}")
+        with col2:
+            st.metric("Source Files", f"{index['sources']:,}")
+        with col3:
+            st.metric("Index Size", f"{index['index_mb']:,.1f} MB")
+        st.caption(f"{index['corpus_mb']:,.1f} MB of text from {knowledge.KNOWLEDGE_DIR}/ indexed {index['built_on']} "
+                   f"into {index['path']}, memory-mapped by each worker.")
+    if st.button("📚 Rebuild Knowledge Index", key="rebuild_knowledge_btn"):
+        with st.spinner("Indexing the knowledge corpus..."):
+            try:
+                built = knowledge.build()
+                st.success(f"Indexed {built['passages']:,} passages from {len(built['sources'])} file(s) "
+                           f"in {built['seconds']:.1f}s.")
+            except OSError as e:
+                print(f"Error building knowledge index: {e}")
+                st.error("The knowledge index could not be built.")
+
+    st.markdown("### Rate Limiting")
+    limits = pd.DataFrame([{"Action": action, "Per": kind, "Burst": capacity, "Refill (s)": seconds,
+                            **ratelimit.stats().get(action, {"allowed": 0, "blocked": 0})}
+                           for action, kinds in ratelimit.LIMITS.items() for kind, (capacity, seconds) in kinds.items()])
+    st.caption(f"Token buckets kept in {'this process' if ratelimit.STORE_URL == 'memory' else ratelimit.STORE_URL}; "
+               f"allowed and blocked counts are for this process since it started.")
+    st.dataframe(limits, use_container_width=True, hide_index=True)
+
+    st.markdown("### SQL Query Log")
+    st.caption(f"Plans are captured for statements slower than {querylog.SLOW_QUERY_MS:g} ms; "
+               f"full scans of {', '.join(querylog.WATCHED_TABLES)} are flagged. Each process logs to its own "
+               f"file; {querylog.dropped_entries():,} entries were dropped here while the log writer was behind.")
+    query_rows = querylog.summary_report()
+    if query_rows:
+        query_df = pd.DataFrame(query_rows)
+        scans = query_df[query_df["full_scan"] != ""]
+        if not scans.empty:
+            st.warning(f"{len(scans)} slow statement(s) perform full table scans.")
+        st.dataframe(query_df, use_container_width=True)
+    else:
+        st.info("No queries recorded by this process yet.")
+
+def display_bulk_provisioning():
+    """Creates accounts for a whole cooperative from a roster file (Admin only)."""
+    st.subheader("👥 Bulk User Provisioning")
+    st.markdown("Upload a CSV or Excel roster with one user per row. Rows without a password get a "
+                "temporary one, listed in a credentials file after provisioning.")
+    st.download_button("Download Roster Template", provisioning.roster_template(), file_name="roster_template.csv",
+                       mime="text/csv", key="roster_template_download")
+
+    roster_file = st.file_uploader("Roster File", type=["csv", "xlsx"], key="roster_file")
+    if roster_file is not None:
+        try:
+            roster = provisioning.read_roster(roster_file, roster_file.name)
+        except Exception as e:
+            st.error(f"The roster could not be read: {e}")
+            return
+        st.caption(f"{len(roster):,} row(s) found; the first 20 are shown.")
+        st.dataframe(roster.drop(columns=["password"]).head(20), use_container_width=True)
+
+        if st.button("Provision Users", key="provision_users_btn"):
+            bar = st.progress(0.0, text="Hashing passwords...")
+            report = provisioning.provision(
+                roster, progress=lambda done, total: bar.progress(done / total, text=f"Hashed {done:,}/{total:,}")
+            )
+            bar.empty()
+            # The figures are kept for the page's reruns; the temporary passwords only as
+            # CSV bytes behind a one-time download (see discard_credentials)
+            st.session_state.provisioning_credentials = provisioning.credentials_csv(report) \
+                if report["credentials"] else None
+            st.session_state.provisioning_report = {k: v for k, v in report.items() if k != "credentials"}
+
+    report = st.session_state.get("provisioning_report")
+    if report:
+        st.markdown("### Last Run")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Created", f"{report['created']:,}")
+        with col2:
+            st.metric("Rejected", f"{len(report['rejected']):,}")
+        with col3:
+            st.metric("Users / Second", f"{report['users_per_second'] or 0:,}")
+        with col4:
+            st.metric("Total Time", f"{report['seconds']:.1f}s")
+        st.caption(f"{report['rows']:,} roster rows; hashing {report['hash_seconds']:.1f}s on "
+                   f"{report['workers']} process(es), inserts {report['insert_seconds']:.2f}s.")
+        if report["rejected"]:
+            st.dataframe(pd.DataFrame(report["rejected"]), use_container_width=True)
+        if st.session_state.get("provisioning_credentials"):
+            st.download_button("Download Temporary Credentials", st.session_state.provisioning_credentials,
+                               file_name="provisioned_credentials.csv", mime="text/csv",
+                               key="provisioned_credentials_download", on_click=discard_credentials)
+            st.caption("The temporary passwords can be downloaded once; they are not kept after that.")
+
+def discard_credentials():
+    """Drops the provisioning run's temporary passwords from the session once they have been downloaded."""
+    st.session_state.provisioning_credentials = None
+
+def display_audit_log():
+    """Displays who registered, changed or diagnosed which animal, and who requested which vet (Admin only)."""
+    st.subheader("🧾 Audit Log")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        days = st.selectbox("Period", [1, 7, 30, 90, 365], index=2, format_func=lambda d: f"Last {d} days",
+                            key="audit_days")
+    with col2:
+        action = st.selectbox("Action", ["All"] + list(audit.ACTIONS), key="audit_action")
+    with col3:
+        entity_id = st.number_input("Record ID (0 for all)", min_value=0, step=1, key="audit_entity_id")
+
+    # Events buffered by this process are committed first so they show up immediately
+    audit.flush()
+    conn = get_sqlite_connection()
+    try:
+        events = audit.events(conn, days=days, action=None if action == "All" else action,
+                              entity_id=entity_id or None)
+        partitions = audit.partition_sizes(conn)
+    except sqlite3.Error as e:
+        print(f"Error reading audit log: {e}")
+        st.error("The audit log is unavailable right now.")
+        return
+    finally:
+        conn.close()
+
+    users = load_users()
+    names = {row.id: f"{row.firstname} {row.lastname}" for row in users.itertuples()} if not users.empty else {}
+    events.insert(1, "actor", events.pop("actor_id").map(lambda uid: names.get(uid, "-" if pd.isna(uid) else f"#{int(uid)}")))
+
+    stats = audit.stats()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Events Shown", f"{len(events):,}")
+    with col2:
+        st.metric("Stored Events", f"{sum(count for _, count in partitions):,}")
+    with col3:
+        st.metric("Pending in Memory", f"{stats['pending']:,}")
+    last_flush = "" if stats["last_flush_ms"] is None else f" (last {stats['last_flush_ms']} ms)"
+    st.caption(f"{len(partitions)} monthly partition(s), kept for {audit.RETENTION_MONTHS} months. "
+               f"This process has written {stats['flushed']:,} events in {stats['flushes']:,} group commits{last_flush}.")
+    if events.empty:
+        st.info("No events match these filters.")
+    else:
+        st.dataframe(events, use_container_width=True)
+
+def display_data_archive():
+    """Closes vet requests and moves cold rows into the compressed monthly archives (Admin only)."""
+    st.subheader("🗄️ Data Archive")
+    files = archive.summary()
+    hot = live_row_counts()
+    columns = st.columns(len(hot))
+    for column, (table, count) in zip(columns, hot.items()):
+        with column:
+            archived = int(files.loc[files["Table"] == table, "Rows"].sum())
+            st.metric(table.replace("_", " ").title(), f"{count:,} live", f"{archived:,} archived", delta_color="off")
+    st.caption("Closed vet requests, counted feedback and retired animals move to the archive after "
+               + ", ".join(f"{policy['days']} days" for policy in archive.POLICIES.values()) + " respectively. "
+               "Animals take their measurements and vaccinations with them; animals with diagnoses or "
+               "vet requests still on file stay live.")
+
+    if st.button("Archive Cold Data Now", key="archive_now_btn"):
+        with st.spinner("Moving cold rows..."):
+            report = archive_cold_data()
+        if report is None:
+            st.error("Archiving failed; see the server log.")
+        else:
+            st.success(", ".join(f"{table}: {result['rows']:,} row(s)" for table, result in report.items()))
+
+    st.markdown("### Open Vet Requests")
+    open_requests = open_vet_requests()
+    if open_requests.empty:
+        st.info("No open vet requests.")
+    else:
+        st.dataframe(open_requests[["id", "farmer_name", "animal_tag", "request_reason", "symptoms", "requested_on"]],
+                     use_container_width=True)
+        to_close = st.multiselect("Requests to Close", open_requests["id"].tolist(), key="close_request_ids")
+        if to_close and st.button("Close Selected Requests", key="close_requests_btn"):
+            closed = close_vet_requests(to_close)
+            if closed is None:
+                st.error("The requests could not be closed.")
+            else:
+                st.success(f"Closed {len(closed)} request(s).")
+
+    st.markdown("### Browse History")
+    table = st.selectbox("Table", ["vet_requests", "feedback"], key="archive_browse_table")
+    include_archived = st.checkbox("Include archived rows", key="archive_browse_include")
+    loader = load_vet_requests if table == "vet_requests" else load_feedback
+    history = loader(include_archived=include_archived)
+    st.caption(f"{len(history):,} row(s); the latest 200 are shown.")
+    st.dataframe(history.tail(200), use_container_width=True)
+
+    with st.expander("Archive Files"):
+        if files.empty:
+            st.info("Nothing has been archived yet.")
+        else:
+            st.dataframe(files, use_container_width=True)
 
 # =================================================== Main =======================================================
 import streamlit as st
@@ -900,7 +1370,21 @@ tab_functions = {
     "👨‍⚕️Vet Doc": display_register_vet,
     "📞Request Service": request_vet_service,
     "📊Dashboard": display_dashboard,
-    "📝 Feedback": handle_feedback_submission
+    "💉Vaccinations": display_vaccinations,
+    "📝 Feedback": handle_feedback_submission,
+    "📈Platform Analytics": display_platform_analytics,
+    "💬Feedback Insights": display_feedback_insights,
+    "🦠Outbreak Monitor": display_outbreak_monitor,
+    "👥Bulk Provisioning": display_bulk_provisioning,
+    "🧾Audit Log": display_audit_log,
+    "🗄️Data Archive": display_data_archive,
+    "🛠️Diagnostics": display_diagnostics
+}
+
+# Time each tab under its function name
+tab_functions = {
+    tab_name: profiling.timed(f"tab:{tab_function.__name__}")(tab_function)
+    for tab_name, tab_function in tab_functions.items()
 }
 
 # Tabs by user role
@@ -912,6 +1396,7 @@ tabs_by_role = {
         "💡Daily Health Tips",
         "📞Request Service",
         "📊Dashboard",
+        "💉Vaccinations",
         "📝 Feedback"
     ],
     "Veterinarian": [
@@ -928,7 +1413,15 @@ tabs_by_role = {
         "👨‍⚕️Vet Doc",
         "📞Request Service",
         "📊Dashboard",
-        "📝 Feedback"
+        "💉Vaccinations",
+        "📝 Feedback",
+        "📈Platform Analytics",
+        "💬Feedback Insights",
+        "🦠Outbreak Monitor",
+        "👥Bulk Provisioning",
+        "🧾Audit Log",
+        "🗄️Data Archive",
+        "🛠️Diagnostics"
     ]
 }
 
@@ -937,9 +1430,18 @@ if st.session_state.get('logged_in'):
     allowed_tabs = tabs_by_role.get(user_role, [])
     tabs = st.tabs(allowed_tabs)
 
-    for tab_name, tab in zip(allowed_tabs, tabs):
-        with tab:
-            tab_functions[tab_name]()  # Call the corresponding function
+    # One-shot cProfile capture requested from the Diagnostics tab
+    profiler = None
+    if st.session_state.pop("profile_next_rerun", False):
+        profiler = profiling.start_profile()
+
+    try:
+        for tab_name, tab in zip(allowed_tabs, tabs):
+            with tab:
+                tab_functions[tab_name]()  # Call the corresponding function
+    finally:
+        if profiler is not None:
+            st.session_state.last_profile = profiling.stop_profile(profiler)
 
     # Optional: chatbot widget (must avoid recursion)
     def chatbot_widget():
@@ -1084,6 +1586,14 @@ if "messages" not in st.session_state:
 
 # Response logic
 def get_livestock_response(user_input):
+    # Described symptoms are diagnosed, other questions are looked up in the
+    # indexed vet manuals, and the keyword answers cover everything else
+    found = symptoms.diagnose_text(user_input)
+    if found:
+        return symptoms.diagnosis_reply(found)
+    cited = knowledge.answer(user_input)
+    if cited:
+        return cited
     user_input_lower = user_input.lower()
     if "fever" in user_input_lower:
         return "🤒 A fever in livestock can indicate an infection. Isolate the animal and consult a veterinarian."
@@ -1110,8 +1620,16 @@ with st.container():
 
     chat_container = st.empty()
 
+    archived = st.session_state.get("messages_archived", 0)
+    show_earlier = archived and st.toggle(f"Show earlier messages ({archived} archived)", key="show_earlier_messages")
+
     def display_messages():
         chat_html = '<div class="chat-box">'
+        if show_earlier:
+            for role, content in session_memory.earlier_turns(st.session_state, "messages", db_path=SQLITE_DB):
+                chat_html += f'<div class="{"user" if role == "user" else "bot"}">{content}</div>'
+        elif archived:
+            chat_html += f'<div class="bot"><i>{archived} earlier message(s) archived</i></div>'
         for msg in st.session_state.messages:
             role_class = "user" if msg["role"] == "user" else "bot"
             chat_html += f'<div class="{role_class}">{msg["content"]}</div>'
@@ -1122,9 +1640,13 @@ with st.container():
 
     # Chat input
     prompt = st.chat_input("Ask about livestock health...")
+    decision = ratelimit.check("chat", ip=client_address, user=st.session_state.get("user_id")) if prompt else None
 
-    if prompt:
-        st.session_state.messages.append({"role": "user", "content": prompt})
+    if decision is not None and not decision.allowed:
+        st.warning(ratelimit.message("chat", decision))
+    elif prompt:
+        session_memory.remember(st.session_state, "messages", {"role": "user", "content": prompt},
+                                db_path=SQLITE_DB)
         display_messages()
 
         # Simulate assistant typing
@@ -1139,6 +1661,11 @@ with st.container():
             thinking_placeholder.markdown(slow_response)
             time.sleep(0.03)
 
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        session_memory.remember(st.session_state, "messages", {"role": "assistant", "content": response},
+                                db_path=SQLITE_DB)
         thinking_placeholder.empty()
         display_messages()
+
+# ========== Session Memory ==========
+# Caps chat history and DataFrames held by this session and records its footprint
+session_memory.enforce(st.session_state, user=st.session_state.get("user_name"), db_path=SQLITE_DB)
@@ -0,0 +1,254 @@
+import re
+import sys
+import time
+from collections import deque
+
+import diagnosis
+
+# ========== Lexicon ==========
+# Phrases farmers use for each diagnosis symptom, lower case. Longer phrases win
+# over the shorter ones they contain ("loss of appetite" over "appetite"), and a
+# phrase that carries its own negation ("won't eat") counts as the symptom.
+SYMPTOM_LEXICON = {
+    "Fever": ["fever", "feverish", "febrile", "high temperature", "running a temperature", "has a temperature",
+              "hot to the touch", "burning up"],
+    "Coughing": ["cough", "coughs", "coughing", "coughed", "hacking", "hacks"],
+    "Diarrhea": ["diarrhea", "diarrhoea", "scours", "scouring", "loose stool", "loose stools", "loose dung",
+                 "runny dung", "watery dung", "runny poop", "watery poop", "the runs"],
+    "Loss of appetite": ["loss of appetite", "lost appetite", "lost its appetite", "no appetite", "poor appetite",
+                         "off feed", "off its feed", "off her feed", "off his feed", "not eating", "isn't eating",
+                         "isnt eating", "won't eat", "wont eat", "will not eat", "doesn't eat", "does not eat",
+                         "didn't eat", "stopped eating", "refuses to eat", "refusing to eat", "refuses feed",
+                         "refusing feed", "not feeding", "won't feed"],
+    "Lameness": ["lame", "lameness", "limp", "limps", "limping", "hobbling", "can't walk", "cannot walk",
+                 "won't stand", "favoring a leg", "favouring a leg"],
+    "Swelling": ["swelling", "swollen", "swelled", "swell", "lump", "lumps", "puffy", "inflamed", "hard udder"],
+}
+
+# Words naming the animal, so "my goat is coughing" is scored with goat priors.
+# Words with everyday meanings ("kid", "doe") are left out.
+ANIMAL_LEXICON = {
+    "Cattle": ["cow", "cows", "cattle", "calf", "calves", "bull", "bulls", "heifer", "heifers", "steer", "ox", "oxen"],
+    "Goat": ["goat", "goats", "buck", "billy", "nanny"],
+    "Sheep": ["sheep", "ewe", "ewes", "ram", "rams", "lamb", "lambs", "hogget"],
+}
+
+# A cue among the few words before a symptom, in the same clause, negates it:
+# "no fever", "not coughing". Only words after the previous symptom phrase
+# count, so the "isn't" of "isn't eating and lame" stays with the appetite; a
+# symptom joined to a negated one by "or"/"nor" is negated too ("no fever or
+# any cough"), while "and" starts a new statement ("no fever and coughing"
+# keeps the cough). A clause ends at punctuation or a contrasting conjunction,
+# so "no fever but coughing" keeps the cough. Contractions are listed with and
+# without the apostrophe, as farmers type them both ways. A cue that negates a
+# "stop" ("can't stop coughing") affirms the symptom instead.
+NEGATION_CUES = {"no", "not", "without", "never", "nor", "cannot", "hardly", "free", "denies",
+                 "isn't", "isnt", "aren't", "arent", "wasn't", "wasnt", "weren't", "werent",
+                 "hasn't", "hasnt", "haven't", "havent", "hadn't", "hadnt",
+                 "doesn't", "doesnt", "don't", "dont", "didn't", "didnt",
+                 "won't", "wont", "can't", "cant", "couldn't", "couldnt", "wouldn't", "wouldnt"}
+STOP_WORDS = {"stop", "stops", "stopped", "stopping", "quit"}
+LIST_JOINERS = {"or", "nor", "any"}
+CLAUSE_BREAKS = {"but", "however", "although", "though", "yet", "except", "now"}
+NEGATION_WINDOW = 3            # words looked at before a symptom phrase
+_CLAUSE_END = re.compile(r"[.,;:!?\n]")
+_WORD = re.compile(r"[a-z']+")
+
+# ========== Matcher ==========
+class PhraseMatcher:
+    """Aho-Corasick automaton over lexicon phrases: one pass over the text finds every phrase."""
+
+    def __init__(self, lexicons):
+        self.labels = []           # phrase id -> (kind, label, phrase length)
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        for kind, lexicon in lexicons.items():
+            for label, phrases in lexicon.items():
+                for phrase in phrases:
+                    self._add(phrase, (kind, label, len(phrase)))
+        self._link()
+
+    def _add(self, phrase, entry):
+        state = 0
+        for ch in phrase:
+            if ch not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+                self.goto[state][ch] = len(self.goto) - 1
+            state = self.goto[state][ch]
+        self.labels.append(entry)
+        self.out[state] = self.out[state] + (len(self.labels) - 1,)
+
+    def _link(self):
+        """Breadth-first failure links; each state's outputs include those of its failure state."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def find(self, text):
+        """(start, end, kind, label) of whole-word phrases, longest first where they overlap."""
+        goto, fail, out, labels = self.goto, self.fail, self.out, self.labels
+        found = []
+        state = 0
+        for position, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                end = position + 1
+                if end < len(text) and text[end].isalnum():
+                    continue
+                for phrase_id in out[state]:
+                    kind, label, length = labels[phrase_id]
+                    start = end - length
+                    if start == 0 or not text[start - 1].isalnum():
+                        found.append((start, end, kind, label))
+        found.sort(key=lambda match: (match[0], match[0] - match[1]))
+        kept, covered = [], 0
+        for match in found:
+            if match[0] >= covered:
+                kept.append(match)
+                covered = match[1]
+        return kept
+
+_matcher = PhraseMatcher({"symptom": SYMPTOM_LEXICON, "animal": ANIMAL_LEXICON})
+
+def normalize(text):
+    return text.lower().replace("’", "'")
+
+def _negated(text, start, after, previous_negated):
+    """Whether the phrase at start is negated; after is where the previous symptom phrase ended."""
+    clauses = _CLAUSE_END.split(text[after:start])
+    words = _WORD.findall(clauses[-1])
+    if previous_negated and len(clauses) == 1 and words and all(word in LIST_JOINERS for word in words):
+        return True
+    for word in reversed(words[-NEGATION_WINDOW:]):
+        if word in CLAUSE_BREAKS or word in STOP_WORDS:
+            return False
+        if word in NEGATION_CUES:
+            return True
+    return False
+
+def _nearest_animal(text, animals, spans):
+    """Label of the animal closest to a symptom phrase, preferring one in the same clause; first named breaks ties."""
+    if not animals:
+        return None
+    if not spans:
+        return animals[0][2]
+
+    def distance(animal):
+        start, end, _ = animal
+        best = None
+        for s_start, s_end in spans:
+            between = text[min(end, s_end):max(start, s_start)]
+            separated = bool(_CLAUSE_END.search(between)) or any(
+                word in CLAUSE_BREAKS for word in _WORD.findall(between))
+            gap = (separated, len(between))
+            if best is None or gap < best:
+                best = gap
+        return best
+
+    return min(animals, key=distance)[2]
+
+# ========== Extraction ==========
+def extract(text):
+    """Structured symptoms from free text.
+
+    Returns {"symptoms": [...], "negated": [...], "animal_type": str or None,
+    "mask": int}, with symptoms in diagnosis.SYMPTOMS order. A symptom that is
+    both affirmed and denied ("no fever yesterday, fever today") counts as present.
+    When several animals are named, the one closest to a symptom phrase is used.
+    """
+    text = normalize(text or "")
+    present, denied, animals, spans = set(), set(), [], []
+    after, negated = 0, False
+    for start, end, kind, label in _matcher.find(text):
+        if kind == "animal":
+            animals.append((start, end, label))
+            continue
+        negated = _negated(text, start, after, negated)
+        (denied if negated else present).add(label)
+        spans.append((start, end))
+        after = end
+    symptoms = [symptom for symptom in diagnosis.SYMPTOMS if symptom in present]
+    return {
+        "symptoms": symptoms,
+        "negated": [symptom for symptom in diagnosis.SYMPTOMS if symptom in denied - present],
+        "animal_type": _nearest_animal(text, animals, spans),
+        "mask": diagnosis.symptom_mask(symptoms),
+    }
+
+def diagnose_text(text, animal_type=None):
+    """Extracts symptoms and runs them through the diagnosis table; None when no symptom is mentioned.
+
+    animal_type, when known from the record, takes precedence over one named in the text.
+    """
+    found = extract(text)
+    if not found["symptoms"]:
+        return None
+    found["diagnosis"] = diagnosis.diagnose(found["symptoms"], animal_type or found["animal_type"])
+    return found
+
+def diagnosis_reply(found):
+    """One chat message summarising a diagnose_text result."""
+    top = found["diagnosis"]["ranked"][0]
+    animal = (found["animal_type"] or "animal").lower()
+    reply = (f"🩺 From what you describe ({', '.join(s.lower() for s in found['symptoms'])}), "
+             f"the most likely cause for your {animal} is {top[0]} ({top[1]:.0%}). {top[2]}")
+    if found["negated"]:
+        reply += f" Noted as absent: {', '.join(s.lower() for s in found['negated'])}."
+    return reply + " Use the Diagnosis tab for a saved report, or request a vet if it gets worse."
+
+# ========== Benchmark ==========
+def _naive_extract(text, patterns):
+    """One regular expression search per phrase: the approach the automaton replaces."""
+    text = normalize(text)
+    return {label for label, pattern in patterns if pattern.search(text)}
+
+def benchmark(messages=20_000):
+    """Compares the automaton with per-phrase regex searches over generated chat messages."""
+    samples = [
+        "My goat is coughing and won't eat since yesterday",
+        "The cow has no fever but she is limping on the back leg",
+        "ewe with swollen udder, not lame, no diarrhoea",
+        "hello, how often should sheep be sheared?",
+        "Calf has scours and is off feed, also running a temperature",
+        "what vaccines does a goat kid need at 8 weeks",
+    ]
+    texts = [samples[i % len(samples)] + f" (note {i})" for i in range(messages)]
+    patterns = [(label, re.compile(r"\b" + re.escape(phrase) + r"\b"))
+                for lexicon in (SYMPTOM_LEXICON, ANIMAL_LEXICON) for label, phrases in lexicon.items()
+                for phrase in phrases]
+
+    start = time.perf_counter()
+    for text in texts:
+        _naive_extract(text, patterns)
+    naive = time.perf_counter() - start
+    start = time.perf_counter()
+    for text in texts:
+        extract(text)
+    automaton = time.perf_counter() - start
+    start = time.perf_counter()
+    routed = sum(diagnose_text(text) is not None for text in texts)
+    routed_seconds = time.perf_counter() - start
+    print(f"{len(patterns)} phrases, {len(_matcher.goto)} automaton states")
+    print(f"{messages:,} messages: regex per phrase {naive / messages * 1e6:.1f} us, "
+          f"automaton + negation {automaton / messages * 1e6:.1f} us ({naive / automaton:.1f}x); "
+          f"extraction + diagnosis {routed_seconds / messages * 1e6:.1f} us, {routed:,} routed")
+    for text in samples:
+        found = extract(text)
+        print(f"  {text!r}: {found['symptoms']} absent {found['negated']} animal {found['animal_type']}")
+
+if __name__ == "__main__":
+    # Usage: python app/symptoms.py [messages]
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
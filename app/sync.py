@@ -0,0 +1,379 @@
+import json
+import sqlite3
+import zlib
+from contextlib import contextmanager
+
+import querylog
+import vaccines
+
+# ========== Change Tracking Schema ==========
+# Columns each synced table exposes to field clients. "id", "updated_at" and
+# "revision" are maintained by the server and never written by clients.
+SYNC_TABLES = {
+    "livestock": ["name", "animal_type", "age", "weight", "vaccination", "user_id", "added_on"],
+    "vet_requests": ["farmer_name", "animal_tag", "vet_id", "request_reason", "requested_on", "animal_id"],
+    "feedback": ["name", "feedback", "submitted_on"],
+}
+
+# How each table's rows belong to a farm: the filter a user's pulls and pushes
+# are held to, and the owner a delete records with its tombstone. Feedback
+# belongs to no farm, so farm-scoped clients neither pull nor push it.
+SYNC_OWNERS = {
+    "livestock": ("user_id = ?", "OLD.user_id"),
+    "vet_requests": ("animal_id IN (SELECT id FROM livestock WHERE user_id = ?)",
+                     "(SELECT user_id FROM livestock WHERE id = OLD.animal_id)"),
+}
+
+DEFAULT_BATCH_SIZE = 500
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def install_change_tracking(conn):
+    """Adds revision/updated_at columns, a global revision counter and triggers.
+
+    Every insert, update or delete on a synced table takes the next value of a
+    single counter, so a client's cursor is simply the last revision it has seen.
+    SQLite serializes writers, so revisions become visible in increasing order.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            revision INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO sync_state (id, revision) VALUES (1, 0)")
+    if "archiving" not in _columns(conn, "sync_state"):
+        conn.execute("ALTER TABLE sync_state ADD COLUMN archiving INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_tombstones (
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            revision INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sync_tombstones_revision ON sync_tombstones(revision)")
+    if "user_id" not in _columns(conn, "sync_tombstones"):
+        conn.execute("ALTER TABLE sync_tombstones ADD COLUMN user_id INTEGER")
+
+    for table in SYNC_TABLES:
+        existing = _columns(conn, table)
+        if "updated_at" not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN updated_at DATETIME")
+        if "revision" not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_revision ON {table}(revision)")
+
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_insert AFTER INSERT ON {table}
+            BEGIN
+                UPDATE sync_state SET revision = revision + 1 WHERE id = 1;
+                UPDATE {table}
+                SET revision = (SELECT revision FROM sync_state WHERE id = 1),
+                    updated_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+                WHERE id = NEW.id;
+            END
+        """)
+        # Skips the trigger's own UPDATE, which is what moves the revision
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_update AFTER UPDATE ON {table}
+            WHEN NEW.revision = OLD.revision
+            BEGIN
+                UPDATE sync_state SET revision = revision + 1 WHERE id = 1;
+                UPDATE {table}
+                SET revision = (SELECT revision FROM sync_state WHERE id = 1),
+                    updated_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+                WHERE id = NEW.id;
+            END
+        """)
+        # Rows the archive job moves out are history, not deletions; clients keep them
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_sync_delete")
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_sync_delete_v2")
+        owner = SYNC_OWNERS[table][1] if table in SYNC_OWNERS else "NULL"
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_delete_v3 AFTER DELETE ON {table}
+            WHEN (SELECT archiving FROM sync_state WHERE id = 1) = 0
+            BEGIN
+                UPDATE sync_state SET revision = revision + 1 WHERE id = 1;
+                INSERT INTO sync_tombstones (table_name, row_id, revision, user_id)
+                VALUES ('{table}', OLD.id, (SELECT revision FROM sync_state WHERE id = 1), {owner});
+            END
+        """)
+
+@contextmanager
+def untracked_deletes(conn):
+    """Deletes inside the block leave no tombstones; used by the archive job within its write transaction.
+
+    Does nothing on a database without change tracking.
+    """
+    tracked = querylog.fetch_one(conn, "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_state'")
+    if tracked:
+        conn.execute("UPDATE sync_state SET archiving = 1 WHERE id = 1")
+    try:
+        yield
+    finally:
+        if tracked:
+            conn.execute("UPDATE sync_state SET archiving = 0 WHERE id = 1")
+
+def current_revision(conn):
+    return querylog.fetch_one(conn, "SELECT revision FROM sync_state WHERE id = 1")[0]
+
+# ========== Pull: Changes Since a Cursor ==========
+def changes_since(conn, cursor=0, batch_size=DEFAULT_BATCH_SIZE, tables=None, user_id=None):
+    """Returns the next batch of changes after the cursor as a columnar payload.
+
+    Rows are merged across tables in revision order and cut at batch_size, so the
+    returned cursor never skips a change. Keep pulling while "has_more" is true.
+    With user_id, only that farm's rows and deletions (see SYNC_OWNERS) are returned.
+    """
+    tables = list(tables or SYNC_TABLES)
+    if user_id is not None:
+        tables = [table for table in tables if table in SYNC_OWNERS]
+    head = current_revision(conn)
+    candidates = []
+    for table in tables:
+        columns = ["id"] + SYNC_TABLES[table] + ["updated_at", "revision"]
+        sql = f"SELECT {', '.join(columns)} FROM {table} WHERE revision > ? AND revision <= ?"
+        params = (cursor, head)
+        if user_id is not None:
+            sql += f" AND {SYNC_OWNERS[table][0]}"
+            params += (user_id,)
+        rows = querylog.fetch_all(conn, sql + " ORDER BY revision LIMIT ?", params + (batch_size + 1,))
+        candidates.extend((row[-1], table, list(row)) for row in rows)
+
+    placeholders = ", ".join("?" for _ in tables) or "NULL"
+    sql = f"""
+        SELECT revision, table_name, row_id FROM sync_tombstones
+        WHERE revision > ? AND revision <= ? AND table_name IN ({placeholders})
+    """
+    params = (cursor, head, *tables)
+    if user_id is not None:
+        sql += " AND user_id = ?"
+        params += (user_id,)
+    tombstones = querylog.fetch_all(conn, sql + " ORDER BY revision LIMIT ?", params + (batch_size + 1,))
+    candidates.extend((revision, table, row_id) for revision, table, row_id in tombstones)
+
+    candidates.sort(key=lambda item: item[0])
+    has_more = len(candidates) > batch_size
+    batch = candidates[:batch_size]
+
+    payload = {"cursor": batch[-1][0] if has_more else head, "has_more": has_more, "changes": {}, "deleted": {}}
+    for revision, table, item in batch:
+        if isinstance(item, list):
+            entry = payload["changes"].setdefault(table, {
+                "columns": ["id"] + SYNC_TABLES[table] + ["updated_at", "revision"],
+                "rows": [],
+            })
+            entry["rows"].append(item)
+        else:
+            payload["deleted"].setdefault(table, []).append(item)
+    return payload
+
+def encode_batch(payload):
+    """Serializes a payload as compact, zlib-compressed JSON."""
+    return zlib.compress(json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8"))
+
+def decode_batch(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+# ========== Push: Queued Offline Edits ==========
+class SyncConflict(Exception):
+    """Raised by apply_client_changes so the caller's transaction rolls the whole upload back."""
+
+    def __init__(self, conflicts):
+        super().__init__(f"{len(conflicts)} conflicting edit(s)")
+        self.conflicts = conflicts
+
+def conflict_result(error):
+    return {"applied": 0, "conflicts": error.conflicts, "inserted": {}}
+
+def apply_client_changes(conn, edits, user_id=None):
+    """Applies a client's queued edits inside the caller's transaction.
+
+    Each edit is a dict with "op" ("insert", "update" or "delete"), "table",
+    "values" and, for updates and deletes, "id" plus the "base_revision" the
+    client last saw. An edit whose row has moved on since then, or that would
+    repeat a tag the farm already uses, is a conflict; if any edit conflicts,
+    SyncConflict is raised with all of them and the current server rows, and
+    the caller rolls the upload back. "applied" counts edits that changed a row.
+    With user_id, an edit touching another farm's rows raises PermissionError.
+    """
+    conflicts = []
+    inserted = {}
+    applied = 0
+    animals = set()
+    for position, edit in enumerate(edits):
+        table = edit["table"]
+        if table not in SYNC_TABLES:
+            raise ValueError(f"Table '{table}' is not synced.")
+        values = {k: v for k, v in edit.get("values", {}).items() if k in SYNC_TABLES[table]}
+        if user_id is not None:
+            _check_owner(conn, position, edit, values, user_id)
+
+        if edit["op"] == "insert":
+            columns = list(values)
+            try:
+                cursor = querylog.execute(conn, f"""
+                    INSERT INTO {table} ({", ".join(columns)})
+                    VALUES ({", ".join("?" for _ in columns)})
+                """, tuple(values[c] for c in columns))
+            except sqlite3.IntegrityError as e:
+                conflicts.append({"edit": edit, "server_row": _duplicate_row(conn, table, values), "error": str(e)})
+                continue
+            inserted[edit.get("client_ref", position)] = cursor.lastrowid
+            applied += 1
+            if table == "livestock":
+                animals.add(cursor.lastrowid)
+            continue
+
+        columns = list(values)
+        row = querylog.fetch_one(conn, f"SELECT {', '.join(['revision'] + columns)} FROM {table} WHERE id = ?",
+                                 (edit["id"],))
+        if row is None or row[0] != edit["base_revision"]:
+            server_row = querylog.fetch_one(conn, f"SELECT * FROM {table} WHERE id = ?", (edit["id"],))
+            conflicts.append({"edit": edit, "server_row": list(server_row) if server_row else None})
+            continue
+
+        if edit["op"] == "update":
+            if all(current == values[c] for c, current in zip(columns, row[1:])):
+                continue
+            try:
+                querylog.execute(conn, f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+                                 (*values.values(), edit["id"]))
+            except sqlite3.IntegrityError as e:
+                conflicts.append({"edit": edit, "server_row": _duplicate_row(conn, table, values), "error": str(e)})
+                continue
+        elif edit["op"] == "delete":
+            querylog.execute(conn, f"DELETE FROM {table} WHERE id = ?", (edit["id"],))
+        else:
+            continue
+        applied += 1
+        if table == "livestock":
+            animals.add(edit["id"])
+
+    if conflicts:
+        raise SyncConflict(conflicts)
+    # New, retyped or removed animals get their due dates recomputed (removed ones lose them)
+    vaccines.refresh_due(conn, sorted(animals), commit=False)
+    return {"applied": applied, "conflicts": [], "inserted": inserted, "cursor": current_revision(conn)}
+
+def _owns(conn, table, row_id, user_id):
+    return querylog.fetch_one(conn, f"SELECT 1 FROM {table} WHERE id = ? AND {SYNC_OWNERS[table][0]}",
+                              (row_id, user_id)) is not None
+
+def _check_owner(conn, position, edit, values, user_id):
+    """Raises PermissionError unless the edit stays within user_id's farm; new animals are assigned to it."""
+    table = edit["table"]
+    if table not in SYNC_OWNERS:
+        raise PermissionError(f"Edit {position}: {table} is not synced to farms.")
+    if edit["op"] != "insert" and querylog.fetch_one(conn, f"SELECT 1 FROM {table} WHERE id = ?", (edit["id"],)) \
+            and not _owns(conn, table, edit["id"], user_id):
+        raise PermissionError(f"Edit {position}: not your {table} row {edit['id']}.")
+    if table == "livestock" and edit["op"] != "delete":
+        if values.get("user_id", user_id) != user_id:
+            raise PermissionError(f"Edit {position}: the animal belongs to another user.")
+        if edit["op"] == "insert":
+            values["user_id"] = user_id
+    if table == "vet_requests" and (edit["op"] == "insert" or "animal_id" in values):
+        if values.get("animal_id") is None or not _owns(conn, "livestock", values["animal_id"], user_id):
+            raise PermissionError(f"Edit {position}: vet requests must name one of your animals (animal_id).")
+
+def _duplicate_row(conn, table, values):
+    """The server row a rejected livestock insert or retag collided with, by farm and tag."""
+    if table != "livestock" or "name" not in values or "user_id" not in values:
+        return None
+    row = querylog.fetch_one(conn, "SELECT * FROM livestock WHERE user_id = ? AND name = ?",
+                             (values["user_id"], values["name"]))
+    return list(row) if row else None
+
+# ========== Simulated Field Client ==========
+class SimulatedClient:
+    """An offline-capable client keeping a local replica, for local testing."""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.cursor = 0
+        self.replica = {table: {} for table in SYNC_TABLES}
+        self.outbox = []
+        self.bytes_received = 0
+
+    def pull(self, conn):
+        """Pulls every pending batch; returns the number of batches received."""
+        batches = 0
+        while True:
+            data = encode_batch(changes_since(conn, self.cursor, self.batch_size))
+            self.bytes_received += len(data)
+            payload = decode_batch(data)
+            for table, entry in payload["changes"].items():
+                for row in entry["rows"]:
+                    record = dict(zip(entry["columns"], row))
+                    self.replica[table][record["id"]] = record
+            for table, ids in payload["deleted"].items():
+                for row_id in ids:
+                    self.replica[table].pop(row_id, None)
+            self.cursor = payload["cursor"]
+            batches += 1
+            if not payload["has_more"]:
+                return batches
+
+    def queue_insert(self, table, values, client_ref=None):
+        self.outbox.append({"op": "insert", "table": table, "values": values,
+                            "client_ref": client_ref or f"local-{len(self.outbox)}"})
+
+    def queue_update(self, table, row_id, values):
+        base = self.replica[table][row_id]["revision"]
+        self.outbox.append({"op": "update", "table": table, "id": row_id,
+                            "base_revision": base, "values": values})
+
+    def queue_delete(self, table, row_id):
+        base = self.replica[table][row_id]["revision"]
+        self.outbox.append({"op": "delete", "table": table, "id": row_id, "base_revision": base})
+
+    def push(self, conn):
+        try:
+            with conn:
+                result = apply_client_changes(conn, self.outbox)
+        except SyncConflict as e:
+            return conflict_result(e)
+        self.outbox = []
+        return result
+
+def _demo():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""CREATE TABLE livestock (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, animal_type TEXT,
+                    age REAL, weight REAL, vaccination TEXT, user_id INTEGER, added_on DATETIME,
+                    retired_on DATETIME)""")
+    conn.execute("""CREATE TABLE vet_requests (id INTEGER PRIMARY KEY AUTOINCREMENT, farmer_name TEXT,
+                    animal_tag TEXT, vet_id INTEGER, request_reason TEXT, requested_on DATETIME,
+                    animal_id INTEGER)""")
+    conn.execute("CREATE TABLE feedback (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, feedback TEXT, submitted_on DATETIME)")
+    vaccines.create_vaccination_tables(conn)
+    vaccines.add_birth_dates(conn)
+    install_change_tracking(conn)
+    conn.executemany("INSERT INTO livestock (name, animal_type, age, weight, vaccination, user_id) VALUES (?, ?, ?, ?, ?, ?)",
+                     [(f"TAG-{i}", "Goat", 1.0, 30.0, "CDT", 1) for i in range(2500)])
+    conn.commit()
+
+    field, office = SimulatedClient(), SimulatedClient()
+    print(f"initial pull: {field.pull(conn)} batches, {field.bytes_received:,} bytes")
+    office.pull(conn)
+
+    field.queue_update("livestock", 1, {"weight": 32.5})
+    field.queue_insert("livestock", {"name": "TAG-NEW", "animal_type": "Sheep", "age": 0.5,
+                                     "weight": 12.0, "vaccination": "", "user_id": 1})
+    print("field push:", {k: v for k, v in field.push(conn).items() if k != "conflicts"})
+
+    before = field.bytes_received
+    field.pull(conn)
+    print(f"delta pull: {field.bytes_received - before:,} bytes")
+
+    office.queue_update("livestock", 1, {"weight": 31.0})
+    result = office.push(conn)
+    print(f"stale office edit: {len(result['conflicts'])} conflict(s), applied {result['applied']}")
+    office.pull(conn)
+    office.outbox = []
+    office.queue_update("livestock", 1, {"weight": 31.0})
+    print("office retry:", office.push(conn)["applied"], "applied")
+
+if __name__ == "__main__":
+    _demo()
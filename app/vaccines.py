@@ -0,0 +1,213 @@
+import heapq
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import querylog
+
+# ========== Schedule Rules ==========
+# first_age_days: age at the first dose; interval_days: gap between boosters.
+# Based on the guidance VetChat gives farmers (CDT at 6-8 weeks with annual
+# boosters, deworming 2-4 times a year).
+Rule = namedtuple("Rule", ["vaccine", "first_age_days", "interval_days"])
+
+SCHEDULE_RULES = {
+    "Goat": [
+        Rule("CDT", 42, 365),
+        Rule("PPR", 120, 3 * 365),
+        Rule("Deworming", 56, 120),
+    ],
+    "Sheep": [
+        Rule("CDT", 42, 365),
+        Rule("PPR", 120, 3 * 365),
+        Rule("Deworming", 56, 120),
+    ],
+    "Cattle": [
+        Rule("Foot-and-Mouth", 120, 180),
+        Rule("Anthrax", 180, 365),
+        Rule("Deworming", 90, 120),
+    ],
+}
+
+# ========== Schema ==========
+def create_vaccination_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS vaccinations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            animal_id INTEGER NOT NULL,
+            vaccine TEXT NOT NULL,
+            given_on DATE NOT NULL,
+            notes TEXT,
+            FOREIGN KEY (animal_id) REFERENCES livestock(id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vaccinations_animal ON vaccinations(animal_id, vaccine, given_on)")
+
+    # Next due date per animal and vaccine, maintained whenever an animal or dose is added
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS vaccination_due (
+            animal_id INTEGER NOT NULL,
+            vaccine TEXT NOT NULL,
+            due_on DATE NOT NULL,
+            user_id INTEGER,
+            PRIMARY KEY (animal_id, vaccine)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vaccination_due_date ON vaccination_due(due_on)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vaccination_due_user ON vaccination_due(user_id, due_on)")
+
+def add_birth_dates(conn):
+    """Adds livestock.born_on, fills it from the age at registration, and keeps it set when an age is entered.
+
+    The schedule counts from born_on, so editing an animal's weight or type
+    leaves its due dates alone; entering a new age means "this old today".
+    """
+    if "born_on" not in {row[1] for row in conn.execute("PRAGMA table_info(livestock)")}:
+        conn.execute("ALTER TABLE livestock ADD COLUMN born_on DATE")
+    rows = querylog.fetch_all(conn, "SELECT id, age, added_on FROM livestock WHERE born_on IS NULL AND added_on IS NOT NULL")
+    conn.executemany("UPDATE livestock SET born_on = ? WHERE id = ?",
+                     [(birth_date(age, added_on).isoformat(), animal_id) for animal_id, age, added_on in rows])
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_livestock_born_on_insert AFTER INSERT ON livestock
+        WHEN NEW.born_on IS NULL
+        BEGIN
+            UPDATE livestock
+            SET born_on = date(COALESCE(NEW.added_on, datetime('now', 'localtime')),
+                               printf('-%d days', round(NEW.age * 365.25)))
+            WHERE id = NEW.id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_livestock_born_on_update AFTER UPDATE OF age ON livestock
+        WHEN NEW.age IS NOT OLD.age
+        BEGIN
+            UPDATE livestock
+            SET born_on = date('now', 'localtime', printf('-%d days', round(NEW.age * 365.25)))
+            WHERE id = NEW.id;
+        END
+    """)
+
+# ========== Due-date Computation ==========
+def birth_date(age_years, added_on):
+    """Estimates the birth date from the age given at registration."""
+    registered = datetime.strptime(str(added_on)[:10], "%Y-%m-%d").date()
+    return registered - timedelta(days=round(float(age_years or 0) * 365.25))
+
+def _born(born_on, age_years, added_on):
+    """The stored birth date, or the registration estimate for rows written before it existed."""
+    if born_on:
+        return date.fromisoformat(str(born_on)[:10])
+    return birth_date(age_years, added_on) if added_on else None
+
+def first_due(rule, born, last_given):
+    if last_given is None:
+        return born + timedelta(days=rule.first_age_days)
+    return last_given + timedelta(days=rule.interval_days)
+
+def due_events(animals, last_doses, horizon, recurring=True, as_of=None):
+    """Yields (due_on, animal_id, vaccine) in date order up to the horizon.
+
+    animals maps animal_id -> (animal_type, birth_date); last_doses maps
+    (animal_id, vaccine) -> date of the latest dose. Each animal's schedule is
+    an infinite sorted stream, and a heap merges them lazily: only the next
+    event per (animal, vaccine) is held at any time, and boosters are pushed as
+    earlier doses are popped. With as_of, a dose overdue at that date is assumed
+    to be given then, so its boosters are counted from as_of.
+    """
+    heap = []
+    intervals = {}
+    for animal_id, (animal_type, born) in animals.items():
+        for rule in SCHEDULE_RULES.get(animal_type, []):
+            due = first_due(rule, born, last_doses.get((animal_id, rule.vaccine)))
+            intervals[(animal_id, rule.vaccine)] = rule.interval_days
+            heapq.heappush(heap, (due, animal_id, rule.vaccine))
+
+    while heap and heap[0][0] <= horizon:
+        due, animal_id, vaccine = heapq.heappop(heap)
+        yield due, animal_id, vaccine
+        if recurring:
+            given = max(due, as_of) if as_of else due
+            heapq.heappush(heap, (given + timedelta(days=intervals[(animal_id, vaccine)]), animal_id, vaccine))
+
+def refresh_due(conn, animal_ids, commit=True):
+    """Recomputes vaccination_due rows for the given animals; retired ones are left with none."""
+    if not animal_ids:
+        return
+    animal_ids = [int(a) for a in animal_ids]
+    placeholders = ", ".join("?" for _ in animal_ids)
+    rows = querylog.fetch_all(conn, f"""
+        SELECT id, animal_type, age, added_on, user_id, born_on FROM livestock
+        WHERE id IN ({placeholders}) AND retired_on IS NULL
+    """, animal_ids)
+    doses = querylog.fetch_all(conn, f"""
+        SELECT animal_id, vaccine, MAX(given_on) FROM vaccinations
+        WHERE animal_id IN ({placeholders})
+        GROUP BY animal_id, vaccine
+    """, animal_ids)
+    last_doses = {(a, v): date.fromisoformat(g) for a, v, g in doses}
+    animals = {r[0]: (r[1], _born(r[5], r[2], r[3])) for r in rows if r[5] or r[3]}
+    owners = {r[0]: r[4] for r in rows}
+
+    querylog.execute(conn, f"DELETE FROM vaccination_due WHERE animal_id IN ({placeholders})", animal_ids)
+    # Only the first event per (animal, vaccine) is materialized
+    next_due = {(a, v): d for d, a, v in due_events(animals, last_doses, date.max, recurring=False)}
+    conn.executemany(
+        "INSERT INTO vaccination_due (animal_id, vaccine, due_on, user_id) VALUES (?, ?, ?, ?)",
+        [(a, v, d.isoformat(), owners[a]) for (a, v), d in next_due.items()],
+    )
+    if commit:
+        conn.commit()
+
+def refresh_missing(conn, batch_size=500):
+    """Backfills due dates for animals that have none, e.g. after an upgrade."""
+    last_id = 0
+    while True:
+        missing = [row[0] for row in querylog.fetch_all(conn, """
+            SELECT id FROM livestock l
+            WHERE id > ? AND retired_on IS NULL
+              AND NOT EXISTS (SELECT 1 FROM vaccination_due d WHERE d.animal_id = l.id)
+            ORDER BY id
+            LIMIT ?
+        """, (last_id, batch_size))]
+        if not missing:
+            return
+        refresh_due(conn, missing)
+        last_id = missing[-1]
+
+def record_vaccination(conn, animal_id, vaccine, given_on, notes=""):
+    """Inserts a dose and moves the animal's due dates; the caller commits."""
+    querylog.execute(conn, """
+        INSERT INTO vaccinations (animal_id, vaccine, given_on, notes) VALUES (?, ?, ?, ?)
+    """, (int(animal_id), vaccine, given_on.isoformat(), notes))
+    refresh_due(conn, [animal_id], commit=False)
+
+# ========== Due Queries ==========
+def due_within(conn, days, user_id=None):
+    """Vaccinations due (or overdue) within the next N days, via the due_on indexes."""
+    horizon = (date.today() + timedelta(days=days)).isoformat()
+    sql = """
+        SELECT d.due_on AS "Due", l.name AS "Animal", l.animal_type AS "Type", d.vaccine AS "Vaccine"
+        FROM vaccination_due d
+        JOIN livestock l ON l.id = d.animal_id
+        WHERE d.due_on <= ? AND l.retired_on IS NULL
+    """
+    params = (horizon,)
+    if user_id is not None:
+        sql += " AND d.user_id = ?"
+        params += (user_id,)
+    sql += " ORDER BY d.due_on"
+    return querylog.read_sql(conn, sql, params=params)
+
+def schedule_for(conn, animal_id, days=365):
+    """Full calendar of upcoming doses (including repeat boosters) for one animal."""
+    row = querylog.fetch_one(conn, "SELECT animal_type, born_on, age, added_on FROM livestock WHERE id = ?",
+                             (animal_id,))
+    if row is None or not (row[1] or row[3]):
+        return []
+    doses = querylog.fetch_all(conn, """
+        SELECT vaccine, MAX(given_on) FROM vaccinations WHERE animal_id = ? GROUP BY vaccine
+    """, (animal_id,))
+    last_doses = {(animal_id, v): date.fromisoformat(g) for v, g in doses}
+    animals = {animal_id: (row[0], _born(row[1], row[2], row[3]))}
+    today = date.today()
+    horizon = today + timedelta(days=days)
+    return [(due, vaccine) for due, _, vaccine in due_events(animals, last_doses, horizon, as_of=today)]
@@ -1,5 +1,6 @@
 from streamlit_chat import message
 import streamlit as st
+import session_memory
 
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
@@ -90,9 +91,14 @@ def run_vetchat():
                 return "I'm here to help you with animal health, appointments, or reports. Ask me anything!"
 
         if user_input:
-            st.session_state.chat_history.append(("user", user_input))
+            session_memory.remember(st.session_state, "chat_history", ("user", user_input))
             response = generate_response(user_input)
-            st.session_state.chat_history.append(("bot", response))
+            session_memory.remember(st.session_state, "chat_history", ("bot", response))
+
+if st.session_state.get("chat_history_archived"):
+    with st.expander("Earlier messages"):
+        for speaker, text in session_memory.earlier_turns(st.session_state, "chat_history"):
+            st.markdown(f"**{'You' if speaker == 'user' else 'VetChat'}:** {text}")
 
 for i, (speaker, text) in enumerate(st.session_state.chat_history):
     message(text, is_user=(speaker == "user"), key=f"chat_{i}")
@@ -0,0 +1,242 @@
+import os
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+# ========== Configuration ==========
+BUSY_TIMEOUT = 30           # seconds a connection waits on a lock before SQLITE_BUSY
+MAX_GROUP = 256             # writes committed together in one transaction
+MAX_GROUP_WAIT = 0.002      # seconds to wait for more writes once one arrives
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.05     # doubled on every retry, with jitter
+ACK_TIMEOUT = 60            # seconds a caller waits for its write to be acknowledged
+
+_STOP = object()
+
+def is_busy(error):
+    """True for SQLITE_BUSY / SQLITE_LOCKED, the errors worth retrying."""
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return "locked" in str(error) or "busy" in str(error)
+
+def configure(conn):
+    """WAL lets readers continue while the writer commits; busy_timeout makes lock waits block."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}")
+
+# ========== Writer Thread ==========
+class Writer:
+    """Owns the only write connection to a database and serializes every write through it.
+
+    Callers submit a function taking the connection and get a Future back. The
+    thread takes whatever is queued (up to MAX_GROUP) and runs it in a single
+    transaction, each write inside its own savepoint so a failing write is
+    rolled back and reported alone while the rest of the group commits.
+    Futures resolve only after the commit, so an acknowledged write is durable.
+    Work submitted with transaction=False (VACUUM, which SQLite refuses inside a
+    transaction) runs alone between groups.
+    """
+
+    def __init__(self, path, max_group=MAX_GROUP, max_wait=MAX_GROUP_WAIT):
+        self.path = path
+        self.max_group = max_group
+        self.max_wait = max_wait
+        self.stats = {"writes": 0, "transactions": 0, "retries": 0, "failed": 0}
+        self._queue = queue.Queue()
+        self._held = None  # a non-transactional item that ended the previous group
+        self._thread = threading.Thread(target=self._run, name=f"sqlite-writer:{path}", daemon=True)
+        self._thread.start()
+
+    # --- Submitting ---
+    def submit(self, work, transaction=True):
+        """Queues work(conn); the Future holds its return value once committed."""
+        future = Future()
+        self._queue.put((work, future, transaction))
+        return future
+
+    def execute(self, sql, params=()):
+        """Queues one statement; the Future holds the new row's id."""
+        return self.submit(lambda conn: conn.execute(sql, params).lastrowid)
+
+    def stop(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    # --- Writer loop ---
+    def _next_group(self):
+        first, self._held = self._held or self._queue.get(), None
+        if first is _STOP:
+            return None
+        group = [first]
+        if not first[2]:
+            return group
+        deadline = time.monotonic() + self.max_wait
+        while len(group) < self.max_group:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            if not item[2]:
+                self._held = item
+                break
+            group.append(item)
+        return group
+
+    def _run(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        configure(conn)
+        while True:
+            group = self._next_group()
+            if group is None:
+                break
+            if group[0][2]:
+                self._commit_group(conn, group)
+            else:
+                self._run_alone(conn, *group[0][:2])
+        conn.close()
+
+    def _run_alone(self, conn, work, future):
+        if future.done():
+            return
+        try:
+            result = work(conn)
+        except Exception as e:
+            self.stats["failed"] += 1
+            future.set_exception(e)
+            return
+        self.stats["writes"] += 1
+        future.set_result(result)
+
+    def _commit_group(self, conn, group):
+        for attempt in range(MAX_RETRIES + 1):
+            results = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for work, future, _ in group:
+                    if future.done():
+                        results.append(None)
+                        continue
+                    conn.execute("SAVEPOINT write")
+                    try:
+                        results.append((True, work(conn)))
+                        conn.execute("RELEASE write")
+                    except sqlite3.OperationalError as e:
+                        if is_busy(e):
+                            raise
+                        conn.execute("ROLLBACK TO write")
+                        conn.execute("RELEASE write")
+                        results.append((False, e))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write")
+                        conn.execute("RELEASE write")
+                        results.append((False, e))
+                conn.execute("COMMIT")
+                break
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                if not is_busy(e) or attempt == MAX_RETRIES:
+                    self.stats["failed"] += len(group)
+                    for _, future, _ in group:
+                        if not future.done():
+                            future.set_exception(e)
+                    return
+                self.stats["retries"] += 1
+                time.sleep(RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random()))
+
+        self.stats["transactions"] += 1
+        for (_, future, _), outcome in zip(group, results):
+            if outcome is None or future.done():
+                continue
+            ok, value = outcome
+            if ok:
+                self.stats["writes"] += 1
+                future.set_result(value)
+            else:
+                self.stats["failed"] += 1
+                future.set_exception(value)
+
+# ========== Shared Writers ==========
+_writers = {}
+_writers_lock = threading.Lock()
+
+def get_writer(path):
+    """The process-wide writer for a database file, started on first use."""
+    key = os.path.abspath(path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = Writer(path)
+        return writer
+
+# ========== Stress Test ==========
+def _direct_insert(path, rows, lost, lock):
+    """The old pattern: a connection per write, its own commit, errors printed and dropped."""
+    for i in rows:
+        try:
+            conn = sqlite3.connect(path)
+            conn.execute("INSERT INTO items (writer, seq) VALUES (?, ?)", i)
+            conn.commit()
+            conn.close()
+        except sqlite3.Error:
+            with lock:
+                lost.append(i)
+
+def _queued_insert(writer, rows, lost, lock):
+    for i in rows:
+        try:
+            writer.execute("INSERT INTO items (writer, seq) VALUES (?, ?)", i).result(ACK_TIMEOUT)
+        except sqlite3.Error:
+            with lock:
+                lost.append(i)
+
+def stress_test(writers=100, rows_per_writer=50):
+    """Inserts from many threads at once, directly and through the writer, and counts lost rows."""
+    for mode in ("direct", "writer"):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "stress.db")
+            conn = sqlite3.connect(path)
+            if mode == "writer":
+                configure(conn)  # the direct run keeps the app's previous rollback-journal setup
+            conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, writer INTEGER, seq INTEGER)")
+            conn.commit()
+
+            lost, lock = [], threading.Lock()
+            writer = Writer(path) if mode == "writer" else None
+            threads = [
+                threading.Thread(
+                    target=_queued_insert if writer else _direct_insert,
+                    args=(writer or path, [(w, s) for s in range(rows_per_writer)], lost, lock),
+                )
+                for w in range(writers)
+            ]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+
+            stored = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+            conn.close()
+            extra = ""
+            if writer:
+                writer.stop()
+                extra = f", {writer.stats['transactions']:,} transactions, {writer.stats['retries']} retries"
+            print(f"{mode:<7} {writers} writers: {stored:,}/{writers * rows_per_writer:,} rows stored, "
+                  f"{len(lost)} lost, {stored / elapsed:,.0f} inserts/s{extra}")
+
+if __name__ == "__main__":
+    # Usage: python app/writer.py [writers] [rows_per_writer]
+    args = [int(a) for a in sys.argv[1:]]
+    stress_test(*args)
@@ -1,9 +1,13 @@
+import os
 import streamlit as st
 import streamlit.components.v1 as components
 import requests
 # import openai
 import streamlit_js_eval
 
+# Turns kept in the widget's history; the same setting caps the main app's chats
+MAX_CHAT_TURNS = int(os.environ.get("VETSMART_MAX_CHAT_TURNS", "40"))
+
 # Set OpenAI API Key
 # openai.api_key = 'YOUR_OPENAI_API_KEY'
 
@@ -164,6 +168,7 @@ if event and event.get("type") == "chatMessage":
         # Store the user input and response in the chat history
         st.session_state.chat_history.append(("You", user_input))
         st.session_state.chat_history.append(("VetChat", response))
+        del st.session_state.chat_history[:-MAX_CHAT_TURNS]
 
         # Trigger JS to update the chat window dynamically
         chat_update = "".join([f"<div><b>{s}:</b> {m}</div>" for s, m in reversed(st.session_state.chat_history)])
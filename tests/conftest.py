@@ -0,0 +1,18 @@
+import pytest
+
+import audit
+import cache
+import database
+
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    """An initialized app database, cache and audit log in a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(database, "SQLITE_DB", str(tmp_path / "livestock_data.db"))
+    monkeypatch.setattr(cache, "CACHE_URL", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(cache, "_backend", None)
+    database.initialize_database()
+    yield database
+    audit.flush()  # pending events go to this file, not the next test's
+    audit.configure("livestock_data.db")
@@ -0,0 +1,39 @@
+import http.client
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import api
+
+
+@pytest.fixture
+def client(app_db):
+    user_id = app_db.save_users("Farmer", "Ann", "Doe", "ann@example.com", "hash", "0700", "Hill Farm",
+                                "Nakuru", "owner")
+    token = app_db.issue_api_token(user_id)
+    server = api.make_server(port=0, pool_size=2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+
+    def request(method, path):
+        conn.request(method, path, headers={"Authorization": f"Bearer {token}"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    yield request
+    conn.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_internal_errors_are_not_sent_to_clients(client, monkeypatch, capsys):
+    def broken(*args, **kwargs):
+        raise sqlite3.OperationalError("no such table: /srv/vetsmart/secret.db")
+
+    monkeypatch.setattr(api.database, "iter_batch", broken)
+    status, body = client("GET", "/livestock")
+    assert status == 500
+    assert body == {"error": "Internal error"}
+    assert "secret.db" in capsys.readouterr().out
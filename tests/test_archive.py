@@ -0,0 +1,76 @@
+from datetime import date, datetime, timedelta
+
+import archive
+import growth
+
+LATER = datetime.now() + timedelta(days=400)
+
+
+def _retired(app_db, user_id, tag, readings=2):
+    animal_id = app_db.save_livestock_data(tag, "Goat", 1.0, 20.0, "", user_id)
+    for ts in range(readings):
+        app_db._write(lambda conn, ts=ts: growth.record_measurement(conn, animal_id, 20.0 + ts, ts=1_700_000_000 + ts))
+    app_db.record_vaccination(animal_id, "PPR", date(2024, 1, 1))
+    app_db.retire_animal(animal_id)
+    return animal_id
+
+
+def _count(conn, table, animal_id):
+    column = "id" if table == "livestock" else "animal_id"
+    return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} = ?", (animal_id,)).fetchone()[0]
+
+
+def test_retired_animals_move_with_their_records_unless_others_point_at_them(app_db, tmp_path):
+    user_id = app_db.save_users("Farmer", "Ann", "Doe", "ann@example.com", "hash", "0700", "Hill Farm",
+                                "Nakuru", "owner")
+    moved = _retired(app_db, user_id, "TAG-M")
+    diagnosed = _retired(app_db, user_id, "TAG-D")
+    app_db.record_diagnoses([{"animal_id": diagnosed, "user_id": user_id, "symptoms": ["Fever"],
+                              "disease": "Anthrax", "recommendation": "Call a vet"}], model_version="test")
+    requested = _retired(app_db, user_id, "TAG-V")
+    vet_id = app_db.save_veterinarian("Dr Vet", "Large Animals", "0711", "vet@example.com")
+    app_db.save_vet_request("Ann", "TAG-V", vet_id, "Limping", animal_id=requested)
+
+    conn = app_db.get_sqlite_connection()
+    try:
+        report = archive.run(conn, app_db._write, ["livestock"], now=LATER, root=str(tmp_path))
+        assert report["livestock"]["rows"] == 1
+        for table in ("livestock", "measurements", "vaccinations"):
+            assert _count(conn, table, moved) == 0
+            assert _count(conn, table, diagnosed) > 0
+            assert _count(conn, table, requested) > 0
+    finally:
+        conn.close()
+
+    assert archive.load_archived("livestock", root=str(tmp_path))["id"].tolist() == [moved]
+    assert len(archive.load_archived("measurements", root=str(tmp_path))) == 2
+    assert archive.load_archived("vaccinations", root=str(tmp_path))["animal_id"].tolist() == [moved]
+
+
+def test_each_batch_gets_its_own_part_file_and_rows_left_hot_are_dropped_from_it(app_db, tmp_path):
+    user_id = app_db.save_users("Farmer", "Ann", "Doe", "ann@example.com", "hash", "0700", "Hill Farm",
+                                "Nakuru", "owner")
+    first = _retired(app_db, user_id, "TAG-1")
+    conn = app_db.get_sqlite_connection()
+    try:
+        archive.archive_table(conn, app_db._write, "livestock", now=LATER, root=str(tmp_path))
+        [(_, first_file)] = archive.month_files("livestock", root=str(tmp_path))
+
+        second, third = _retired(app_db, user_id, "TAG-2"), _retired(app_db, user_id, "TAG-3")
+
+        def write(work):
+            # A reading for TAG-3 arrives between the read and the delete
+            app_db._write(lambda wc: growth.record_measurement(wc, third, 30.0, ts=1_800_000_000))
+            return app_db._write(work)
+
+        moved, _ = archive.archive_table(conn, write, "livestock", now=LATER, root=str(tmp_path))
+        assert moved == 1
+        assert _count(conn, "measurements", third) == 3
+    finally:
+        conn.close()
+
+    files = [path for _, path in archive.month_files("livestock", root=str(tmp_path))]
+    assert len(files) == 2 and files[0] == first_file
+    assert archive.load_archived("livestock", root=str(tmp_path))["id"].tolist() == [first, second]
+    assert sorted(archive.load_archived("measurements", root=str(tmp_path))["animal_id"].unique()) == [first, second]
+    assert archive.summary(root=str(tmp_path)).set_index("Table").loc["livestock", "Files"] == 2
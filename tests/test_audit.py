@@ -0,0 +1,53 @@
+import sqlite3
+import time
+
+import audit
+
+
+def _connect(app_db):
+    return sqlite3.connect(app_db.SQLITE_DB)
+
+
+def test_partition_sizes_follow_flushes_and_pruning(app_db):
+    conn = _connect(app_db)
+    current = audit.partition_name(time.time())
+    before = dict(audit.partition_sizes(conn))[current]
+    for n in range(5):
+        audit.record("livestock.save", n)
+    audit.flush()
+    assert dict(audit.partition_sizes(conn))[current] == before + 5
+
+    audit.create_partition(conn, "audit_events_200001")
+    conn.commit()
+    assert dict(audit.partition_sizes(conn))["audit_events_200001"] == 0
+    audit.prune(conn)
+    conn.commit()
+    assert "audit_events_200001" not in dict(audit.partition_sizes(conn))
+    conn.close()
+
+
+def test_partitions_without_a_counter_are_counted_once(app_db):
+    conn = _connect(app_db)
+    current = audit.partition_name(time.time())
+    conn.execute(f"INSERT INTO {current} (ts, actor_id, action, entity_id, detail) VALUES (?, NULL, 1, 1, NULL)",
+                 (int(time.time()),))
+    conn.execute("DELETE FROM audit_partitions")
+    audit.create_audit_tables(conn)
+    conn.commit()
+    expected = conn.execute(f"SELECT COUNT(*) FROM {current}").fetchone()[0]
+    assert dict(audit.partition_sizes(conn))[current] == expected
+    conn.close()
+
+
+def test_api_updates_are_audited(app_db):
+    user_id = app_db.save_users("Farmer", "Ann", "Doe", "ann@example.com", "hash", "0700", "Hill Farm",
+                                "Nakuru", "owner")
+    [animal_id] = app_db.create_batch("livestock", [{"name": "TAG-1", "animal_type": "Goat", "age": 1.0,
+                                                     "weight": 20.0, "user_id": user_id}])
+    assert app_db.update_batch("livestock", [{"id": animal_id, "weight": 22.5}, {"id": 999, "weight": 1.0}]) == 1
+    audit.flush()
+    conn = _connect(app_db)
+    updates = audit.events(conn, action="livestock.update")
+    conn.close()
+    assert list(updates["entity_id"]) == [animal_id]
+    assert '"fields":["weight"]' in updates["detail"].iloc[0]
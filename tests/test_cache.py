@@ -0,0 +1,58 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cache
+
+
+@pytest.fixture
+def store(tmp_path):
+    return cache.SQLiteCache(str(tmp_path / "cache.db"))
+
+
+def test_frames_keep_their_dtypes(store):
+    df = pd.DataFrame({
+        "id": np.array([1, 2], dtype="int64"),
+        "Type": pd.Categorical(["Goat", "Cattle"]),
+        "Weight": np.array([20.5, 300.0], dtype="float32"),
+        "Date Added": pd.to_datetime(["2024-01-02 03:04:05", "2024-02-03 04:05:06"]),
+        "Name": ["A", None],
+    })
+    assert store.set("herd", df, 60)
+    loaded = store.get("herd")
+    pd.testing.assert_frame_equal(loaded, df)
+
+
+def test_nested_values_round_trip(store):
+    value = {"totals": {"animals": np.int64(3), "farms": 1}, "rows": [("Goat", 2, 1.5)],
+             "frame": pd.DataFrame({"Farm": ["Hill"], "Animals": [3]}), "empty": None}
+    assert store.set("report", value, 60)
+    loaded = store.get("report")
+    assert loaded["totals"] == {"animals": 3, "farms": 1}
+    assert loaded["rows"] == [("Goat", 2, 1.5)]
+    assert loaded["empty"] is None
+    pd.testing.assert_frame_equal(loaded["frame"], value["frame"])
+
+
+def test_values_without_a_safe_encoding_are_not_cached(store):
+    assert not store.set("odd", {1: "integer key"}, 60)
+    assert not store.set("odd", object(), 60)
+    assert store.get("odd") is cache._MISS
+
+
+def test_pickled_entries_are_never_loaded(store):
+    store._conn().execute("""
+        INSERT INTO cache_entries (key, value, size, expires_at, accessed_at) VALUES ('old', ?, 1, 1e12, 0)
+    """, (pickle.dumps({"a": 1}),))
+    with pytest.raises(ValueError):
+        store.get("old")
+
+
+def test_users_are_cached_without_password_hashes(app_db):
+    app_db.save_users("Farmer", "Ann", "Doe", "ann@example.com", "$2b$12$secret", "0700", "Hill Farm",
+                      "Nakuru", "owner")
+    assert "password" not in app_db.load_users().columns
+    entries = cache.backend()._conn().execute("SELECT value FROM cache_entries").fetchall()
+    assert entries and not any(b"$2b$12$secret" in entry[0] for entry in entries)
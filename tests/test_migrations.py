@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE livestock (id INTEGER PRIMARY KEY, name TEXT, user_id INTEGER)")
+    conn.execute("""
+        CREATE TABLE vet_requests (id INTEGER PRIMARY KEY, animal_tag TEXT, animal_id INTEGER)
+    """)
+    yield conn
+    conn.close()
+
+
+def _tags(conn):
+    return conn.execute("SELECT id, name FROM livestock ORDER BY id").fetchall()
+
+
+def test_repeated_tags_get_a_free_suffix(conn):
+    conn.executemany("INSERT INTO livestock (id, name, user_id) VALUES (?, ?, 1)",
+                     [(1, "A"), (2, "A"), (3, "A-2"), (4, "A-2"), (5, "A-2-2")])
+    database.unique_livestock_tags(conn)
+    assert _tags(conn) == [(1, "A"), (2, "A-2-3"), (3, "A-2"), (4, "A-2-4"), (5, "A-2-2")]
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO livestock (name, user_id) VALUES ('A', 1)")
+
+
+def test_the_same_tag_on_other_farms_is_kept(conn):
+    conn.executemany("INSERT INTO livestock (id, name, user_id) VALUES (?, 'A', ?)", [(1, 1), (2, 2), (3, 1)])
+    database.unique_livestock_tags(conn)
+    assert _tags(conn) == [(1, "A"), (2, "A"), (3, "A-3")]
+
+
+def test_requests_are_linked_only_to_unambiguous_tags(conn):
+    conn.executemany("INSERT INTO livestock (id, name, user_id) VALUES (?, ?, ?)",
+                     [(1, "Bella", 1), (2, "Daisy", 1), (3, "Daisy", 2)])
+    conn.executemany("INSERT INTO vet_requests (id, animal_tag, animal_id) VALUES (?, ?, ?)",
+                     [(1, "Bella", None), (2, "Daisy", None), (3, "Nobody", None), (4, "Bella", 2)])
+    database.link_vet_requests(conn)
+    assert conn.execute("SELECT id, animal_id FROM vet_requests ORDER BY id").fetchall() == [
+        (1, 1), (2, None), (3, None), (4, 2)]
+
+
+def test_migrations_run_once_per_database(app_db, monkeypatch):
+    calls = []
+    monkeypatch.setattr(database, "link_vet_requests", lambda conn: calls.append(conn))
+    app_db.initialize_database()
+    assert calls == []
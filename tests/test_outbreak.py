@@ -0,0 +1,75 @@
+import pytest
+
+import outbreak
+
+DAY = outbreak.BUCKET_SECONDS
+
+
+@pytest.fixture
+def fresh_monitor(monkeypatch):
+    monkeypatch.setattr(outbreak, "_shared", None)
+
+
+def _diagnose(app_db, count):
+    rows = [{"animal_id": None, "user_id": None, "symptoms": ["Fever"], "disease": "Anthrax",
+             "recommendation": "Call a vet"} for _ in range(count)]
+    app_db.record_diagnoses(rows, model_version="test")
+
+
+def _checkpoint(app_db):
+    conn = app_db.get_sqlite_connection()
+    try:
+        return conn.execute("SELECT last_diagnosis_id FROM outbreak_checkpoint").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_batches_are_checkpointed_through_the_writer(app_db, fresh_monitor):
+    _diagnose(app_db, 5)
+    conn = app_db.get_sqlite_connection()
+    try:
+        calls = []
+        monitor = outbreak.refresh(conn, lambda work: calls.append(1) or app_db._write(work), batch_size=2)
+    finally:
+        conn.close()
+    assert monitor.events == 5
+    assert len(calls) == 3
+    assert _checkpoint(app_db) == monitor.last_id
+
+
+def test_a_lost_compare_and_swap_starts_again_from_the_saved_state(app_db, fresh_monitor):
+    _diagnose(app_db, 3)
+    assert app_db.refresh_outbreak_monitor().events == 3
+    _diagnose(app_db, 2)
+    conn = app_db.get_sqlite_connection()
+    attempts = []
+
+    def write(work):
+        if not attempts:
+            # Another process checkpoints the same diagnoses between this one's read and write
+            other = outbreak.load_checkpoint(conn)
+            other.consume(conn)
+            app_db._write(lambda write_conn: outbreak.save_checkpoint(write_conn, other, 3))
+        attempts.append(app_db._write(work))
+        return attempts[-1]
+
+    try:
+        monitor = outbreak.refresh(conn, write)
+    finally:
+        conn.close()
+    assert attempts == [False]
+    assert monitor.events == 5
+    assert _checkpoint(app_db) == 5
+
+
+def test_an_alert_is_kept_once_per_key_and_window():
+    monitor = outbreak.OutbreakMonitor()
+    for day in range(outbreak.WARMUP_BUCKETS + outbreak.WINDOW_BUCKETS):
+        monitor.observe(day * DAY, "PPR", "Goat", "Hill")
+    spike_day = (outbreak.WARMUP_BUCKETS + outbreak.WINDOW_BUCKETS) * DAY
+    alerts = [monitor.observe(spike_day, "PPR", "Goat", "Hill") for _ in range(40)]
+    assert sum(alert is not None for alert in alerts) == 1
+    # A retried batch replays the same cases after the alert state was reset
+    monitor.windows[("PPR", "Goat", "Hill")].last_alert = None
+    assert monitor.observe(spike_day, "PPR", "Goat", "Hill") is None
+    assert len(monitor.alerts) == len(monitor.pending_alerts) == 1
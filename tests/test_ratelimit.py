@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+import pytest
+
+import ratelimit
+
+
+def _context(forwarded=None):
+    return SimpleNamespace(headers={"X-Forwarded-For": forwarded} if forwarded else {}, ip_address="10.0.0.1")
+
+
+@pytest.mark.parametrize("proxies, forwarded, expected", [
+    (0, "6.6.6.6, 203.0.113.7", "10.0.0.1"),
+    (1, "6.6.6.6, 203.0.113.7", "203.0.113.7"),
+    (1, "203.0.113.7", "203.0.113.7"),
+    (2, "6.6.6.6, 203.0.113.7, 10.1.1.1", "203.0.113.7"),
+    (2, "203.0.113.7", "203.0.113.7"),
+    (1, None, "10.0.0.1"),
+])
+def test_client_ip_ignores_hops_the_client_could_have_sent(monkeypatch, proxies, forwarded, expected):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXIES", proxies)
+    assert ratelimit.client_ip(_context(forwarded)) == expected
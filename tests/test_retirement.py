@@ -0,0 +1,59 @@
+import analytics
+import vaccines
+
+
+def _herd(app_db):
+    user_id = app_db.save_users("Farmer", "Ann", "Doe", "ann@example.com", "hash", "0700", "Hill Farm",
+                                "Nakuru", "owner")
+    kept = app_db.save_livestock_data("TAG-A", "Goat", 0.1, 20.0, "", user_id)
+    retired = app_db.save_livestock_data("TAG-R", "Goat", 0.1, 21.0, "", user_id)
+    assert app_db.retire_animal(retired) == retired
+    return user_id, kept, retired
+
+
+def test_retired_animals_have_no_due_vaccinations(app_db):
+    user_id, kept, retired = _herd(app_db)
+    conn = app_db.get_sqlite_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM vaccination_due WHERE animal_id = ?", (retired,)).fetchone()[0] == 0
+        vaccines.refresh_due(conn, [kept, retired])
+        vaccines.refresh_missing(conn)
+        assert conn.execute("SELECT COUNT(*) FROM vaccination_due WHERE animal_id = ?", (retired,)).fetchone()[0] == 0
+        due = vaccines.due_within(conn, 3650, user_id=user_id)
+    finally:
+        conn.close()
+    assert not due.empty
+    assert set(due["Animal"]) == {"TAG-A"}
+
+
+def test_platform_analytics_count_only_animals_on_a_farm(app_db):
+    _herd(app_db)
+    conn = app_db.get_sqlite_connection()
+    try:
+        assert analytics.platform_totals(conn) == {"animals": 1, "farms": 1}
+        assert analytics.herd_by_type(conn)["Animals"].tolist() == [1]
+        assert analytics.top_farms(conn)["Animals"].tolist() == [1]
+    finally:
+        conn.close()
+
+
+def test_archive_tab_figures_follow_table_changes(app_db):
+    _herd(app_db)
+    assert app_db.live_row_counts()["livestock"] == 2
+    vet_id = app_db.save_veterinarian("Dr Vet", "Large Animals", "0711", "vet@example.com")
+    app_db.save_vet_request("Ann", "TAG-A", vet_id, "Fever and coughing")
+    assert app_db.open_vet_requests()["symptoms"].tolist() == ["Fever, Coughing"]
+    assert app_db.live_row_counts()["vet_requests"] == 1
+
+
+def test_registering_a_retired_tag_again_reactivates_it_on_both_paths(app_db):
+    user_id, _, retired = _herd(app_db)
+    assert app_db.find_tag("TAG-R", user_id)[1] is not None
+    item = {"name": "TAG-R", "animal_type": "Goat", "age": 0.2, "weight": 22.0, "user_id": user_id}
+    assert app_db.create_batch("livestock", [item], owner_id=user_id) == [retired]
+    assert app_db.find_tag("TAG-R", user_id) == (retired, None)
+
+    app_db.retire_animal(retired)
+    assert app_db.save_livestock_data("TAG-R", "Goat", 0.2, 22.0, "", user_id) == retired
+    assert app_db.find_tag("TAG-R", user_id) == (retired, None)
+    assert app_db.find_tag("TAG-NONE", user_id) is None
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import session_memory
+import writer
+
+
+@pytest.fixture
+def archive_db(tmp_path):
+    return str(tmp_path / "archive.db")
+
+
+def _wait_for_spills(path):
+    writer.get_writer(path).submit(lambda conn: None).result(writer.ACK_TIMEOUT)
+
+
+def test_spilled_turns_can_be_read_back(archive_db):
+    state = {"user_id": 7}
+    for n in range(100):
+        session_memory.remember(state, "messages", {"role": "user", "content": f"turn {n}"}, db_path=archive_db)
+    _wait_for_spills(archive_db)
+    archived = state["messages_archived"]
+    assert archived and len(state["messages"]) + archived == 100
+    earlier = session_memory.earlier_turns(state, "messages", db_path=archive_db, limit=5)
+    assert earlier == [("user", f"turn {n}") for n in range(archived - 5, archived)]
+
+
+def test_nothing_is_read_without_archived_turns(archive_db):
+    assert session_memory.earlier_turns({}, "messages", db_path=archive_db) == []
+
+
+def test_large_sessions_are_flagged_but_left_alone(monkeypatch):
+    monkeypatch.setattr(session_memory, "SESSION_BUDGET", 1024)
+    big = pd.DataFrame({"x": np.arange(10_000)})
+    state = {"editor_rows": big}
+    entry = session_memory.enforce(state)
+    assert entry["over_budget"]
+    assert entry["largest_key"] == "editor_rows"
+    assert state["editor_rows"] is big
+
+
+def test_sessions_are_measured_at_most_every_interval(monkeypatch):
+    calls = []
+    measure = session_memory.measure
+    monkeypatch.setattr(session_memory, "measure", lambda state: calls.append(1) or measure(state))
+    state = {"messages": []}
+    session_memory.enforce(state)
+    state["messages"].append({"role": "user", "content": "hi"})
+    entry = session_memory.enforce(state)
+    assert len(calls) == 1
+    assert entry["chat_turns"] == 1
+    monkeypatch.setattr(session_memory, "MEASURE_SECONDS", 0)
+    session_memory.enforce(state)
+    assert len(calls) == 2
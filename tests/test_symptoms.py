@@ -0,0 +1,41 @@
+import pytest
+
+import symptoms
+
+
+@pytest.mark.parametrize("text, present, negated", [
+    ("no fever and coughing", ["Coughing"], ["Fever"]),
+    ("no fever or any cough", [], ["Fever", "Coughing"]),
+    ("no fever nor cough", [], ["Fever", "Coughing"]),
+    ("no fever but coughing", ["Coughing"], ["Fever"]),
+])
+def test_negation_carries_only_across_or(text, present, negated):
+    found = symptoms.extract(text)
+    assert found["symptoms"] == present
+    assert found["negated"] == negated
+
+
+@pytest.mark.parametrize("text, animal", [
+    ("My neighbour's cow is fine but my goat is coughing", "Goat"),
+    ("The cow has a fever; the sheep next door is fine", "Cattle"),
+    ("my kid says the cow is limping", "Cattle"),
+    ("the doe, a young ewe, is lame", "Sheep"),
+    ("how often should sheep be sheared?", "Sheep"),
+])
+def test_the_animal_nearest_the_symptoms_is_used(text, animal):
+    assert symptoms.extract(text)["animal_type"] == animal
+
+
+@pytest.mark.parametrize("text, present, negated", [
+    ("they don't cough", [], ["Coughing"]),
+    ("my goat dont cough and cant limp", [], ["Coughing", "Lameness"]),
+    ("the calf didn’t have a fever", [], ["Fever"]),
+    ("she cannot cough", [], ["Coughing"]),
+    ("he won't eat", ["Loss of appetite"], []),
+    ("it can't walk", ["Lameness"], []),
+    ("the cow won't stop coughing", ["Coughing"], []),
+])
+def test_contracted_negations_with_or_without_apostrophe(text, present, negated):
+    found = symptoms.extract(text)
+    assert found["symptoms"] == present
+    assert found["negated"] == negated
@@ -0,0 +1,60 @@
+import pytest
+
+import sync
+
+
+@pytest.fixture
+def farms(app_db):
+    ann = app_db.save_users("Farmer", "Ann", "Doe", "ann@example.com", "hash", "0700", "Hill Farm", "Nakuru", "owner")
+    bob = app_db.save_users("Farmer", "Bob", "Roe", "bob@example.com", "hash", "0701", "Vale Farm", "Nakuru", "owner")
+    animals = {user: app_db.save_livestock_data(f"TAG-{user}", "Goat", 1.0, 20.0, "", user) for user in (ann, bob)}
+    return ann, bob, animals
+
+
+def _pull(app_db, user_id):
+    conn = app_db.get_sqlite_connection()
+    try:
+        return sync.changes_since(conn, 0, user_id=user_id)
+    finally:
+        conn.close()
+
+
+def test_pulls_return_only_the_farms_rows(app_db, farms):
+    ann, bob, animals = farms
+    vet_id = app_db.save_veterinarian("Dr Vet", "Large Animals", "0711", "vet@example.com")
+    app_db.save_vet_request("Bob", f"TAG-{bob}", vet_id, "Lameness", animal_id=animals[bob])
+    app_db.save_feedback("Bob", "Great app")
+    payload = _pull(app_db, ann)
+    assert set(payload["changes"]) == {"livestock"}
+    assert [row[0] for row in payload["changes"]["livestock"]["rows"]] == [animals[ann]]
+
+    app_db.push_client_changes([{"op": "delete", "table": "livestock", "id": animals[bob],
+                                 "base_revision": _pull(app_db, bob)["changes"]["livestock"]["rows"][0][-1]}],
+                               user_id=bob)
+    assert _pull(app_db, ann)["deleted"] == {}
+    assert _pull(app_db, bob)["deleted"] == {"livestock": [animals[bob]]}
+
+
+def test_pushes_to_another_farms_rows_are_rejected(app_db, farms):
+    ann, bob, animals = farms
+    revision = _pull(app_db, bob)["changes"]["livestock"]["rows"][0][-1]
+    rejected = [
+        {"op": "update", "table": "livestock", "id": animals[bob], "base_revision": revision,
+         "values": {"weight": 1.0}},
+        {"op": "insert", "table": "livestock", "values": {"name": "X", "animal_type": "Goat", "age": 1.0,
+                                                           "weight": 2.0, "vaccination": "", "user_id": bob}},
+        {"op": "insert", "table": "vet_requests", "values": {"farmer_name": "Ann", "animal_tag": f"TAG-{bob}",
+                                                              "vet_id": 1, "request_reason": "x",
+                                                              "animal_id": animals[bob]}},
+        {"op": "insert", "table": "feedback", "values": {"name": "Ann", "feedback": "x"}},
+    ]
+    for edit in rejected:
+        with pytest.raises(PermissionError):
+            app_db.push_client_changes([edit], user_id=ann)
+    assert app_db.find_animal(animals[bob]) is not None
+
+    result = app_db.push_client_changes([{"op": "insert", "table": "livestock", "client_ref": "new",
+                                          "values": {"name": "NEW", "animal_type": "Goat", "age": 1.0,
+                                                     "weight": 2.0, "vaccination": ""}}], user_id=ann)
+    assert result["applied"] == 1
+    assert [row[1] for row in _pull(app_db, ann)["changes"]["livestock"]["rows"]] == ["TAG-" + str(ann), "NEW"]